@@ -0,0 +1,33 @@
+"""
+Gunicorn 配置（生产部署）：
+
+    gunicorn -c gunicorn.conf.py raman_backend.wsgi
+
+主进程加载 Django 与激活模型后再 fork worker（preload_app），
+worker 以写时复制方式共享模型权重与预处理状态，重启 worker 不会重新读取模型文件。
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+# 模型由 when_ready 在主进程中同步加载；不使用 AppConfig.ready 的后台预加载线程（线程不能跨 fork）
+os.environ['MODEL_PRELOAD'] = 'false'
+
+
+def when_ready(server):
+    from raman_api.ml_engine import MLEngine
+
+    MLEngine.preload_for_fork()
+    server.log.info("Model preloaded in master process %s", os.getpid())
+
+
+def post_fork(server, worker):
+    from django.conf import settings
+    from raman_api.ml_engine import MLEngine
+
+    # 未单独配置时按 CPU 核数平均分配给各 worker，避免线程数超额
+    threads = settings.INFERENCE_TORCH_THREADS or max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    MLEngine.init_worker(num_threads=threads)
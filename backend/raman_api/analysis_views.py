@@ -1,48 +1,32 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans
 from .models import SpectrumRecord
-from .preprocessing import RamanPreprocessor
-import numpy as np
+from .feature_store import FeatureStore
 
 class AnalysisMixin:
     def get_data(self):
-        records = SpectrumRecord.objects.filter(is_training_data=True).select_related('patient')
+        records = SpectrumRecord.objects.filter(is_training_data=True)
         if not records.exists():
             return None, None, None, "No data available"
 
-        X = []
-        labels = []
-        ids = []
-        
-        for record in records:
-            if not record.spectral_data or 'y' not in record.spectral_data:
-                continue
-            
-            raw_y = record.spectral_data['y']
-            wavenumbers = record.spectral_data.get('x', [])
-            
-            processed_y = RamanPreprocessor.process_pipeline(
-                wavenumbers, 
-                raw_y, 
-                config={'smooth': True, 'baseline': True, 'normalize': True, 'baseline_method': 'poly'}
-            )
-            
-            X.append(processed_y)
-            labels.append(record.diagnosis_result)
-            ids.append(record.id)
+        diagnoses = dict(records.values_list('id', 'diagnosis_result'))
+        config = {'smooth': True, 'baseline': True, 'normalize': True, 'baseline_method': 'poly'}
+        # 缺失的特征在请求进程内串行计算（不在 Web 请求中启动进程池）
+        ids, X = FeatureStore.get_matrix(list(diagnoses), config)
+        labels = [diagnoses[i] for i in ids]
 
         if len(X) < 2:
             return None, None, None, "Not enough data points (need at least 2)"
 
-        return np.array(X), labels, ids, None
+        return X, labels, ids, None
 
 class PCAAnalysisView(APIView, AnalysisMixin):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get(self, request):
+        from sklearn.decomposition import PCA
+
         X, labels, ids, error = self.get_data()
         if error:
             return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
@@ -71,6 +55,9 @@ class ClusteringAnalysisView(APIView, AnalysisMixin):
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request):
+        from sklearn.cluster import KMeans
+        from sklearn.decomposition import PCA
+
         n_clusters = int(request.data.get('n_clusters', 2))
         
         X, labels, ids, error = self.get_data()
@@ -1,5 +1,39 @@
+import os
+import sys
+import threading
+import time
+
 from django.apps import AppConfig
+from django.conf import settings
+
+# 本模块在 Django 加载应用配置时导入，用作应用初始化计时起点
+_IMPORTED_AT = time.perf_counter()
 
 
 class RamanApiConfig(AppConfig):
     name = "raman_api"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .startup import StartupReport
+
+        StartupReport.record('app_init', (time.perf_counter() - _IMPORTED_AT) * 1000)
+
+        if settings.MODEL_PRELOAD and _serves_requests():
+            # 后台线程加载激活模型，不阻塞启动；加载完成前到达的请求等待同一次加载
+            threading.Thread(target=_preload_model, name='model-preload', daemon=True).start()
+
+
+def _serves_requests():
+    """manage.py 的 migrate 等命令以及 runserver 的自动重载父进程不预加载模型"""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
+def _preload_model():
+    from .ml_engine import MLEngine
+
+    MLEngine.ensure_model_loaded()
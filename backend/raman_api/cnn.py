@@ -1,6 +1,9 @@
 import torch
 import torch.nn as nn
 
+# Output heads, in the order used for stacked (B, 5) logits
+OUTPUT_HEADS = ('diagnosis', 'ER', 'PR', 'HER2', 'Ki67')
+
 class MultiTaskRamanCNN(nn.Module):
     def __init__(self, input_length=1801):
         super(MultiTaskRamanCNN, self).__init__()
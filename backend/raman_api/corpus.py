@@ -0,0 +1,288 @@
+"""
+训练语料快照。
+
+把训练集的预处理特征矩阵、诊断标签和辅助任务标签落盘为 .npy 文件，
+后续训练直接以内存映射方式打开，无需重新查询/解码/拼接全部光谱。
+
+目录结构:
+    models_storage/corpus/<config_hash>/<fingerprint>/
+        manifest.json  记录 id、修改时间戳及生成信息
+        ids.npy        (N,) int64，矩阵行对应的记录 id
+        X.npy          (N, L) float32 特征矩阵
+        y.npy          (N,) float32 诊断标签 (1=Malignant)
+        aux.npy        (N, 4) float32 ER/PR/HER2/Ki67 标签 (-1 表示缺失)
+
+fingerprint 由记录 id、updated_at 以及标签/元数据计算，任一记录变动都会落到新目录，
+因此已存在的快照目录内容不会被改写，读取方无需加锁。
+
+生成快照时按块流式读取：清单查询用 .iterator(chunk_size) 逐块取 (id, 时间戳, 标签, 元数据)，
+特征按块读取/预处理后直接写入预分配的 float32 矩阵，峰值内存接近最终矩阵大小。
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .feature_store import FeatureStore, config_hash
+from .resampling import CANONICAL_LENGTH
+from .utils.dataset import MetadataParser
+
+logger = logging.getLogger(__name__)
+
+# 每个预处理配置保留的快照数量（旧快照可能仍被正在进行的训练映射）
+SNAPSHOTS_TO_KEEP = 2
+
+# 流式读取清单和特征时每块的记录数
+STREAM_CHUNK_SIZE = 1000
+
+# 训练集清单：fingerprint 及按 id 排序的记录 id、时间戳、诊断标签、辅助任务标签
+CorpusManifest = namedtuple('CorpusManifest', ['fingerprint', 'ids', 'stamps', 'y', 'aux'])
+
+# 光谱摘要长度 (SHA-1)
+SPECTRUM_DIGEST_SIZE = 20
+
+
+def corpus_root():
+    return Path(settings.BASE_DIR) / "models_storage" / "corpus"
+
+
+def _stamp(value):
+    return value.isoformat() if value is not None else None
+
+
+class CorpusSnapshot:
+    """
+    训练语料快照：按 (预处理配置, 训练集清单) 缓存特征矩阵和标签。
+    """
+
+    @staticmethod
+    def load(records, config, length=CANONICAL_LENGTH):
+        """
+        返回训练集的只读内存映射数组，清单变化时重新生成快照。
+        :param records: SpectrumRecord 查询集（训练集）
+        :param config: 预处理配置
+        :return: (ids, X, y, aux)；没有可用光谱时 X 为空
+        """
+        return CorpusSnapshot.open(CorpusSnapshot.locate(records, config, length))
+
+    @staticmethod
+    def open(directory):
+        """
+        以内存映射方式打开快照目录（子进程据此共享同一份语料，不经进程间传输）。
+        :return: (ids, X, y, aux)
+        """
+        # 'c' (copy-on-write) 映射：不复制数据，且得到的数组可直接交给 torch.from_numpy
+        return tuple(
+            np.load(Path(directory) / f"{name}.npy", mmap_mode='c')
+            for name in ('ids', 'X', 'y', 'aux')
+        )
+
+    @staticmethod
+    def locate(records, config, length=CANONICAL_LENGTH):
+        """
+        确保训练集快照存在（清单变化时重新生成）。
+        :return: 快照目录
+        """
+        manifest = CorpusSnapshot._scan(records)
+        key = config_hash(config, length)
+        directory = corpus_root() / key / manifest.fingerprint
+
+        if not (directory / 'manifest.json').exists():
+            CorpusSnapshot._materialize(directory, manifest, config, length, key)
+            CorpusSnapshot._prune(directory.parent, keep=directory.name)
+        else:
+            logger.info("Corpus snapshot %s/%s is up to date.", key[:8], manifest.fingerprint[:8])
+        return directory
+
+    @staticmethod
+    def _scan(records):
+        """
+        流式读取训练集清单：计算 fingerprint，同时解析标签（不保留元数据 JSON）。
+        """
+        digest = hashlib.sha1()
+        ids, stamps, y, aux = [], [], [], []
+        rows = (records.order_by('id')
+                .values_list('id', 'updated_at', 'diagnosis_result', 'metadata')
+                .iterator(chunk_size=STREAM_CHUNK_SIZE))
+        for record_id, updated_at, diagnosis, metadata in rows:
+            stamp = _stamp(updated_at)
+            digest.update(json.dumps(
+                [record_id, stamp, diagnosis, metadata],
+                sort_keys=True, default=str, ensure_ascii=False,
+            ).encode('utf-8'))
+            digest.update(b'\n')
+            ids.append(record_id)
+            stamps.append(stamp)
+            y.append(1.0 if diagnosis == 'Malignant' else 0.0)
+            aux.append(MetadataParser.parse_targets(metadata or {}))
+        return CorpusManifest(
+            fingerprint=digest.hexdigest(),
+            ids=ids,
+            stamps=stamps,
+            y=np.array(y, dtype=np.float32),
+            aux=np.array(aux, dtype=np.float32).reshape(len(ids), 4),
+        )
+
+    @staticmethod
+    def _materialize(directory, manifest, config, length, key):
+        # 先（并行）补齐缺失特征，再按块读取并直接写入预分配矩阵；没有光谱数据的记录被跳过
+        FeatureStore.precompute(manifest.ids, config, length)
+        X = np.empty((len(manifest.ids), length), dtype=np.float32)
+        kept = np.zeros(len(manifest.ids), dtype=bool)
+        n_rows = 0
+        for start in range(0, len(manifest.ids), STREAM_CHUNK_SIZE):
+            chunk = manifest.ids[start:start + STREAM_CHUNK_SIZE]
+            present, _ = FeatureStore.get_matrix(chunk, config, length, out=X[n_rows:])
+            n_rows += len(present)
+            present = set(present)
+            kept[start:start + len(chunk)] = [record_id in present for record_id in chunk]
+
+        ids = np.asarray(manifest.ids, dtype=np.int64)[kept]
+        X = X[:n_rows]
+        y = manifest.y[kept]
+        aux = manifest.aux[kept]
+
+        info = {
+            'config_hash': key,
+            'fingerprint': manifest.fingerprint,
+            'length': length,
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'records': [list(entry) for entry in zip(manifest.ids, manifest.stamps)],
+            'rows': len(ids),
+        }
+
+        # 先写入临时目录再整体改名，读取方看不到写了一半的快照
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=directory.parent))
+        try:
+            np.save(staging / 'ids.npy', ids)
+            np.save(staging / 'X.npy', X)
+            np.save(staging / 'y.npy', y)
+            np.save(staging / 'aux.npy', aux)
+            with open(staging / 'manifest.json', 'w', encoding='utf-8') as f:
+                json.dump(info, f)
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # 并发生成了同一快照，保留先完成的那份
+                if not (directory / 'manifest.json').exists():
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        logger.info("Corpus snapshot %s/%s written: %d rows (%d records).",
+                    key[:8], manifest.fingerprint[:8], len(ids), len(manifest.ids))
+
+    @staticmethod
+    def _prune(config_dir, keep):
+        snapshots = sorted(
+            (path for path in config_dir.iterdir()
+             if path.is_dir() and not path.name.startswith('.') and path.name != keep),
+            key=lambda path: path.stat().st_mtime,
+            reverse=True,
+        )
+        for path in snapshots[SNAPSHOTS_TO_KEEP - 1:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def spectrum_digests(record_ids):
+    """
+    按块读取记录的二进制光谱，计算 (波数轴 id, 光谱二进制) 的 SHA-1 摘要。
+    :return: {record_id: 20 字节摘要}
+    """
+    from .models import SpectrumRecord
+
+    digests = {}
+    record_ids = list(record_ids)
+    for start in range(0, len(record_ids), STREAM_CHUNK_SIZE):
+        rows = (SpectrumRecord.objects.filter(id__in=record_ids[start:start + STREAM_CHUNK_SIZE])
+                .values_list('id', 'wavenumber_grid_id', 'spectral_blob'))
+        for record_id, grid_id, blob in rows:
+            digest = hashlib.sha1(str(grid_id).encode('ascii'))
+            digest.update(bytes(blob or b''))
+            digests[record_id] = digest.digest()
+    return digests
+
+
+class TrainingManifest:
+    """
+    模型版本训练时所见的记录状态：记录 id、光谱摘要、诊断标签和辅助任务标签。
+    与 checkpoint 同目录保存为 <version>.records.npz；增量微调据此找出光谱或标签有变化的记录。
+    """
+
+    @staticmethod
+    def path_for(model_path):
+        return Path(model_path).with_suffix('.records.npz')
+
+    @staticmethod
+    def save(model_path, ids, y, aux, base_path=None):
+        """
+        :param ids/y/aux: 本次训练使用的记录及其（修正后的）标签
+        :param base_path: 微调时的父版本 checkpoint；父版本清单中未参与本次训练的记录原样保留
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        digests = spectrum_digests(ids.tolist())
+        entries = (TrainingManifest.load(base_path) or {}) if base_path else {}
+        for record_id, label, targets in zip(ids.tolist(), np.asarray(y), np.asarray(aux)):
+            if record_id in digests:
+                entries[record_id] = (digests[record_id], float(label), targets)
+
+        ordered = sorted(entries)
+        np.savez(
+            TrainingManifest.path_for(model_path),
+            ids=np.asarray(ordered, dtype=np.int64),
+            spectrum=np.asarray([entries[i][0] for i in ordered], dtype=f'S{SPECTRUM_DIGEST_SIZE}'),
+            y=np.asarray([entries[i][1] for i in ordered], dtype=np.float32),
+            aux=np.asarray([entries[i][2] for i in ordered], dtype=np.float32).reshape(len(ordered), 4),
+        )
+
+    @staticmethod
+    def load(model_path):
+        """
+        :return: {record_id: (光谱摘要, y, aux)}；清单不存在（旧版本）时返回 None
+        """
+        path = TrainingManifest.path_for(model_path)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            return {
+                record_id: (digest, label, targets)
+                for record_id, digest, label, targets in
+                zip(data['ids'].tolist(), data['spectrum'].tolist(), data['y'].tolist(), data['aux'])
+            }
+
+    @staticmethod
+    def changed(records, known, corrections=None):
+        """
+        流式比较当前训练集与清单。
+        :param records: SpectrumRecord 查询集（训练集）
+        :param known: TrainingManifest.load 的结果
+        :param corrections: {record_id: 医生修正后的诊断}，优先于记录上的诊断结果
+        :return: (清单中没有的记录 id, 光谱或标签有变化的记录 id)
+        """
+        corrections = corrections or {}
+        added, changed = set(), set()
+        rows = (records.order_by('id').values_list('id', 'diagnosis_result', 'metadata')
+                .iterator(chunk_size=STREAM_CHUNK_SIZE))
+        candidates = {}
+        for record_id, diagnosis, metadata in rows:
+            entry = known.get(record_id)
+            if entry is None:
+                added.add(record_id)
+                continue
+            label = 1.0 if corrections.get(record_id, diagnosis) == 'Malignant' else 0.0
+            if label != entry[1] or not np.array_equal(MetadataParser.parse_targets(metadata or {}), entry[2]):
+                changed.add(record_id)
+            else:
+                candidates[record_id] = entry[0]
+        digests = spectrum_digests(candidates)
+        changed.update(record_id for record_id, digest in candidates.items() if digests.get(record_id) != digest)
+        return added, changed
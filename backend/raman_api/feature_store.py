@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from .models import SpectrumFeature, SpectrumRecord
+from .preprocessing import RamanPreprocessor
+from .resampling import CANONICAL_LENGTH, canonical_grid
+
+logger = logging.getLogger(__name__)
+
+# 单次 IN 查询的 id 数量上限
+QUERY_CHUNK_SIZE = 500
+
+# 缺失特征少于该数量时不启动进程池
+PARALLEL_MIN_RECORDS = 2 * QUERY_CHUNK_SIZE
+
+
+def config_hash(config, length=CANONICAL_LENGTH):
+    """预处理配置 + 目标长度的哈希，作为特征缓存键"""
+    payload = {
+        'preprocessing': RamanPreprocessor.canonical_config(config),
+        'length': length,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _chunks(items, size=QUERY_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FeatureStore:
+    """
+    预处理特征存储：按 (记录, 预处理配置哈希) 持久化标准长度的 float32 特征向量。
+    读取时缺失的条目会即时计算并写入；记录的光谱数据变化时由信号清除旧条目。
+    """
+
+    @staticmethod
+    def get_matrix(record_ids, config, length=CANONICAL_LENGTH, out=None):
+        """
+        读取一组记录的特征矩阵。
+        :param record_ids: 记录 id 列表
+        :param config: 预处理配置
+        :param out: 可选的 (>=N, length) float32 输出缓冲区，结果写入其前 N 行
+        :return: (ids, X)，ids 为有光谱数据的记录 id（保持输入顺序），X 为 (N, length) float32 矩阵
+        """
+        record_ids = list(record_ids)
+        key = config_hash(config, length)
+
+        vectors = {}
+        for chunk in _chunks(record_ids):
+            for record_id, data in SpectrumFeature.objects.filter(
+                config_hash=key, record_id__in=chunk
+            ).values_list('record_id', 'data'):
+                vectors[record_id] = np.frombuffer(data, dtype=np.float32)
+
+        missing = [record_id for record_id in record_ids if record_id not in vectors]
+        if missing:
+            vectors.update(FeatureStore._compute(missing, config, key, length))
+            logger.info("Feature store: %d cached, %d computed (config %s)",
+                        len(record_ids) - len(missing), len(missing), key[:8])
+
+        ids = [record_id for record_id in record_ids if record_id in vectors]
+        X = np.empty((len(ids), length), dtype=np.float32) if out is None else out[:len(ids)]
+        for row, record_id in enumerate(ids):
+            X[row] = vectors[record_id]
+        return ids, X
+
+    @staticmethod
+    def precompute(record_ids, config, length=CANONICAL_LENGTH, workers=None):
+        """
+        计算并写入缺失的特征，不返回矩阵（供训练语料、微调等离线任务在读取前批量补齐）。
+        缺失条目较多时按分片交给进程池并行预处理，各 worker 直接写入特征存储；
+        Web 请求中不要调用（会在请求内启动进程池），直接使用 get_matrix 串行补齐。
+        :param workers: 进程数，默认 settings.PREPROCESSING_WORKERS；1 表示在当前进程串行计算
+        :return: 新计算的条目数
+        """
+        from .parallel import precompute_features_shard, process_pool, worker_count
+
+        record_ids = list(record_ids)
+        key = config_hash(config, length)
+        cached = set()
+        for chunk in _chunks(record_ids):
+            cached.update(SpectrumFeature.objects.filter(
+                config_hash=key, record_id__in=chunk
+            ).values_list('record_id', flat=True))
+        missing = [record_id for record_id in record_ids if record_id not in cached]
+
+        workers = min(worker_count(settings.PREPROCESSING_WORKERS if workers is None else workers),
+                      len(missing) // QUERY_CHUNK_SIZE)
+        if len(missing) < PARALLEL_MIN_RECORDS or workers < 2:
+            return len(FeatureStore._compute(missing, config, key, length)) if missing else 0
+
+        # 分片不超过单次查询上限，分片数多于进程数以平衡负载
+        shards = list(_chunks(missing))
+        with process_pool(workers) as pool:
+            computed = sum(pool.map(
+                precompute_features_shard, shards,
+                [config] * len(shards), [length] * len(shards),
+            ))
+        logger.info("Feature store: %d computed in %d shards by %d processes (config %s)",
+                    computed, len(shards), workers, key[:8])
+        return computed
+
+    @staticmethod
+    def invalidate(record_ids):
+        """删除指定记录的全部特征缓存"""
+        SpectrumFeature.objects.filter(record_id__in=list(record_ids)).delete()
+
+    @staticmethod
+    def _compute(record_ids, config, key, length):
+        vectors = {}
+        target_x = canonical_grid(length)
+        for chunk in _chunks(record_ids):
+            ids, spectra = [], []
+            records = SpectrumRecord.objects.filter(id__in=chunk).only('id', 'spectral_blob', 'spectral_data', 'wavenumber_grid')
+            for record in records:
+                x_array, y_array = record.get_spectrum()
+                if y_array is None:
+                    continue
+                ids.append(record.id)
+                spectra.append((x_array, y_array))
+
+            processed = RamanPreprocessor.process_spectra(spectra, config, target_x=target_x)
+            features = []
+            for record_id, row in zip(ids, processed):
+                vector = np.asarray(row, dtype=np.float32)
+                vectors[record_id] = vector
+                features.append(SpectrumFeature(
+                    record_id=record_id, config_hash=key, length=length, data=vector.tobytes()
+                ))
+            SpectrumFeature.objects.bulk_create(features, ignore_conflicts=True)
+        return vectors
@@ -0,0 +1,176 @@
+"""
+MultiTaskRamanCNN 超参数搜索。
+
+试验配置按网格或随机采样生成，在进程池中并行训练；各试验共享语料快照（每种预处理配置只生成一次）。
+剪枝采用异步逐次减半 (ASHA)：试验训练到各轮次 (rung) 的 epoch 数时，把当前最优验证损失写入
+TrainingTrial.rung_losses，若不在已到达该轮次试验中的前 1/eta 则提前结束。
+剪枝、早停与试验排序都使用验证集诊断损失：多任务总损失含 aux_weight，而 aux_weight 本身是搜索维度，
+按总损失比较会偏向 aux_weight=0 的试验。
+进程间通过数据库共享各试验的轮次结果，不需要额外的协调进程。
+"""
+import itertools
+import logging
+import random
+
+import torch
+
+from .cnn import MultiTaskRamanCNN
+from .models import TrainingTrial
+from .training import DEFAULT_HYPERPARAMS, evaluate, fit, make_loaders
+from .utils.dataset import RamanDataset
+
+logger = logging.getLogger(__name__)
+
+# 默认搜索空间：每个参数的候选值列表
+DEFAULT_SEARCH_SPACE = {
+    'lr': [3e-4, 1e-3, 3e-3],
+    'batch_size': [16, 32, 64],
+    'aux_weight': [0.0, 0.1, 0.2, 0.5],
+    'patience': [10, 15],
+}
+
+# 预处理配置的候选值（覆盖默认预处理配置中的同名项）；每种组合生成一份语料快照
+DEFAULT_PREPROCESSING_SPACE = {
+    'baseline_degree': [3, 5],
+}
+
+# 随机搜索未指定试验数时的默认值
+DEFAULT_RANDOM_TRIALS = 16
+
+# 逐次减半：第一个轮次的 epoch 数与每轮保留比例 1/eta
+MIN_RUNG_EPOCHS = 5
+REDUCTION_FACTOR = 3
+
+
+def sample_trials(space, preprocessing_space, n_trials=None, mode='random', seed=0):
+    """
+    生成试验配置。
+    :param mode: 'grid' 按全部组合（n_trials 不为空时取前 n_trials 个）；
+                 'random' 从组合中不放回抽样 n_trials 个（默认 DEFAULT_RANDOM_TRIALS）
+    :return: [(hyperparams, preprocessing_overrides), ...]
+    """
+    if mode not in ('grid', 'random'):
+        raise ValueError(f"Unknown search mode: {mode}")
+    names = [('hp', key) for key in sorted(space)] + [('pre', key) for key in sorted(preprocessing_space)]
+    choices = [space[key] if kind == 'hp' else preprocessing_space[key] for kind, key in names]
+    combos = list(itertools.product(*choices))
+    if mode == 'random':
+        combos = random.Random(seed).sample(combos, min(n_trials or DEFAULT_RANDOM_TRIALS, len(combos)))
+    elif n_trials:
+        combos = combos[:n_trials]
+
+    trials = []
+    for combo in combos:
+        hyperparams, preprocessing = {}, {}
+        for (kind, key), value in zip(names, combo):
+            (hyperparams if kind == 'hp' else preprocessing)[key] = value
+        trials.append((hyperparams, preprocessing))
+    return trials
+
+
+def rung_epochs(min_epochs=MIN_RUNG_EPOCHS, eta=REDUCTION_FACTOR, max_epochs=DEFAULT_HYPERPARAMS['max_epochs']):
+    """轮次 epoch 数：min_epochs, min_epochs*eta, ... (< max_epochs)"""
+    rungs = []
+    epochs = min_epochs
+    while epochs < max_epochs:
+        rungs.append(epochs)
+        epochs *= eta
+    return rungs
+
+
+class SuccessiveHalvingPruner:
+    """
+    异步逐次减半剪枝（可序列化，传给 worker 进程）。
+    到达某一轮次的试验少于 eta 个时不剪枝，避免先开始的试验因样本不足被误判。
+    """
+
+    def __init__(self, search_id, rungs, eta=REDUCTION_FACTOR):
+        self.search_id = search_id
+        self.rungs = set(rungs)
+        self.eta = eta
+
+    def should_continue(self, trial, epochs, best_val_loss):
+        """
+        :param trial: 当前 TrainingTrial
+        :param epochs: 已训练的 epoch 数
+        :return: False 表示剪枝
+        """
+        if epochs not in self.rungs:
+            return True
+        rung = str(epochs)
+        trial.rung_losses[rung] = best_val_loss
+        trial.epochs = epochs
+        trial.save(update_fields=['rung_losses', 'epochs', 'updated_at'])
+
+        losses = sorted(
+            losses[rung]
+            for losses in TrainingTrial.objects.filter(search_id=self.search_id).values_list('rung_losses', flat=True)
+            if rung in losses
+        )
+        keep = len(losses) // self.eta
+        if keep == 0:
+            return True
+        return best_val_loss <= losses[keep - 1]
+
+
+def run_trial(trial_id, corpus_dir, train_idx, val_idx, input_length, pos_weight, pruner, seed, checkpoint_path):
+    """
+    worker 任务：训练一次试验，结果写回 TrainingTrial；完成（未被剪枝）时把参数保存到 checkpoint_path。
+    :return: 试验状态
+    """
+    from django.db import connection
+    from .corpus import CorpusSnapshot
+
+    trial = TrainingTrial.objects.get(pk=trial_id)
+    trial.status = 'running'
+    trial.save(update_fields=['status', 'updated_at'])
+    try:
+        torch.manual_seed(seed)
+        hparams = {**DEFAULT_HYPERPARAMS, **trial.hyperparams}
+        _, X, y, aux = CorpusSnapshot.open(corpus_dir)
+        dataset = RamanDataset.from_arrays(X, y, aux)
+        train_loader, val_loader = make_loaders(dataset, train_idx, val_idx, hparams['batch_size'])
+
+        model = MultiTaskRamanCNN(input_length=input_length)
+        best = [float('inf')]
+        pruned = [False]
+
+        def on_epoch(epoch, train_loss, val_loss):
+            best[0] = min(best[0], val_loss)
+            if not pruner.should_continue(trial, epoch + 1, best[0]):
+                pruned[0] = True
+                return False
+            return True
+
+        best_val_loss, epochs = fit(model, train_loader, val_loader, pos_weight=pos_weight,
+                                    hparams=hparams, on_epoch=on_epoch, monitor='diagnosis')
+        trial.metrics = evaluate(model, val_loader)
+        trial.best_val_loss = best_val_loss
+        trial.epochs = epochs
+        trial.status = 'pruned' if pruned[0] else 'completed'
+        if not pruned[0]:
+            torch.save(model.state_dict(), checkpoint_path)
+    except Exception:
+        logger.exception("Trial %s#%d failed.", trial.search_id, trial.number)
+        trial.status = 'failed'
+    trial.save()
+    connection.close()
+    logger.info("Trial %s#%d %s after %d epochs (best_val_loss=%s)",
+                trial.search_id, trial.number, trial.status, trial.epochs, trial.best_val_loss)
+    return trial.status
+
+
+def best_trial(search_id):
+    """验证诊断损失最低的已完成试验；没有时返回 None"""
+    return (TrainingTrial.objects
+            .filter(search_id=search_id, status='completed', best_val_loss__isnull=False)
+            .order_by('best_val_loss', 'number')
+            .first())
+
+
+def summarize_search(search_id):
+    """各状态的试验数"""
+    counts = {}
+    for status in TrainingTrial.objects.filter(search_id=search_id).values_list('status', flat=True):
+        counts[status] = counts.get(status, 0) + 1
+    return counts
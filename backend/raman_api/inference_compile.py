@@ -0,0 +1,190 @@
+"""
+MultiTaskRamanCNN 推理编译。
+
+把 eval 模式的 MultiTaskRamanCNN 改写为仅用于推理的等价网络：
+  - BatchNorm1d 折叠进前一个 Conv1d
+  - 去掉 Dropout（eval 模式下为恒等映射）
+  - 五个 32→1 任务头合并为一个 32→5 线性层，输出 (B, 5) logits，列顺序同 OUTPUT_HEADS
+再经 TorchScript trace → freeze → optimize_for_inference，结果缓存在 .pth 旁边
+（注册新版本时即生成，加载时缓存缺失或失效才重新编译）。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from torch.nn.utils import fuse_conv_bn_eval
+
+from .cnn import OUTPUT_HEADS
+
+logger = logging.getLogger(__name__)
+
+# 与 OUTPUT_HEADS 顺序对应的任务头属性名
+HEAD_ATTRS = ('head_diagnosis', 'head_er', 'head_pr', 'head_her2', 'head_ki67')
+
+# 编译结果与 eager 模型的最大允许概率差
+PARITY_TOLERANCE = 1e-4
+
+CACHE_SUFFIX = '.ts'
+
+
+class FusedRamanCNN(nn.Module):
+    """MultiTaskRamanCNN 的推理等价网络，forward 返回 (B, 5) logits"""
+
+    def __init__(self, features, shared_fc, heads):
+        super().__init__()
+        self.features = features
+        self.shared_fc = shared_fc
+        self.heads = heads
+
+    @classmethod
+    def from_model(cls, model):
+        model = model.eval()
+        layers = []
+        modules = list(model.features)
+        i = 0
+        while i < len(modules):
+            module = modules[i]
+            following = modules[i + 1] if i + 1 < len(modules) else None
+            if isinstance(module, nn.Conv1d) and isinstance(following, nn.BatchNorm1d):
+                layers.append(fuse_conv_bn_eval(module, following))
+                i += 2
+                continue
+            layers.append(module)
+            i += 1
+        features = nn.Sequential(*layers, nn.Flatten(1))
+
+        shared_fc = nn.Sequential(*[m for m in model.shared_fc if not isinstance(m, nn.Dropout)])
+
+        head_layers = [getattr(model, name) for name in HEAD_ATTRS]
+        heads = nn.Linear(head_layers[0].in_features, len(head_layers))
+        with torch.no_grad():
+            heads.weight.copy_(torch.cat([head.weight for head in head_layers], dim=0))
+            heads.bias.copy_(torch.cat([head.bias for head in head_layers], dim=0))
+
+        return cls(features, shared_fc, heads).eval()
+
+    def forward(self, x):
+        return self.heads(self.shared_fc(self.features(x)))
+
+
+def eager_logits(model, x):
+    """eager 模型输出拼成 (B, 5) logits，便于与编译结果比较"""
+    outputs = model(x)
+    return torch.cat([outputs[head] for head in OUTPUT_HEADS], dim=1)
+
+
+def compile_model(model, input_length, example_batch=8):
+    """
+    :return: 冻结并优化后的 TorchScript 模块
+    """
+    fused = FusedRamanCNN.from_model(model)
+    example = torch.randn(example_batch, 1, input_length)
+    with torch.no_grad():
+        traced = torch.jit.trace(fused, example)
+        frozen = torch.jit.freeze(traced.eval())
+        return torch.jit.optimize_for_inference(frozen)
+
+
+def check_parity(model, compiled, input_length, batch_sizes=(1, 7, 32), seed=0):
+    """
+    比较 eager 模型与编译模型在随机输入上的 sigmoid 概率。
+    :return: 最大绝对误差
+    """
+    generator = torch.Generator().manual_seed(seed)
+    max_diff = 0.0
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            x = torch.rand(batch_size, 1, input_length, generator=generator)
+            expected = torch.sigmoid(eager_logits(model, x))
+            actual = torch.sigmoid(compiled(x))
+            max_diff = max(max_diff, (expected - actual).abs().max().item())
+    return max_diff
+
+
+def measure_latency(fn, input_length, batch_size=1, repeats=50, warmup=5):
+    """单次前向计算的中位延迟 (毫秒)"""
+    x = torch.rand(batch_size, 1, input_length)
+    timings = []
+    with torch.no_grad():
+        for i in range(warmup + repeats):
+            started = time.perf_counter()
+            fn(x)
+            if i >= warmup:
+                timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _checkpoint_fingerprint(checkpoint_path):
+    digest = hashlib.sha1()
+    with open(checkpoint_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path_for(checkpoint_path):
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(checkpoint_path.stem + CACHE_SUFFIX + '.pt')
+
+
+def load_or_compile(model, checkpoint_path, input_length, compile_missing=True):
+    """
+    读取 .pth 旁的编译缓存；缓存缺失、与 checkpoint 不匹配或 torch 版本变化时重新编译并通过一致性校验后写入。
+    :param compile_missing: 为 False 时只读取缓存，不编译（编译要做前向计算，pre-fork 主进程中不允许）
+    :return: (compiled_module, info)；校验失败或未编译时 compiled_module 为 None
+    """
+    cache_path = cache_path_for(checkpoint_path)
+    fingerprint = {
+        'checkpoint_sha1': _checkpoint_fingerprint(checkpoint_path),
+        'torch': torch.__version__,
+        'input_length': input_length,
+    }
+
+    if cache_path.exists():
+        extra_files = {'meta.json': ''}
+        try:
+            compiled = torch.jit.load(str(cache_path), map_location='cpu', _extra_files=extra_files)
+            if json.loads(extra_files['meta.json'] or '{}') == fingerprint:
+                logger.info("Loaded compiled inference model from %s", cache_path)
+                return compiled, {'source': 'cache', 'path': str(cache_path)}
+        except Exception:
+            logger.warning("Compiled model cache %s is unreadable, rebuilding.", cache_path, exc_info=True)
+
+    if not compile_missing:
+        return None, {'source': 'deferred', 'path': str(cache_path)}
+
+    started = time.perf_counter()
+    compiled = compile_model(model, input_length)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    max_diff = check_parity(model, compiled, input_length)
+    info = {
+        'source': 'compiled',
+        'path': str(cache_path),
+        'compile_ms': round(compile_ms, 1),
+        'parity_max_abs_diff': max_diff,
+        'eager_latency_ms': round(measure_latency(model, input_length), 3),
+        'compiled_latency_ms': round(measure_latency(compiled, input_length), 3),
+    }
+    if max_diff > PARITY_TOLERANCE:
+        logger.error("Compiled model failed parity check (max diff %.2e), using eager model.", max_diff)
+        return None, info
+
+    # 先写临时文件再原子替换：多个 worker 同时冷启动时不会读到写了一半的缓存
+    fd, staging = tempfile.mkstemp(prefix=cache_path.name + '.', suffix='.tmp', dir=cache_path.parent)
+    os.close(fd)
+    try:
+        torch.jit.save(compiled, staging, _extra_files={'meta.json': json.dumps(fingerprint)})
+        os.replace(staging, cache_path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    logger.info("Compiled inference model: %s", info)
+    return compiled, info
@@ -0,0 +1,164 @@
+"""
+进程内动态微批推理队列。
+
+Web 线程提交已预处理的输入并等待 Future；单个推理线程在 max_wait_ms 内
+（或凑满 max_batch_size 条时）收集请求，合并为一次批量前向计算后把结果分发回各个 Future。
+调用方可用 reserve() 声明正在准备的请求：已收集到全部在途请求时立即执行，
+没有并发时不产生额外等待。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def _bucket(value):
+    """2 的幂分桶：0, 1, 2-3, 4-7, ..."""
+    if value <= 1:
+        return str(value)
+    low = 1 << (value.bit_length() - 1)
+    return f"{low}-{2 * low - 1}"
+
+
+class MicroBatcher:
+    """
+    微批调度器。
+    :param runner: 批量执行函数，接收输入列表，返回等长的结果列表
+    :param max_batch_size: 单批最多条数
+    :param max_wait_ms: 收到第一条请求后最多等待的毫秒数
+    """
+
+    def __init__(self, runner, max_batch_size=32, max_wait_ms=5.0, name='inference'):
+        self.runner = runner
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._worker = None
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def submit(self, item):
+        """提交一条输入，返回 concurrent.futures.Future"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item, timeout=None):
+        """提交并阻塞等待结果"""
+        return self.submit(item).result(timeout=timeout)
+
+    @contextmanager
+    def reserve(self):
+        """
+        声明一条即将提交的请求（覆盖预处理到取回结果的整个过程）。
+        推理线程据此判断是否还有值得等待的请求。
+        """
+        with self._lock:
+            self._inflight += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def stats(self):
+        """队列深度、批大小分布及等待时间统计"""
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'requests': self._requests,
+                'batches': batches,
+                'errors': self._errors,
+                'mean_batch_size': round(self._requests / batches, 2) if batches else 0.0,
+                'mean_wait_ms': round(self._wait_total * 1000 / self._requests, 3) if self._requests else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'queue_depth_histogram': dict(self._queue_depths),
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _reset_stats(self):
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._wait_total = 0.0
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._loop, name=f"{self.name}-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect(self):
+        """阻塞等待第一条请求，然后在截止时间前尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self._queue.empty() and 0 < self._inflight <= len(batch):
+                # 已声明的请求都已到齐，不再等待
+                break
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            depth = self._queue.qsize()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.runner(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"Batch runner returned {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as exc:
+                logger.exception("Micro-batch of %d failed.", len(batch))
+                results = None
+                error = exc
+
+            with self._stats_lock:
+                self._requests += len(batch)
+                self._batches += 1
+                self._wait_total += sum(started - enqueued for _, _, enqueued in batch)
+                self._max_queue_depth = max(self._max_queue_depth, depth + len(batch))
+                self._batch_sizes[len(batch)] += 1
+                self._queue_depths[_bucket(depth)] += 1
+                if results is None:
+                    self._errors += len(batch)
+
+            for index, (_, future, _) in enumerate(batch):
+                if results is None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[index])
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0003_modelversion_diagnosisfeedback"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpectrumFeature",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "config_hash",
+                    models.CharField(help_text="预处理配置哈希", max_length=40),
+                ),
+                ("length", models.PositiveIntegerField(help_text="特征向量长度")),
+                ("data", models.BinaryField(help_text="float32 特征向量")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "record",
+                    models.ForeignKey(
+                        help_text="关联光谱记录",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="features",
+                        to="raman_api.spectrumrecord",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("record", "config_hash")},
+            },
+        ),
+    ]
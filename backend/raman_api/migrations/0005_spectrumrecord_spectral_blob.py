@@ -0,0 +1,136 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:59
+
+import struct
+
+import numpy as np
+from django.db import migrations, models
+
+BATCH_SIZE = 200
+
+# 迁移使用冻结的编码实现，不依赖 raman_api.spectral_storage 的当前版本
+MAGIC = b"RSPC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+DTYPE_CODES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+DTYPE_IDS = {dtype: code for code, dtype in DTYPE_CODES.items()}
+AXIS_INLINE = 0
+AXIS_CANONICAL_1801 = 1
+AXIS_NONE = 0xFFFF
+SHARED_AXES = {AXIS_CANONICAL_1801: np.linspace(400.0, 2200.0, 1801)}
+
+
+def encode_spectrum(x_data, y_data, dtype=np.float32):
+    dtype = np.dtype(dtype).newbyteorder("<")
+    y_array = np.asarray(y_data, dtype=dtype)
+    x_array = np.asarray(x_data, dtype=np.float64)
+    if x_array.size and x_array.shape != y_array.shape:
+        raise ValueError("x 和 y 数组长度必须一致")
+
+    axis_id = AXIS_NONE if x_array.size == 0 else AXIS_INLINE
+    for shared_id, axis in SHARED_AXES.items():
+        if x_array.shape == axis.shape and np.array_equal(x_array, axis):
+            axis_id = shared_id
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_IDS[dtype], axis_id, len(y_array))
+    parts = [header, y_array.tobytes()]
+    if axis_id == AXIS_INLINE:
+        parts.append(x_array.astype("<f8", copy=False).tobytes())
+    return b"".join(parts)
+
+
+def decode_spectrum(blob):
+    blob = bytes(blob)
+    magic, version, dtype_id, axis_id, length = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported spectral blob format")
+
+    dtype = DTYPE_CODES[dtype_id]
+    y_array = np.frombuffer(blob, dtype=dtype, count=length, offset=HEADER.size)
+    if axis_id == AXIS_INLINE:
+        x_array = np.frombuffer(
+            blob, dtype="<f8", count=length, offset=HEADER.size + length * dtype.itemsize
+        )
+    elif axis_id == AXIS_NONE:
+        x_array = np.empty(0)
+    else:
+        x_array = SHARED_AXES[axis_id]
+    return x_array, y_array
+
+
+def pack_spectral_data(apps, schema_editor):
+    """把已有记录的 JSON 光谱转存为二进制并清空 JSON 字段"""
+    SpectrumRecord = apps.get_model("raman_api", "SpectrumRecord")
+    pending = []
+    records = (
+        SpectrumRecord.objects.filter(spectral_data__isnull=False)
+        .only("id", "spectral_data")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for record in records:
+        data = record.spectral_data
+        if not data or "y" not in data:
+            continue
+        try:
+            record.spectral_blob = encode_spectrum(data.get("x", []), data["y"])
+        except (TypeError, ValueError):
+            # 格式异常的旧数据保留 JSON，读取时仍可兼容
+            continue
+        record.spectral_data = None
+        pending.append(record)
+        if len(pending) >= BATCH_SIZE:
+            SpectrumRecord.objects.bulk_update(
+                pending, ["spectral_blob", "spectral_data"]
+            )
+            pending = []
+    if pending:
+        SpectrumRecord.objects.bulk_update(pending, ["spectral_blob", "spectral_data"])
+
+
+def unpack_spectral_data(apps, schema_editor):
+    SpectrumRecord = apps.get_model("raman_api", "SpectrumRecord")
+    pending = []
+    records = (
+        SpectrumRecord.objects.filter(spectral_blob__isnull=False)
+        .only("id", "spectral_blob")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for record in records:
+        x_array, y_array = decode_spectrum(record.spectral_blob)
+        record.spectral_data = {"x": x_array.tolist(), "y": y_array.tolist()}
+        record.spectral_blob = None
+        pending.append(record)
+        if len(pending) >= BATCH_SIZE:
+            SpectrumRecord.objects.bulk_update(
+                pending, ["spectral_blob", "spectral_data"]
+            )
+            pending = []
+    if pending:
+        SpectrumRecord.objects.bulk_update(pending, ["spectral_blob", "spectral_data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0004_spectrumfeature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spectrumrecord",
+            name="spectral_blob",
+            field=models.BinaryField(
+                blank=True,
+                help_text="二进制光谱数据 (float32 强度 + 波数轴引用)",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="spectrumrecord",
+            name="spectral_data",
+            field=models.JSONField(
+                blank=True,
+                help_text="光谱数据 {'x': [], 'y': []} (兼容字段，保存时转为二进制)",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(pack_spectral_data, unpack_spectral_data),
+    ]
@@ -0,0 +1,214 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:01
+
+import hashlib
+import struct
+
+import django.db.models.deletion
+import numpy as np
+from django.db import migrations, models
+
+BATCH_SIZE = 200
+
+# 迁移使用冻结的编码实现，不依赖 raman_api.spectral_storage 的当前版本
+MAGIC = b"RSPC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHI")
+DTYPE_CODES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+DTYPE_IDS = {dtype: code for code, dtype in DTYPE_CODES.items()}
+AXIS_INLINE = 0
+AXIS_CANONICAL_1801 = 1
+AXIS_GRID = 0xFFFE
+AXIS_NONE = 0xFFFF
+SHARED_AXES = {AXIS_CANONICAL_1801: np.linspace(400.0, 2200.0, 1801)}
+
+
+def encode_spectrum(x_data, y_data, dtype=np.float32):
+    dtype = np.dtype(dtype).newbyteorder("<")
+    y_array = np.asarray(y_data, dtype=dtype)
+    x_array = np.asarray(x_data, dtype=np.float64)
+    if x_array.size and x_array.shape != y_array.shape:
+        raise ValueError("x 和 y 数组长度必须一致")
+
+    axis_id = AXIS_NONE if x_array.size == 0 else AXIS_INLINE
+    for shared_id, axis in SHARED_AXES.items():
+        if x_array.shape == axis.shape and np.array_equal(x_array, axis):
+            axis_id = shared_id
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_IDS[dtype], axis_id, len(y_array))
+    parts = [header, y_array.tobytes()]
+    if axis_id == AXIS_INLINE:
+        parts.append(x_array.astype("<f8", copy=False).tobytes())
+    return b"".join(parts)
+
+
+def encode_intensities(y_data, dtype=np.float32, has_axis=True):
+    dtype = np.dtype(dtype).newbyteorder("<")
+    y_array = np.asarray(y_data, dtype=dtype)
+    axis_id = AXIS_GRID if has_axis else AXIS_NONE
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_IDS[dtype], axis_id, len(y_array))
+    return header + y_array.tobytes()
+
+
+def grid_key(x_data):
+    """波数轴内容哈希 (float64 字节的 SHA-1)"""
+    x_array = np.ascontiguousarray(x_data, dtype=np.float64)
+    return hashlib.sha1(x_array.tobytes()).hexdigest()
+
+
+def decode_spectrum(blob, grid_axis=None):
+    blob = bytes(blob)
+    magic, version, dtype_id, axis_id, length = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported spectral blob format")
+
+    dtype = DTYPE_CODES[dtype_id]
+    y_array = np.frombuffer(blob, dtype=dtype, count=length, offset=HEADER.size)
+    if axis_id == AXIS_INLINE:
+        x_array = np.frombuffer(
+            blob, dtype="<f8", count=length, offset=HEADER.size + length * dtype.itemsize
+        )
+    elif axis_id == AXIS_NONE:
+        x_array = np.empty(0)
+    elif axis_id == AXIS_GRID:
+        if grid_axis is None:
+            raise ValueError("Spectral blob references a wavenumber grid but none was given")
+        x_array = grid_axis
+    else:
+        x_array = SHARED_AXES[axis_id]
+    return x_array, y_array
+
+
+def _blob_axis_id(blob):
+    return HEADER.unpack_from(bytes(blob), 0)[3]
+
+
+def move_axes_to_grids(apps, schema_editor):
+    """把记录 blob 中内联/内置的波数轴迁移到 WavenumberGrid 表，blob 只保留强度"""
+    SpectrumRecord = apps.get_model("raman_api", "SpectrumRecord")
+    WavenumberGrid = apps.get_model("raman_api", "WavenumberGrid")
+    grids = {}
+    pending = []
+    records = (
+        SpectrumRecord.objects.filter(spectral_blob__isnull=False)
+        .only("id", "spectral_blob", "wavenumber_grid")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for record in records:
+        if _blob_axis_id(record.spectral_blob) == AXIS_GRID:
+            continue
+        x_array, y_array = decode_spectrum(record.spectral_blob)
+        grid = None
+        if len(x_array):
+            key = grid_key(x_array)
+            grid = grids.get(key)
+            if grid is None:
+                grid, _ = WavenumberGrid.objects.get_or_create(
+                    content_hash=key,
+                    defaults={
+                        "length": len(x_array),
+                        "start": float(x_array[0]),
+                        "stop": float(x_array[-1]),
+                        "data": x_array.astype(float).tobytes(),
+                    },
+                )
+                grids[key] = grid
+        record.wavenumber_grid = grid
+        record.spectral_blob = encode_intensities(
+            y_array, dtype=y_array.dtype, has_axis=grid is not None
+        )
+        pending.append(record)
+        if len(pending) >= BATCH_SIZE:
+            SpectrumRecord.objects.bulk_update(
+                pending, ["spectral_blob", "wavenumber_grid"]
+            )
+            pending = []
+    if pending:
+        SpectrumRecord.objects.bulk_update(
+            pending, ["spectral_blob", "wavenumber_grid"]
+        )
+
+
+def inline_grid_axes(apps, schema_editor):
+    SpectrumRecord = apps.get_model("raman_api", "SpectrumRecord")
+    WavenumberGrid = apps.get_model("raman_api", "WavenumberGrid")
+    axes = {
+        grid.id: np.frombuffer(bytes(grid.data), dtype=np.float64)
+        for grid in WavenumberGrid.objects.all()
+    }
+    pending = []
+    records = (
+        SpectrumRecord.objects.filter(spectral_blob__isnull=False)
+        .only("id", "spectral_blob", "wavenumber_grid")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for record in records:
+        if _blob_axis_id(record.spectral_blob) != AXIS_GRID:
+            continue
+        x_array, y_array = decode_spectrum(
+            record.spectral_blob, axes[record.wavenumber_grid_id]
+        )
+        record.spectral_blob = encode_spectrum(x_array, y_array, dtype=y_array.dtype)
+        record.wavenumber_grid = None
+        pending.append(record)
+        if len(pending) >= BATCH_SIZE:
+            SpectrumRecord.objects.bulk_update(
+                pending, ["spectral_blob", "wavenumber_grid"]
+            )
+            pending = []
+    if pending:
+        SpectrumRecord.objects.bulk_update(
+            pending, ["spectral_blob", "wavenumber_grid"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0005_spectrumrecord_spectral_blob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WavenumberGrid",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="波数轴内容哈希 (SHA-1)", max_length=40, unique=True
+                    ),
+                ),
+                ("length", models.PositiveIntegerField(help_text="点数")),
+                (
+                    "start",
+                    models.FloatField(blank=True, help_text="起始波数", null=True),
+                ),
+                (
+                    "stop",
+                    models.FloatField(blank=True, help_text="结束波数", null=True),
+                ),
+                ("data", models.BinaryField(help_text="float64 波数数组")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="spectrumrecord",
+            name="wavenumber_grid",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="共享波数轴",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="records",
+                to="raman_api.wavenumbergrid",
+            ),
+        ),
+        migrations.RunPython(move_axes_to_grids, inline_grid_axes),
+    ]
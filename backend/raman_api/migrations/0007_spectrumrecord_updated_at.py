@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0006_wavenumbergrid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="spectrumrecord",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, help_text="最后修改时间", null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0007_spectrumrecord_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelversion",
+            name="quantized_path",
+            field=models.CharField(
+                blank=True, help_text="int8 量化模型文件路径", max_length=500, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0008_modelversion_quantized_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ShadowPrediction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "spectrum_hash",
+                    models.CharField(help_text="原始光谱内容哈希", max_length=32),
+                ),
+                (
+                    "active_version",
+                    models.CharField(help_text="生产模型版本", max_length=50),
+                ),
+                (
+                    "shadow_version",
+                    models.CharField(
+                        db_index=True, help_text="影子模型版本", max_length=50
+                    ),
+                ),
+                ("active_diagnosis", models.CharField(max_length=50)),
+                ("shadow_diagnosis", models.CharField(max_length=50)),
+                ("active_confidence", models.FloatField()),
+                ("shadow_confidence", models.FloatField()),
+                ("active_markers", models.JSONField(blank=True, null=True)),
+                ("shadow_markers", models.JSONField(blank=True, null=True)),
+                ("agreed", models.BooleanField(help_text="诊断结果是否一致")),
+                (
+                    "markers_agreed",
+                    models.BooleanField(help_text="分子分型预测是否一致"),
+                ),
+                (
+                    "active_latency_ms",
+                    models.FloatField(help_text="生产模型单条耗时 (毫秒)"),
+                ),
+                (
+                    "shadow_latency_ms",
+                    models.FloatField(help_text="影子模型单条耗时 (毫秒)"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="modelversion",
+            name="is_shadow",
+            field=models.BooleanField(
+                default=False, help_text="是否作为影子模型在线对比 (不影响返回结果)"
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0009_shadow_inference"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrainingTrial",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "search_id",
+                    models.CharField(
+                        db_index=True, help_text="所属搜索任务", max_length=50
+                    ),
+                ),
+                ("number", models.PositiveIntegerField(help_text="试验序号")),
+                (
+                    "hyperparams",
+                    models.JSONField(
+                        help_text="训练超参数 (lr, batch_size, aux_weight, ...)"
+                    ),
+                ),
+                ("preprocessing", models.JSONField(help_text="预处理配置")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("pruned", "Pruned"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "epochs",
+                    models.PositiveIntegerField(
+                        default=0, help_text="实际训练的 epoch 数"
+                    ),
+                ),
+                (
+                    "best_val_loss",
+                    models.FloatField(blank=True, help_text="最优验证损失", null=True),
+                ),
+                (
+                    "rung_losses",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="各轮次 epoch 处的最优验证损失 {epoch: loss}",
+                    ),
+                ),
+                (
+                    "metrics",
+                    models.JSONField(
+                        blank=True, help_text="验证集医疗级指标", null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "model_version",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="由该试验注册的模型版本",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="trials",
+                        to="raman_api.modelversion",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("search_id", "number")},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0010_trainingtrial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modelversion",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="微调起点版本",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="children",
+                to="raman_api.modelversion",
+            ),
+        ),
+    ]
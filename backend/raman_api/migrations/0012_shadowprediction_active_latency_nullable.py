@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("raman_api", "0011_modelversion_parent"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="shadowprediction",
+            name="active_latency_ms",
+            field=models.FloatField(
+                blank=True,
+                help_text="生产模型单条耗时 (毫秒)；命中缓存或走微批队列时为空",
+                null=True,
+            ),
+        ),
+    ]
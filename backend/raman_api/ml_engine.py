@@ -1,20 +1,47 @@
+import gc
 import os
 import logging
+import random
+import shutil
 import threading
+import time
 import joblib
 import numpy as np
 import torch
-import torch.nn as nn
-import torch.optim as optim
-from torch.utils.data import DataLoader, random_split
 from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q
+from django.utils import timezone
+from concurrent.futures import as_completed
 from pathlib import Path
 import datetime
 
-from .models import ModelVersion, SpectrumRecord
+from .models import DiagnosisFeedback, ModelVersion, SpectrumRecord, TrainingTrial
+from .corpus import CorpusSnapshot, TrainingManifest
+from .feature_store import QUERY_CHUNK_SIZE, FeatureStore, config_hash
 from .preprocessing import RamanPreprocessor
-from .cnn import MultiTaskRamanCNN
-from .utils.dataset import RamanDataset
+from .resampling import canonical_grid, resample
+from .shadow import ShadowWorker, record_shadow_results, shadow_summary
+from .cnn import OUTPUT_HEADS, MultiTaskRamanCNN
+from .hyperparameter_search import (
+    DEFAULT_PREPROCESSING_SPACE, DEFAULT_SEARCH_SPACE, MIN_RUNG_EPOCHS, REDUCTION_FACTOR,
+    SuccessiveHalvingPruner, best_trial, rung_epochs, run_trial, sample_trials, summarize_search,
+)
+from .inference_compile import load_or_compile, measure_latency
+from .inference_queue import MicroBatcher
+from .model_registry import LoadedModel, ModelRegistry
+from .parallel import process_pool, worker_count
+from .prediction_cache import PredictionCache
+from .startup import StartupReport
+from .quantization import (
+    LATENCY_BATCH_SIZES, diagnosis_probabilities, load_quantized, quantize_model,
+    quantized_path_for, save_quantized,
+)
+from .training import (
+    DEFAULT_HYPERPARAMS, class_pos_weight, compute_medical_metrics, evaluate, fit, holdout_indices,
+    make_loaders, stratified_folds, summarize_folds, train_split,
+)
+from .utils.dataset import MetadataParser, RamanDataset
 
 logger = logging.getLogger(__name__)
 
@@ -33,16 +60,8 @@ DEFAULT_PREPROCESSING_CONFIG = {
 
 TARGET_INPUT_LENGTH = 1801
 
-
-def _interpolate_to_length(y, target_len=TARGET_INPUT_LENGTH):
-    """将光谱插值到目标长度"""
-    if len(y) == target_len:
-        return y
-    from scipy import interpolate
-    current_x = np.linspace(0, 1, len(y))
-    target_x = np.linspace(0, 1, target_len)
-    f = interpolate.interp1d(current_x, y, kind='linear', fill_value='extrapolate')
-    return f(target_x)
+# 增量微调的最少样本数（少于此数不足以划分训练/验证集）
+FINETUNE_MIN_SAMPLES = 5
 
 
 class MLEngine:
@@ -51,11 +70,33 @@ class MLEngine:
     训练通过 start_training_async() 异步触发，不阻塞 HTTP 请求。
     """
 
-    _current_model = None
-    _model_type = None       # 'sklearn' or 'torch'
-    _model_version = None
-    _model_config = {}
-    _preprocessing_config = DEFAULT_PREPROCESSING_CONFIG.copy()
+    # 已加载模型的 LRU 注册表；激活版本为其中的一个指针
+    _registry = ModelRegistry(
+        lambda version: MLEngine._load_version(version),
+        capacity=settings.MODEL_REGISTRY_SIZE,
+    )
+
+    # 首次使用时加载激活模型（只尝试一次，并发请求等待同一次加载）
+    _startup_lock = threading.Lock()
+    _startup_loaded = False
+
+    # 跨进程热更新：节流查询数据库中的激活版本，变化时在后台加载、预热后再切换指针
+    _version_check_lock = threading.Lock()
+    _version_checked_at = 0.0
+    _reload_thread = None
+    _hot_reloads = 0
+    _last_warmup = None
+
+    # 影子推理：候选版本及其有界后台队列
+    _shadow_version = None
+    _shadow_worker = None
+
+    # pre-fork 主进程中加载时为 True：不编译、不做前向计算
+    _prefork = False
+
+    # 并发单条推理的微批队列
+    _batcher = None
+    _batcher_lock = threading.Lock()
 
     # 异步训练状态
     _training_lock = threading.Lock()
@@ -72,112 +113,553 @@ class MLEngine:
     # -------------------------------------------------------------------------
 
     @classmethod
-    def load_active_model(cls):
-        """加载当前激活的模型"""
+    def load_active_model(cls, reload=False, warm_up=True):
+        """
+        激活数据库中标记为 is_active 的版本。
+        已在注册表中的版本直接切换指针，不重新加载（reload=True 时强制重新加载）。
+        :param warm_up: 发布前先用合成批次预热（pre-fork 主进程中为 False）
+        """
         try:
             active_model_record = ModelVersion.objects.filter(is_active=True).last()
             if not active_model_record:
                 logger.warning("No active model found in database.")
                 return
 
-            model_path = active_model_record.file_path
-            if not os.path.exists(model_path):
-                logger.error("Model file not found: %s", model_path)
+            cls._activate(active_model_record.version, reload=reload, warm_up=warm_up)
+
+        except Exception:
+            logger.exception("Failed to load active model.")
+
+    @classmethod
+    def _activate(cls, version, reload=False, warm_up=True):
+        """加载 -> 预热 -> 发布：激活指针只会指向已预热的完整快照"""
+        loaded = cls._registry.get(version, reload=reload)
+        if warm_up:
+            cls._warm_up(loaded)
+        loaded, previous = cls._registry.publish(loaded)
+        cls._refresh_shadow_version()
+        if previous is None or previous.version != loaded.version:
+            # 切换版本后旧版本的推理缓存不再有效
+            PredictionCache.clear()
+        logger.info("Active model version: %s (%s)", loaded.version, loaded.variant or loaded.model_type)
+        return loaded
+
+    @classmethod
+    def ensure_model_loaded(cls, warm_up=True):
+        """进程内首次调用时加载激活模型（由首次推理或 MODEL_PRELOAD 触发）"""
+        if cls._startup_loaded:
+            return
+        with cls._startup_lock:
+            if cls._startup_loaded:
                 return
+            with StartupReport.timed('model_load'):
+                cls.load_active_model(warm_up=warm_up)
+            cls._startup_loaded = True
 
-            if model_path.endswith('.pth'):
-                checkpoint = torch.load(model_path, map_location=torch.device('cpu'))
-                if isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
-                    state_dict = checkpoint['state_dict']
-                    cls._model_config = checkpoint.get('config', {})
-                    # 加载随 checkpoint 保存的预处理配置
-                    cls._preprocessing_config = checkpoint.get(
-                        'preprocessing', DEFAULT_PREPROCESSING_CONFIG.copy()
-                    )
-                else:
-                    state_dict = checkpoint
-                    cls._model_config = {}
-                    cls._preprocessing_config = DEFAULT_PREPROCESSING_CONFIG.copy()
-
-                input_len = cls._model_config.get('input_length', TARGET_INPUT_LENGTH)
-                cls._current_model = MultiTaskRamanCNN(input_length=input_len)
-                cls._current_model.load_state_dict(state_dict)
-                cls._current_model.eval()
-                cls._model_type = 'torch'
-            else:
-                cls._current_model = joblib.load(model_path)
-                cls._model_type = 'sklearn'
-                cls._preprocessing_config = DEFAULT_PREPROCESSING_CONFIG.copy()
+    @classmethod
+    def get_model(cls, model_version=None):
+        """
+        返回推理使用的模型快照。
+        :param model_version: 指定版本号；省略时为当前激活版本（可能为 None）
+        """
+        if model_version is None:
+            if cls._registry.active is None:
+                cls.ensure_model_loaded()
+            # 启动时没有激活版本或加载失败的进程也靠这里发现之后发布的版本
+            cls._check_active_version()
+            return cls._registry.active
+        return cls._registry.get(model_version)
 
-            cls._model_version = active_model_record.version
-            logger.info("Loaded model version: %s (%s)", cls._model_version, cls._model_type)
+    @classmethod
+    def _check_active_version(cls):
+        """
+        每 MODEL_VERSION_CHECK_INTERVAL 秒最多查询一次数据库中的激活/影子版本。
+        激活版本被其他进程（训练线程、管理接口）切换或首次发布时在后台线程加载新版本，
+        当前请求及加载完成前的请求继续使用原快照（尚无快照时为 None）。
+        """
+        interval = settings.MODEL_VERSION_CHECK_INTERVAL
+        if interval <= 0 or time.monotonic() - cls._version_checked_at < interval:
+            return
+        if not cls._version_check_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - cls._version_checked_at < interval:
+                return
+            cls._version_checked_at = time.monotonic()
+
+            active_version = shadow_version = None
+            rows = (ModelVersion.objects.filter(Q(is_active=True) | Q(is_shadow=True))
+                    .order_by('id').values_list('version', 'is_active', 'is_shadow'))
+            for version, is_active, is_shadow in rows:
+                if is_active:
+                    active_version = version
+                elif is_shadow:
+                    shadow_version = version
+            cls._shadow_version = shadow_version
+
+            current = cls._registry.active
+            reloading = cls._reload_thread is not None and cls._reload_thread.is_alive()
+            stale = current is None or current.version != active_version
+            if active_version and stale and not reloading:
+                cls._reload_thread = threading.Thread(
+                    target=cls._hot_reload, args=(active_version,), name='model-hot-reload', daemon=True
+                )
+                cls._reload_thread.start()
+        except Exception:
+            logger.exception("Active model version check failed.")
+        finally:
+            cls._version_check_lock.release()
 
+    @classmethod
+    def _hot_reload(cls, version):
+        """后台线程：加载并预热新版本，再原子切换激活指针"""
+        try:
+            started = time.perf_counter()
+            cls._activate(version)
+            cls._hot_reloads += 1
+            logger.info("Hot-reloaded model %s in %.1f ms", version, (time.perf_counter() - started) * 1000)
         except Exception:
-            logger.exception("Failed to load active model.")
+            logger.exception("Hot reload of model %s failed.", version)
+        finally:
+            connection.close()
+
+    @classmethod
+    def _warm_up(cls, loaded):
+        """
+        发布前按 MODEL_WARMUP_BATCH_SIZES 中的常见批大小，用合成光谱各跑一次完整推理
+        （预处理工作区与算子缓存、前向计算的内存分配），切换后的首个请求即为稳态延迟。
+        预热失败只记录日志，不阻止发布。
+        """
+        batch_sizes = settings.MODEL_WARMUP_BATCH_SIZES
+        if not batch_sizes:
+            return
+        grid = canonical_grid(loaded.input_length) if loaded.input_length else canonical_grid()
+        rng = np.random.default_rng(0)
+        started = time.perf_counter()
+        try:
+            for batch_size in batch_sizes:
+                spectra = [(grid, rng.random(len(grid))) for _ in range(batch_size)]
+                cls._predict_uncached(loaded, spectra, batch_size)
+        except Exception:
+            logger.warning("Warm-up of model %s failed.", loaded.version, exc_info=True)
+            return
+        cls._last_warmup = {
+            'version': loaded.version,
+            'batch_sizes': list(batch_sizes),
+            'ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info("Warmed up model %s: %s", loaded.version, cls._last_warmup)
+
+    @classmethod
+    def _load_version(cls, version):
+        """从 ModelVersion 记录加载模型，构造不可变的 LoadedModel 快照"""
+        model_record = ModelVersion.objects.get(version=version)
+        model_path = model_record.file_path
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        compile_info = None
+        if model_path.endswith('.pth'):
+            # mmap 读取 + assign：参数直接引用文件映射页，多个进程共享页缓存中的同一份权重
+            checkpoint = torch.load(model_path, map_location=torch.device('cpu'), mmap=True)
+            if isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
+                state_dict = checkpoint['state_dict']
+                model_config = checkpoint.get('config', {})
+                # 加载随 checkpoint 保存的预处理配置
+                preprocessing_config = checkpoint.get(
+                    'preprocessing', DEFAULT_PREPROCESSING_CONFIG.copy()
+                )
+            else:
+                state_dict = checkpoint
+                model_config = {}
+                preprocessing_config = DEFAULT_PREPROCESSING_CONFIG.copy()
+
+            input_len = model_config.get('input_length', TARGET_INPUT_LENGTH)
+            model = MultiTaskRamanCNN(input_length=input_len)
+            model.load_state_dict(state_dict, assign=True)
+            model.eval()
+            variant = 'fp32'
+            if settings.INFERENCE_QUANTIZED:
+                quantized = cls._load_quantized_variant(model_record)
+                if quantized is not None:
+                    model, variant = quantized, 'int8'
+            if variant == 'fp32' and settings.INFERENCE_COMPILE:
+                # 折叠 BN / 合并任务头后的 TorchScript 模块，输出 (B, 5) logits
+                # 主进程中缓存缺失时推迟到 worker（见 init_worker）
+                compiled, compile_info = load_or_compile(
+                    model, model_path, input_len, compile_missing=not cls._prefork
+                )
+                if compiled is not None:
+                    model, variant = compiled, 'compiled'
+            model_type = 'torch'
+        else:
+            model = joblib.load(model_path, mmap_mode='r')
+            model_type, variant = 'sklearn', None
+            input_len = getattr(model, 'n_features_in_', None)
+            preprocessing_config = DEFAULT_PREPROCESSING_CONFIG.copy()
+
+        return LoadedModel(
+            version=model_record.version,
+            model=model,
+            model_type=model_type,
+            variant=variant,
+            input_length=input_len,
+            preprocessing_config=preprocessing_config,
+            # 预处理配置编译一次，predict 只执行计划
+            plan=RamanPreprocessor.compile(preprocessing_config),
+            cache_namespace=PredictionCache.namespace(
+                model_record.version, config_hash(preprocessing_config, TARGET_INPUT_LENGTH)
+            ),
+            compile_info=compile_info,
+            loaded_at=timezone.now(),
+        )
+
+    # -------------------------------------------------------------------------
+    # 多进程部署（pre-fork）
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def preload_for_fork(cls):
+        """
+        由进程管理器在 fork worker 之前于主进程调用（见 gunicorn.conf.py）。
+        加载激活模型和影子模型并构建预处理算子缓存，随后关闭数据库连接、冻结 GC，
+        worker 以写时复制方式共享这些对象，重启 worker 也不必重新读取模型文件。
+        主进程中不做前向计算、不启动后台线程（线程不会随 fork 复制）：编译缓存缺失时推迟到 worker，
+        并把 torch 线程数限制为 1，避免在 fork 之前启动 intra-op 线程池（子进程中不可用）。
+        """
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        cls._prefork = True
+        try:
+            cls._preload_for_fork()
+        finally:
+            cls._prefork = False
+            torch.set_num_threads(num_threads)
+
+    @classmethod
+    def _preload_for_fork(cls):
+        with StartupReport.timed('prefork_preload'):
+            cls.ensure_model_loaded(warm_up=False)
+            preloaded = [cls._registry.active]
+            if cls._shadow_version:
+                try:
+                    preloaded.append(cls._registry.get(cls._shadow_version))
+                except Exception:
+                    logger.exception("Failed to preload shadow model %s.", cls._shadow_version)
+            # 按标准波数轴跑一遍预处理计划，构建 SG / 基线 / 重采样算子缓存
+            grid = canonical_grid()
+            for loaded in preloaded:
+                if loaded is not None:
+                    cls._prepare_batch(loaded, [(grid, np.zeros(len(grid)))])
+            connections.close_all()
+            gc.collect()
+            gc.freeze()
+
+    @classmethod
+    def init_worker(cls, num_threads=None):
+        """
+        fork 之后在每个 worker 进程中调用。
+        :param num_threads: 本进程 torch 计算线程数（默认 settings.INFERENCE_TORCH_THREADS，0 表示不修改）
+        """
+        num_threads = settings.INFERENCE_TORCH_THREADS if num_threads is None else num_threads
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+        # 主进程中的后台线程不会随 fork 复制，在 worker 中按需重新创建
+        cls._batcher = None
+        cls._shadow_worker = None
+        # 主进程推迟的编译在 worker 中完成（重新加载并发布）；主进程不做前向计算，预热在各 worker 中进行
+        active = cls._registry.active
+        if active is not None and (active.compile_info or {}).get('source') == 'deferred':
+            cls._activate(active.version, reload=True)
+        elif active is not None:
+            cls._warm_up(active)
+        logger.info("Inference worker %s initialised (torch threads: %s).", os.getpid(), torch.get_num_threads())
 
     # -------------------------------------------------------------------------
     # 推理
     # -------------------------------------------------------------------------
 
     @classmethod
-    def predict(cls, spectral_data_x, spectral_data_y):
+    def predict(cls, spectral_data_x, spectral_data_y, model_version=None):
         """
-        推理接口
+        推理接口（单条光谱）
+        :param model_version: 指定模型版本；省略时使用当前激活版本
         :return: (diagnosis, confidence, predictions_dict)
         """
-        # 使用与训练时相同的预处理配置
-        preprocess_cfg = cls._preprocessing_config or DEFAULT_PREPROCESSING_CONFIG
-        processed_y = RamanPreprocessor.process_pipeline(
-            spectral_data_x, spectral_data_y, preprocess_cfg
+        loaded = cls.get_model(model_version)
+        spectra = [(spectral_data_x, spectral_data_y)]
+        timing = {}
+        results = cls._predict_cached(
+            loaded, spectra, lambda missing: cls._predict_single(loaded, missing, timing),
         )
+        if model_version is None:
+            cls._submit_shadow(loaded, spectra, results, timing.get('latency_ms'))
+        return results[0]
 
-        if not cls._current_model:
-            logger.warning("Predict called but no model is loaded.")
-            return "Unknown", 0.0, {}
+    @classmethod
+    def predict_batch(cls, spectra, batch_size=None, model_version=None):
+        """
+        批量推理接口：统一预处理、重采样后按块做前向计算。
+        :param spectra: [(x, y), ...]
+        :param batch_size: 每次前向计算的光谱数，默认取 settings.INFERENCE_BATCH_SIZE
+        :param model_version: 指定模型版本；省略时使用当前激活版本
+        :return: [(diagnosis, confidence, predictions_dict), ...]，与输入顺序一致
+        """
+        loaded = cls.get_model(model_version)
+        spectra = list(spectra)
+        timing = {}
+        results = cls._predict_cached(
+            loaded, spectra, lambda missing: cls._predict_timed(loaded, missing, timing, batch_size),
+        )
+        if model_version is None:
+            cls._submit_shadow(loaded, spectra, results, timing.get('latency_ms'))
+        return results
 
-        if cls._model_type == 'torch':
-            processed_y = _interpolate_to_length(processed_y, TARGET_INPUT_LENGTH)
-            tensor_x = torch.tensor(processed_y, dtype=torch.float32).view(1, 1, -1)
+    @classmethod
+    def _predict_cached(cls, loaded, spectra, compute):
+        """
+        先查推理结果缓存，只对未命中（且批内不重复）的光谱调用 compute。
+        """
+        if not spectra:
+            return []
 
-            with torch.no_grad():
-                outputs = cls._current_model(tensor_x)
-                prob_malignant = torch.sigmoid(outputs['diagnosis']).item()
+        if loaded is None:
+            logger.warning("Predict called but no model is loaded.")
+            return [("Unknown", 0.0, {}) for _ in spectra]
+
+        if not PredictionCache.enabled():
+            return compute(spectra)
+
+        keys = [PredictionCache.key(loaded.cache_namespace, x, y) for x, y in spectra]
+        results = PredictionCache.get_many(list(set(keys)))
+
+        pending = {}
+        for key, spectrum in zip(keys, spectra):
+            if key not in results:
+                pending.setdefault(key, spectrum)
+        PredictionCache.record(hits=len(spectra) - len(pending), misses=len(pending))
+
+        if pending:
+            computed = dict(zip(pending, compute(list(pending.values()))))
+            # 失败/无模型的结果不缓存
+            PredictionCache.set_many({
+                key: result for key, result in computed.items()
+                if result[0] not in ("Unknown", "Error")
+            })
+            results.update(computed)
+        return [results[key] for key in keys]
 
-                diagnosis = "Malignant" if prob_malignant > 0.5 else "Benign"
-                confidence = prob_malignant if diagnosis == "Malignant" else (1 - prob_malignant)
+    @classmethod
+    def _predict_single(cls, loaded, spectra, timing=None):
+        """单条推理：torch 模型走微批队列"""
+        if settings.INFERENCE_MICROBATCH and loaded.model_type == 'torch':
+            # 并发请求在 Web 线程中完成预处理，前向计算交给微批队列合并执行；
+            # 耗时含排队等待，与影子模型的计时方式不同，因此不记录
+            batcher = cls._get_batcher()
+            with batcher.reserve():
+                features = cls._prepare_batch(loaded, spectra)[0]
+                return [batcher.run((loaded, features))]
+        return cls._predict_timed(loaded, spectra, timing)
 
-                predictions = {
-                    'ER':   'Positive' if torch.sigmoid(outputs['ER']).item() > 0.5 else 'Negative',
-                    'PR':   'Positive' if torch.sigmoid(outputs['PR']).item() > 0.5 else 'Negative',
-                    'HER2': 'Positive' if torch.sigmoid(outputs['HER2']).item() > 0.5 else 'Negative',
-                    'Ki67': 'High'     if torch.sigmoid(outputs['Ki67']).item() > 0.5 else 'Low',
-                }
+    @classmethod
+    def _predict_timed(cls, loaded, spectra, timing=None, batch_size=None):
+        """
+        _predict_uncached 并把单条耗时 (毫秒) 写入 timing['latency_ms']。
+        只覆盖实际计算的光谱（不含缓存命中），与影子模型的计时方式一致。
+        """
+        started = time.perf_counter()
+        results = cls._predict_uncached(loaded, spectra, batch_size)
+        if timing is not None:
+            timing['latency_ms'] = (time.perf_counter() - started) * 1000 / len(spectra)
+        return results
 
-            return diagnosis, confidence, predictions
+    @classmethod
+    def _predict_uncached(cls, loaded, spectra, batch_size=None):
+        if loaded.model_type == 'torch':
+            X = cls._prepare_batch(loaded, spectra)
+            return cls._forward_torch(loaded, X, batch_size)
 
         else:
-            # Sklearn 遗留模型
-            X = _interpolate_to_length(processed_y, cls._current_model.n_features_in_
-                                       if hasattr(cls._current_model, 'n_features_in_') else len(processed_y))
-            X = X.reshape(1, -1)
+            # Sklearn 遗留模型：整批一次 predict_proba，预测类别取概率最大者
+            model = loaded.model
             try:
-                prob = cls._current_model.predict_proba(X)[0]
-                prediction = cls._current_model.predict(X)[0]
-                diagnosis = "Malignant" if prediction == 1 else "Benign"
-                confidence = prob[prediction]
-                return diagnosis, confidence, {}
+                X = cls._prepare_batch(loaded, spectra)
+                proba = model.predict_proba(X)
+                best = proba.argmax(axis=1)
+                labels = model.classes_[best]
+                return [
+                    ("Malignant" if label == 1 else "Benign", float(proba[row, col]), {})
+                    for row, (col, label) in enumerate(zip(best, labels))
+                ]
             except Exception:
                 logger.exception("Sklearn inference failed.")
-                return "Error", 0.0, {}
+                return [("Error", 0.0, {}) for _ in spectra]
+
+    @classmethod
+    def _forward_torch(cls, loaded, X, batch_size=None):
+        """
+        对已预处理的 (N, L) float32 矩阵按块做前向计算。
+        :return: [(diagnosis, confidence, predictions_dict), ...]
+        """
+        batch_size = batch_size or settings.INFERENCE_BATCH_SIZE
+        probs = np.empty((len(X), len(OUTPUT_HEADS)), dtype=np.float32)
+        with torch.no_grad():
+            for start in range(0, len(X), batch_size):
+                batch = torch.from_numpy(X[start:start + batch_size]).unsqueeze(1)
+                outputs = loaded.model(batch)
+                # 编译后的模型直接输出 (B, 5)；eager 模型的五个任务头拼接后一次 sigmoid
+                if isinstance(outputs, torch.Tensor):
+                    logits = outputs
+                else:
+                    logits = torch.cat([outputs[head] for head in OUTPUT_HEADS], dim=1)
+                probs[start:start + len(batch)] = torch.sigmoid(logits).numpy()
+        return [_decode_probabilities(row) for row in probs]
+
+    @classmethod
+    def _forward_microbatch(cls, items):
+        """微批执行函数：items 为 [(LoadedModel, features)]，按模型分组前向计算"""
+        groups = {}
+        for index, (loaded, _) in enumerate(items):
+            groups.setdefault(id(loaded), (loaded, []))[1].append(index)
+
+        results = [None] * len(items)
+        for loaded, indices in groups.values():
+            X = np.stack([items[i][1] for i in indices])
+            for i, result in zip(indices, cls._forward_torch(loaded, X)):
+                results[i] = result
+        return results
+
+    @classmethod
+    def _get_batcher(cls):
+        """微批队列（首次使用时创建，推理线程按需启动）"""
+        if cls._batcher is None:
+            with cls._batcher_lock:
+                if cls._batcher is None:
+                    cls._batcher = MicroBatcher(
+                        cls._forward_microbatch,
+                        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+                    )
+        return cls._batcher
+
+    @classmethod
+    def get_inference_stats(cls):
+        """推理统计：当前模型、已加载版本、微批队列的深度/批大小分布、推理缓存命中情况及启动耗时"""
+        active = cls._registry.active
+        return {
+            'model_version': active.version if active else None,
+            'model_type': active.model_type if active else None,
+            'model_variant': active.variant if active else None,
+            'compiled': active.compile_info if active else None,
+            'registry': cls._registry.stats(),
+            'microbatch_enabled': settings.INFERENCE_MICROBATCH,
+            'microbatch': cls._batcher.stats() if cls._batcher is not None else None,
+            'prediction_cache': PredictionCache.stats(),
+            'hot_reload': {
+                'check_interval_s': settings.MODEL_VERSION_CHECK_INTERVAL,
+                'reloads': cls._hot_reloads,
+                'reloading': cls._reload_thread is not None and cls._reload_thread.is_alive(),
+            },
+            'warmup': cls._last_warmup,
+            'startup': StartupReport.report(),
+        }
+
+    # -------------------------------------------------------------------------
+    # 影子推理
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def set_shadow_version(cls, version):
+        """
+        指定影子（候选）模型；version 为 None 时关闭影子推理。
+        """
+        if version is not None:
+            ModelVersion.objects.get(version=version)
+        ModelVersion.objects.exclude(version=version).update(is_shadow=False)
+        if version is not None:
+            ModelVersion.objects.filter(version=version).update(is_shadow=True)
+        cls._shadow_version = version
+        logger.info("Shadow model version: %s", version)
+
+    @classmethod
+    def _refresh_shadow_version(cls):
+        shadow = ModelVersion.objects.filter(is_shadow=True, is_active=False).last()
+        cls._shadow_version = shadow.version if shadow else None
+
+    @classmethod
+    def _submit_shadow(cls, loaded, spectra, results, latency_ms):
+        """
+        把生产推理的输入和结果投递给影子队列（不等待、队列满时丢弃）。
+        :param latency_ms: 生产模型在 _predict_uncached 中的单条耗时；全部命中缓存或走微批队列时为 None
+        """
+        shadow_version = cls._shadow_version
+        if (not settings.SHADOW_INFERENCE or loaded is None or not spectra
+                or shadow_version is None or shadow_version == loaded.version):
+            return
+        cls._get_shadow_worker().submit((loaded.version, shadow_version, spectra, results, latency_ms))
+
+    @classmethod
+    def _run_shadow(cls, job):
+        active_version, shadow_version, spectra, active_results, active_latency_ms = job
+        shadow = cls._registry.get(shadow_version)
+        started = time.perf_counter()
+        shadow_results = cls._predict_uncached(shadow, spectra)
+        shadow_latency_ms = (time.perf_counter() - started) * 1000 / len(spectra)
+        record_shadow_results(
+            active_version, shadow_version, spectra,
+            active_results, shadow_results, active_latency_ms, shadow_latency_ms,
+        )
+
+    @classmethod
+    def _get_shadow_worker(cls):
+        if cls._shadow_worker is None:
+            with cls._batcher_lock:
+                if cls._shadow_worker is None:
+                    cls._shadow_worker = ShadowWorker(cls._run_shadow, maxsize=settings.SHADOW_QUEUE_SIZE)
+        return cls._shadow_worker
+
+    @classmethod
+    def get_shadow_summary(cls, version=None):
+        """影子模型对比汇总：一致率、诊断翻转、相对耗时及队列状态"""
+        version = version or cls._shadow_version
+        summary = shadow_summary(version) if version else {'shadow_version': None}
+        summary['enabled'] = settings.SHADOW_INFERENCE
+        summary['current_shadow_version'] = cls._shadow_version
+        summary['worker'] = cls._shadow_worker.stats() if cls._shadow_worker is not None else None
+        return summary
+
+    @staticmethod
+    def _prepare_batch(loaded, spectra):
+        """
+        按波数轴分组执行模型的预处理计划，并重采样到模型输入长度的标准轴。
+        输入长度未知时（无 n_features_in_ 的 sklearn 模型）保持原始长度（各条光谱长度须一致）。
+        :return: (N, L) float32 矩阵
+        """
+        target_x = canonical_grid(loaded.input_length) if loaded.input_length else None
+        groups = {}
+        for idx, (x_data, y_data) in enumerate(spectra):
+            x_array = np.asarray(x_data, dtype=np.float64)
+            groups.setdefault((len(y_data), x_array.tobytes()), (x_array, []))[1].append(idx)
+
+        rows = [None] * len(spectra)
+        for x_array, indices in groups.values():
+            Y = np.array([spectra[i][1] for i in indices], dtype=np.float64)
+            processed = loaded.plan.run(x_array, Y)
+            if target_x is not None:
+                processed = resample(x_array, processed, target_x)
+            for row, i in zip(processed, indices):
+                rows[i] = row
+        return np.asarray(rows, dtype=np.float32)
 
     # -------------------------------------------------------------------------
     # 异步训练入口（P1-3）
     # -------------------------------------------------------------------------
 
     @classmethod
-    def start_training_async(cls, version_name=None, description=""):
+    def start_training_async(cls, version_name=None, description="", fine_tune=False):
         """
         在后台线程中触发训练，立即返回状态信息，不阻塞 HTTP 请求。
+        :param fine_tune: 为 True 时从激活版本增量微调（fine_tune_version），否则完整训练
         """
         with cls._training_lock:
             if cls._training_status['running']:
@@ -196,7 +678,7 @@ class MLEngine:
 
         thread = threading.Thread(
             target=cls._training_worker,
-            args=(version_name, description),
+            args=(version_name, description, fine_tune),
             daemon=True,
         )
         thread.start()
@@ -213,10 +695,11 @@ class MLEngine:
             return dict(cls._training_status)
 
     @classmethod
-    def _training_worker(cls, version_name, description):
+    def _training_worker(cls, version_name, description, fine_tune=False):
         """后台线程实际执行的训练逻辑"""
         try:
-            result = cls.train_new_version(version_name=version_name, description=description)
+            train = cls.fine_tune_version if fine_tune else cls.train_new_version
+            result = train(version_name=version_name, description=description)
             with cls._training_lock:
                 cls._training_status.update({
                     'running': False,
@@ -247,6 +730,7 @@ class MLEngine:
           - 类别不平衡加权损失（P1-6）
           - 早停 + ReduceLROnPlateau（P1-4）
           - 医疗级评估指标（P1-5）
+          - TRAINING_CV_FOLDS >= 2 时并行分层 k 折交叉验证，均值/标准差写入 metrics['cross_validation']
         """
         logger.info("Starting CNN training pipeline...")
 
@@ -257,147 +741,67 @@ class MLEngine:
 
         preprocess_cfg = DEFAULT_PREPROCESSING_CONFIG.copy()
 
-        X_data, y_data, metadata_list = [], [], []
-        for record in records:
-            if not record.spectral_data or 'y' not in record.spectral_data:
-                continue
-            raw_y = record.spectral_data['y']
-            wavenumbers = record.spectral_data.get('x', [])
-            processed_y = RamanPreprocessor.process_pipeline(wavenumbers, raw_y, preprocess_cfg)
-            processed_y = _interpolate_to_length(processed_y, TARGET_INPUT_LENGTH)
-            X_data.append(processed_y)
-            y_data.append(1.0 if record.diagnosis_result == 'Malignant' else 0.0)
-            metadata_list.append(record.metadata or {})
-
-        if not X_data:
+        # 特征矩阵与标签来自语料快照（内存映射），训练集未变化时不重新读取光谱
+        corpus_dir = CorpusSnapshot.locate(records, preprocess_cfg, TARGET_INPUT_LENGTH)
+        ids, X_data, y_data, aux_data = CorpusSnapshot.open(corpus_dir)
+
+        if len(X_data) == 0:
             return {"status": "error", "message": "No valid spectral data found in training records"}
 
         # 统计类别分布（P1-6）
-        labels_arr = np.array(y_data)
-        n_malignant = int(labels_arr.sum())
-        n_benign = len(labels_arr) - n_malignant
+        n_malignant = int(y_data.sum())
+        n_benign = len(y_data) - n_malignant
         logger.info("Training data: %d total | %d malignant | %d benign",
-                    len(labels_arr), n_malignant, n_benign)
-        cls._training_status['progress'] = f"数据准备完成 ({len(labels_arr)} 条)"
-
-        # 2. Dataset & DataLoader
-        dataset = RamanDataset(X_data, y_data, metadata_list)
-        train_size = int(0.8 * len(dataset))
-        val_size = len(dataset) - train_size
-        train_ds, val_ds = random_split(dataset, [train_size, val_size])
-
-        train_loader = DataLoader(train_ds, batch_size=32, shuffle=True)
-        val_loader = DataLoader(val_ds, batch_size=32, shuffle=False)
-
-        # 3. 模型与优化器
-        model = MultiTaskRamanCNN(input_length=TARGET_INPUT_LENGTH)
-        optimizer = optim.Adam(model.parameters(), lr=1e-3)
-        scheduler = optim.lr_scheduler.ReduceLROnPlateau(
-            optimizer, mode='min', patience=10, factor=0.5, min_lr=1e-6
-        )
+                    len(y_data), n_malignant, n_benign)
+        cls._training_status['progress'] = f"数据准备完成 ({len(y_data)} 条)"
+
+        # 2. 划分训练/验证集；类别不平衡权重（P1-6）
+        train_idx, val_idx = holdout_indices(len(y_data))
+        pos_weight = class_pos_weight(y_data)
+        if pos_weight is not None:
+            logger.info("Using pos_weight=%.3f for imbalanced classes", pos_weight)
+        hparams = dict(DEFAULT_HYPERPARAMS)
+        dataset = RamanDataset.from_arrays(X_data, y_data, aux_data)
+        train_loader, val_loader = make_loaders(dataset, train_idx, val_idx, hparams['batch_size'])
+
+        # 3. 训练（P1-4：早停 + ReduceLROnPlateau）与评估（P1-5：医疗级指标）
+        folds = stratified_folds(y_data, settings.TRAINING_CV_FOLDS) if settings.TRAINING_CV_FOLDS >= 2 else []
+        if folds:
+            model, metrics = cls._train_with_cross_validation(
+                corpus_dir, folds, train_idx, val_idx, pos_weight, hparams
+            )
+        else:
+            model = MultiTaskRamanCNN(input_length=TARGET_INPUT_LENGTH)
 
-        # 类别不平衡权重（P1-6）
-        pos_weight = None
-        if n_benign > 0 and n_malignant > 0:
-            pos_weight = torch.tensor([n_benign / n_malignant], dtype=torch.float32)
-            logger.info("Using pos_weight=%.3f for imbalanced classes", pos_weight.item())
-
-        def masked_loss(pred, target):
-            mask = (target != -1.0).float()
-            criterion = nn.BCEWithLogitsLoss(reduction='none')
-            loss = criterion(pred, target)
-            return (loss * mask).sum() / (mask.sum() + 1e-6)
-
-        # 4. 训练循环（P1-4：100 epochs + 早停）
-        max_epochs = 100
-        patience = 15
-        best_val_loss = float('inf')
-        no_improve_count = 0
-        best_state = None
-
-        for epoch in range(max_epochs):
-            model.train()
-            train_loss = 0.0
-            for X_batch, y_batch, aux_batch in train_loader:
-                optimizer.zero_grad()
-                outputs = model(X_batch)
-
-                criterion_main = (
-                    nn.BCEWithLogitsLoss(pos_weight=pos_weight)
-                    if pos_weight is not None
-                    else nn.BCEWithLogitsLoss()
+            def report_progress(epoch, train_loss, val_loss):
+                cls._training_status['progress'] = (
+                    f"训练中 Epoch {epoch + 1}/{hparams['max_epochs']} "
+                    f"[train={train_loss:.4f} val={val_loss:.4f}]"
                 )
-                l_diag = criterion_main(outputs['diagnosis'], y_batch.unsqueeze(1))
-                l_er   = masked_loss(outputs['ER'],   aux_batch[:, 0:1])
-                l_pr   = masked_loss(outputs['PR'],   aux_batch[:, 1:2])
-                l_her2 = masked_loss(outputs['HER2'], aux_batch[:, 2:3])
-                l_ki67 = masked_loss(outputs['Ki67'], aux_batch[:, 3:4])
 
-                loss = l_diag + 0.2 * (l_er + l_pr + l_her2 + l_ki67)
-                loss.backward()
-                optimizer.step()
-                train_loss += loss.item()
-
-            train_loss /= len(train_loader)
-
-            # 验证损失（用于调度器和早停）
-            model.eval()
-            val_loss = 0.0
-            with torch.no_grad():
-                for X_batch, y_batch, aux_batch in val_loader:
-                    outputs = model(X_batch)
-                    criterion_main = (
-                        nn.BCEWithLogitsLoss(pos_weight=pos_weight)
-                        if pos_weight is not None
-                        else nn.BCEWithLogitsLoss()
-                    )
-                    l_diag = criterion_main(outputs['diagnosis'], y_batch.unsqueeze(1))
-                    l_er   = masked_loss(outputs['ER'],   aux_batch[:, 0:1])
-                    l_pr   = masked_loss(outputs['PR'],   aux_batch[:, 1:2])
-                    l_her2 = masked_loss(outputs['HER2'], aux_batch[:, 2:3])
-                    l_ki67 = masked_loss(outputs['Ki67'], aux_batch[:, 3:4])
-                    val_loss += (l_diag + 0.2 * (l_er + l_pr + l_her2 + l_ki67)).item()
-            val_loss /= len(val_loader)
-
-            scheduler.step(val_loss)
-            logger.info("Epoch %d/%d | train_loss=%.4f | val_loss=%.4f",
-                        epoch + 1, max_epochs, train_loss, val_loss)
-            cls._training_status['progress'] = (
-                f"训练中 Epoch {epoch + 1}/{max_epochs} "
-                f"[train={train_loss:.4f} val={val_loss:.4f}]"
-            )
-
-            if val_loss < best_val_loss:
-                best_val_loss = val_loss
-                no_improve_count = 0
-                best_state = {k: v.clone() for k, v in model.state_dict().items()}
-            else:
-                no_improve_count += 1
-                if no_improve_count >= patience:
-                    logger.info("Early stopping at epoch %d (no improvement for %d epochs).",
-                                epoch + 1, patience)
-                    break
+            fit(model, train_loader, val_loader, pos_weight=pos_weight, hparams=hparams, on_epoch=report_progress)
+            metrics = evaluate(model, val_loader)
+        logger.info("Evaluation metrics: %s", metrics)
 
-        # 使用验证集上最优 checkpoint
-        if best_state is not None:
-            model.load_state_dict(best_state)
+        # 4. 保存 checkpoint、量化并注册为激活版本
+        version_name = cls._register_version(
+            model, metrics, preprocess_cfg, X_data, train_idx, val_loader,
+            version_name=version_name, description=description or "Multi-Task CNN Model",
+            manifest=(ids, y_data, aux_data),
+        )
 
-        # 5. 评估（P1-5：医疗级指标）
-        model.eval()
-        all_probs, all_preds, all_labels = [], [], []
-        with torch.no_grad():
-            for X_batch, y_batch, _ in val_loader:
-                outputs = model(X_batch)
-                probs = torch.sigmoid(outputs['diagnosis']).squeeze(1)
-                preds = (probs > 0.5).float()
-                all_probs.extend(probs.tolist())
-                all_preds.extend(preds.tolist())
-                all_labels.extend(y_batch.tolist())
-
-        metrics = _compute_medical_metrics(all_labels, all_preds, all_probs)
-        logger.info("Evaluation metrics: %s", metrics)
+        return {"status": "success", "version": version_name, "metrics": metrics}
 
-        # 6. 保存 checkpoint（含预处理配置）
+    @classmethod
+    def _register_version(cls, model, metrics, preprocess_cfg, X_data, train_idx, val_loader,
+                          version_name=None, description="", activate=True, parent=None, manifest=None):
+        """
+        保存 checkpoint（含预处理配置），训练后 int8 量化，并注册 ModelVersion。
+        :param activate: 为 True 时设为激活版本并重新加载
+        :param parent: 微调起点版本（ModelVersion），记录版本谱系
+        :param manifest: (ids, y, aux) 训练使用的记录及标签，保存为训练清单供后续增量微调比较
+        :return: 版本号
+        """
         if not version_name:
             timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M")
             version_name = f"v{timestamp}_cnn"
@@ -411,58 +815,392 @@ class MLEngine:
             'config': {'input_length': TARGET_INPUT_LENGTH},
             'preprocessing': preprocess_cfg,   # P1-8：版本化预处理配置
         }, model_path)
+        if manifest is not None:
+            TrainingManifest.save(model_path, *manifest, base_path=parent.file_path if parent else None)
+
+        # 推理编译缓存在注册时生成，worker 加载时直接读取
+        if settings.INFERENCE_COMPILE:
+            cls._training_status['progress'] = "编译推理模型"
+            try:
+                _, compile_info = load_or_compile(model.eval(), model_path, TARGET_INPUT_LENGTH)
+                metrics['compile'] = compile_info
+            except Exception:
+                logger.exception("Compiling the inference model failed; it will be compiled on load.")
+
+        # 训练后 int8 量化，记录两个版本的指标差异与延迟
+        quantized_path = None
+        if settings.TRAINING_QUANTIZE:
+            cls._training_status['progress'] = "量化中"
+            quantized_path, quantization_report = cls._quantize_version(
+                model, X_data, train_idx, val_loader, metrics, model_path
+            )
+            if quantization_report:
+                metrics['quantization'] = quantization_report
 
-        # 7. 注册到数据库
+        # 注册到数据库
         ModelVersion.objects.create(
             version=version_name,
             file_path=str(model_path),
+            quantized_path=quantized_path,
             accuracy=metrics.get('accuracy', 0.0),
             metrics=metrics,
-            is_active=True,
-            description=description or "Multi-Task CNN Model",
+            is_active=activate,
+            description=description,
+            parent=parent,
         )
-        ModelVersion.objects.exclude(version=version_name).update(is_active=False)
+        if activate:
+            ModelVersion.objects.exclude(version=version_name).update(is_active=False)
+            # 重新加载新模型
+            cls.load_active_model()
+        return version_name
 
-        # 重新加载新模型
-        cls.load_active_model()
+    @classmethod
+    def _train_with_cross_validation(cls, corpus_dir, folds, train_idx, val_idx, pos_weight, hparams):
+        """
+        k 折交叉验证与最终模型（原训练/验证划分）同时在进程池中训练，
+        每个进程的 torch 线程数按 CPU 核数平均分配，避免超额订阅。
+        :return: (最终模型, 最终模型验证指标 + cross_validation 汇总)
+        """
+        workers = min(worker_count(settings.TRAINING_WORKERS), len(folds) + 1)
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        cls._training_status['progress'] = f"交叉验证中 (0/{len(folds)} 折)"
+
+        with process_pool(workers, torch_threads=torch_threads, allow_fork=False) as pool:
+            final_job = pool.submit(
+                train_split, corpus_dir, train_idx, val_idx, TARGET_INPUT_LENGTH,
+                pos_weight=pos_weight, hparams=hparams, return_state=True,
+            )
+            fold_jobs = [
+                pool.submit(train_split, corpus_dir, fold_train, fold_val, TARGET_INPUT_LENGTH,
+                            pos_weight=pos_weight, hparams=hparams, seed=fold)
+                for fold, (fold_train, fold_val) in enumerate(folds)
+            ]
+            for done, _ in enumerate(as_completed(fold_jobs), start=1):
+                cls._training_status['progress'] = f"交叉验证中 ({done}/{len(folds)} 折)"
+            fold_metrics = [job.result()['metrics'] for job in fold_jobs]
+            final = final_job.result()
 
-        return {"status": "success", "version": version_name, "metrics": metrics}
+        model = MultiTaskRamanCNN(input_length=TARGET_INPUT_LENGTH)
+        model.load_state_dict(final['state_dict'])
+        model.eval()
 
+        metrics = final['metrics']
+        metrics['cross_validation'] = summarize_folds(fold_metrics)
+        logger.info("Cross-validation (%d folds, %d processes x %d threads): %s",
+                    len(folds), workers, torch_threads, metrics['cross_validation']['mean'])
+        return model, metrics
 
-def _compute_medical_metrics(y_true, y_pred, y_prob):
-    """计算临床诊断必需的评估指标（P1-5）"""
-    y_true = np.array(y_true)
-    y_pred = np.array(y_pred)
-    y_prob = np.array(y_prob)
-
-    tp = ((y_pred == 1) & (y_true == 1)).sum()
-    tn = ((y_pred == 0) & (y_true == 0)).sum()
-    fp = ((y_pred == 1) & (y_true == 0)).sum()
-    fn = ((y_pred == 0) & (y_true == 1)).sum()
-
-    accuracy    = (tp + tn) / (tp + tn + fp + fn + 1e-9)
-    sensitivity = tp / (tp + fn + 1e-9)   # 召回率 / 灵敏度（恶性不漏诊率）
-    specificity = tn / (tn + fp + 1e-9)   # 特异度（良性不误诊率）
-    ppv         = tp / (tp + fp + 1e-9)   # 阳性预测值
-    npv         = tn / (tn + fn + 1e-9)   # 阴性预测值
-    f1          = 2 * tp / (2 * tp + fp + fn + 1e-9)
-
-    metrics = {
-        'accuracy':    round(float(accuracy), 4),
-        'sensitivity': round(float(sensitivity), 4),
-        'specificity': round(float(specificity), 4),
-        'ppv':         round(float(ppv), 4),
-        'npv':         round(float(npv), 4),
-        'f1':          round(float(f1), 4),
-        'tp': int(tp), 'tn': int(tn), 'fp': int(fp), 'fn': int(fn),
-    }
+    # -------------------------------------------------------------------------
+    # 增量微调
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def fine_tune_version(cls, version_name=None, description="", parent_version=None,
+                          max_epochs=None, replay_ratio=None, seed=0, activate=True):
+        """
+        从已有 CNN 版本（默认激活版本）的 checkpoint 出发增量微调。
+        训练样本：相对父版本训练清单新增或光谱/标签有变化的训练记录、父版本之后有医生修正的记录（使用修正后的诊断），
+        以及 replay_ratio 倍的历史训练记录（回放，抑制遗忘）；预处理配置沿用父版本。
+        新版本的 parent 指向父版本，metrics['fine_tune'] 记录样本构成及父版本在同一验证集上的指标。
+        """
+        parent = (ModelVersion.objects.get(version=parent_version) if parent_version
+                  else ModelVersion.objects.filter(is_active=True).last())
+        if parent is None or not parent.file_path.endswith('.pth') or not os.path.exists(parent.file_path):
+            return {"status": "error", "message": "No CNN checkpoint to fine-tune from"}
+
+        checkpoint = torch.load(parent.file_path, map_location=torch.device('cpu'))
+        state_dict = checkpoint.get('state_dict', checkpoint)
+        preprocess_cfg = checkpoint.get('preprocessing', DEFAULT_PREPROCESSING_CONFIG.copy())
+
+        # 1. 增量样本 + 回放样本
+        cls._training_status['progress'] = "准备微调数据"
+        samples = cls._fine_tune_samples(
+            parent, preprocess_cfg,
+            settings.TRAINING_REPLAY_RATIO if replay_ratio is None else replay_ratio, seed,
+        )
+        if samples is None:
+            return {"status": "error", "message": f"Not enough new or corrected records since {parent.version}"}
+        ids, X_data, y_data, aux_data, composition = samples
+        logger.info("Fine-tuning %s on %d samples: %s", parent.version, len(y_data), composition)
+
+        # 2. 划分训练/验证集，父版本在同一验证集上的指标作为对照
+        train_idx, val_idx = holdout_indices(len(y_data), generator=torch.Generator().manual_seed(seed))
+        hparams = {
+            **DEFAULT_HYPERPARAMS,
+            'lr': settings.TRAINING_FINETUNE_LR,
+            'max_epochs': max_epochs or settings.TRAINING_FINETUNE_EPOCHS,
+        }
+        dataset = RamanDataset.from_arrays(X_data, y_data, aux_data)
+        train_loader, val_loader = make_loaders(dataset, train_idx, val_idx, hparams['batch_size'])
+
+        model = MultiTaskRamanCNN(input_length=TARGET_INPUT_LENGTH)
+        model.load_state_dict(state_dict)
+        parent_metrics = evaluate(model, val_loader)
+
+        # 3. 以父版本参数为起点，小学习率训练少量 epoch
+        def report_progress(epoch, train_loss, val_loss):
+            cls._training_status['progress'] = (
+                f"微调中 Epoch {epoch + 1}/{hparams['max_epochs']} "
+                f"[train={train_loss:.4f} val={val_loss:.4f}]"
+            )
+
+        _, epochs = fit(model, train_loader, val_loader, pos_weight=class_pos_weight(y_data),
+                        hparams=hparams, on_epoch=report_progress)
+        metrics = evaluate(model, val_loader)
+        metrics['fine_tune'] = {
+            'parent': parent.version,
+            'epochs': epochs,
+            'lr': hparams['lr'],
+            **composition,
+            'parent_metrics': parent_metrics,
+        }
+        logger.info("Fine-tune metrics: %s (parent: %s)", metrics, parent_metrics)
+
+        # 4. 保存并注册
+        version_name = cls._register_version(
+            model, metrics, preprocess_cfg, X_data, train_idx, val_loader,
+            version_name=version_name, description=description or f"Fine-tuned from {parent.version}",
+            activate=activate, parent=parent, manifest=(ids, y_data, aux_data),
+        )
+        return {"status": "success", "version": version_name, "parent": parent.version, "metrics": metrics}
+
+    @classmethod
+    def _fine_tune_samples(cls, parent, preprocess_cfg, replay_ratio, seed):
+        """
+        增量样本按父版本的训练清单 (TrainingManifest) 选取：清单中没有的记录、光谱摘要或标签与清单不同的记录，
+        以及父版本之后有医生修正的记录；其余训练记录作为回放候选。
+        父版本没有清单（旧版本）时只取父版本之后新建的记录和修正记录。
+        :return: (ids, X, y, aux, 样本构成)；可用样本少于 FINETUNE_MIN_SAMPLES 时返回 None
+        """
+        since = parent.created_at
+        training = SpectrumRecord.objects.filter(is_training_data=True)
+
+        # 同一记录多次修正时以最后一次为准；修正后的诊断优先于记录上的诊断结果
+        feedback = DiagnosisFeedback.objects.order_by('created_at', 'id')
+        labels_override = dict(feedback.values_list('record_id', 'corrected_diagnosis'))
+        corrected_ids = set(feedback.filter(created_at__gt=since).values_list('record_id', flat=True))
+
+        known = TrainingManifest.load(parent.file_path)
+        if known is None:
+            logger.warning("%s has no training manifest; fine-tuning on records created since it.", parent.version)
+            new_ids, changed_ids = set(training.filter(created_at__gt=since).values_list('id', flat=True)), set()
+        else:
+            new_ids, changed_ids = TrainingManifest.changed(training, known, labels_override)
+        fresh_ids = sorted(new_ids | changed_ids | corrected_ids)
+
+        history = sorted(set(training.values_list('id', flat=True)) - set(fresh_ids))
+        n_replay = min(len(history), int(round(len(fresh_ids) * replay_ratio)))
+        replay_ids = sorted(random.Random(seed).sample(history, n_replay))
+
+        record_ids = fresh_ids + replay_ids
+        FeatureStore.precompute(record_ids, preprocess_cfg, TARGET_INPUT_LENGTH)
+        present, X = FeatureStore.get_matrix(record_ids, preprocess_cfg, TARGET_INPUT_LENGTH)
+        if len(present) < FINETUNE_MIN_SAMPLES or not set(present) & set(fresh_ids):
+            return None
+
+        labels = {}
+        for start in range(0, len(present), QUERY_CHUNK_SIZE):
+            labels.update(
+                (record_id, (diagnosis, metadata)) for record_id, diagnosis, metadata in
+                SpectrumRecord.objects.filter(id__in=present[start:start + QUERY_CHUNK_SIZE])
+                .values_list('id', 'diagnosis_result', 'metadata')
+            )
+        y, aux = [], []
+        for record_id in present:
+            diagnosis, metadata = labels[record_id]
+            diagnosis = labels_override.get(record_id, diagnosis)
+            y.append(1.0 if diagnosis == 'Malignant' else 0.0)
+            aux.append(MetadataParser.parse_targets(metadata or {}))
+
+        present_set = set(present)
+        composition = {
+            'new_records': len(new_ids & present_set),
+            'changed_records': len(changed_ids & present_set),
+            'corrections': len(corrected_ids & present_set),
+            'replay': len(set(replay_ids) & present_set),
+        }
+        return (present, X, np.asarray(y, dtype=np.float32),
+                np.asarray(aux, dtype=np.float32).reshape(len(y), 4), composition)
+
+    # -------------------------------------------------------------------------
+    # 超参数搜索
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def search_hyperparameters(cls, n_trials=None, mode='random', space=None, preprocessing_space=None,
+                               min_epochs=MIN_RUNG_EPOCHS, eta=REDUCTION_FACTOR, seed=0,
+                               version_name=None, description="", activate=False):
+        """
+        并行超参数搜索（逐次减半剪枝），最优试验注册为新的 ModelVersion。
+        每种预处理配置只生成一次语料快照，所有试验使用相同的训练/验证划分，验证损失可直接比较。
+        :param mode: 'random' 或 'grid'
+        :param space: 超参数候选值 {name: [values]}，默认 DEFAULT_SEARCH_SPACE
+        :param preprocessing_space: 预处理配置候选值，默认 DEFAULT_PREPROCESSING_SPACE
+        :param activate: 为 True 时最优模型直接设为激活版本（默认仅注册，可再设为影子模型对比）
+        """
+        records = SpectrumRecord.objects.filter(is_training_data=True)
+        if not records.exists():
+            return {"status": "error", "message": "No training data found"}
+
+        trials = sample_trials(
+            DEFAULT_SEARCH_SPACE if space is None else space,
+            DEFAULT_PREPROCESSING_SPACE if preprocessing_space is None else preprocessing_space,
+            n_trials=n_trials, mode=mode, seed=seed,
+        )
+        search_id = version_name or f"search{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+        search_dir = Path(settings.BASE_DIR) / "models_storage" / "searches" / search_id
+        search_dir.mkdir(parents=True, exist_ok=True)
+        logger.info("Hyperparameter search %s: %d trials (%s)", search_id, len(trials), mode)
+
+        # 每种预处理配置生成（或复用）一份语料快照
+        corpora = {}
+        jobs = []
+        for number, (hparams, overrides) in enumerate(trials):
+            preprocess_cfg = {**DEFAULT_PREPROCESSING_CONFIG, **overrides}
+            key = config_hash(preprocess_cfg, TARGET_INPUT_LENGTH)
+            if key not in corpora:
+                cls._training_status['progress'] = f"准备语料 ({len(corpora) + 1})"
+                corpus_dir = CorpusSnapshot.locate(records, preprocess_cfg, TARGET_INPUT_LENGTH)
+                _, _, y_data, _ = CorpusSnapshot.open(corpus_dir)
+                if len(y_data) == 0:
+                    return {"status": "error", "message": "No valid spectral data found in training records"}
+                corpora[key] = corpus_dir
+            trial = TrainingTrial.objects.create(
+                search_id=search_id, number=number, hyperparams=hparams, preprocessing=preprocess_cfg,
+            )
+            jobs.append((trial, corpora[key]))
+
+        # 所有语料的行相同（只跳过没有光谱的记录），使用同一划分和类别权重
+        _, _, y_data, _ = CorpusSnapshot.open(jobs[0][1])
+        train_idx, val_idx = holdout_indices(len(y_data), generator=torch.Generator().manual_seed(seed))
+        pos_weight = class_pos_weight(y_data)
+        pruner = SuccessiveHalvingPruner(
+            search_id, rung_epochs(min_epochs, eta, DEFAULT_HYPERPARAMS['max_epochs']), eta
+        )
+
+        workers = min(worker_count(settings.TRAINING_WORKERS), len(jobs))
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        with process_pool(workers, torch_threads=torch_threads, allow_fork=False) as pool:
+            futures = [
+                pool.submit(run_trial, trial.id, corpus_dir, train_idx, val_idx, TARGET_INPUT_LENGTH,
+                            pos_weight, pruner, seed + trial.number,
+                            str(search_dir / f"trial_{trial.number}.pt"))
+                for trial, corpus_dir in jobs
+            ]
+            for done, _ in enumerate(as_completed(futures), start=1):
+                cls._training_status['progress'] = f"超参数搜索中 ({done}/{len(futures)} 个试验)"
+
+        counts = summarize_search(search_id)
+        best = best_trial(search_id)
+        if best is None:
+            shutil.rmtree(search_dir, ignore_errors=True)
+            return {"status": "error", "message": "No trial completed", "search_id": search_id, "trials": counts}
+
+        # 最优试验：载入参数，注册为新版本
+        corpus_dir = corpora[config_hash(best.preprocessing, TARGET_INPUT_LENGTH)]
+        ids, X_data, y_data, aux_data = CorpusSnapshot.open(corpus_dir)
+        hparams = {**DEFAULT_HYPERPARAMS, **best.hyperparams}
+        dataset = RamanDataset.from_arrays(X_data, y_data, aux_data)
+        _, val_loader = make_loaders(dataset, train_idx, val_idx, hparams['batch_size'])
+        model = MultiTaskRamanCNN(input_length=TARGET_INPUT_LENGTH)
+        model.load_state_dict(torch.load(search_dir / f"trial_{best.number}.pt"))
+        model.eval()
+
+        metrics = dict(best.metrics)
+        metrics['search'] = {
+            'search_id': search_id,
+            'trial': best.number,
+            'hyperparams': hparams,
+            'val_diagnosis_loss': round(best.best_val_loss, 6),
+            'trials': counts,
+        }
+        version = cls._register_version(
+            model, metrics, best.preprocessing, X_data, train_idx, val_loader,
+            version_name=version_name, description=description or f"Hyperparameter search {search_id}",
+            activate=activate, manifest=(ids, y_data, aux_data),
+        )
+        TrainingTrial.objects.filter(pk=best.pk).update(model_version=ModelVersion.objects.get(version=version))
+        shutil.rmtree(search_dir, ignore_errors=True)
+
+        logger.info("Hyperparameter search %s finished: %s; best trial #%d registered as %s",
+                    search_id, counts, best.number, version)
+        return {"status": "success", "search_id": search_id, "version": version,
+                "best_trial": best.number, "trials": counts, "metrics": metrics}
 
-    # AUC-ROC（需要 sklearn）
-    try:
-        from sklearn.metrics import roc_auc_score
-        if len(np.unique(y_true)) > 1:
-            metrics['auc_roc'] = round(float(roc_auc_score(y_true, y_prob)), 4)
-    except Exception:
-        pass
+    @classmethod
+    def _quantize_version(cls, model, X_data, train_indices, val_loader, metrics, model_path):
+        """
+        用训练集的一部分校准 int8 模型，在验证集上与 fp32 模型比较指标和延迟。
+        :return: (quantized_path, report)；失败时返回 (None, None)，不影响训练结果
+        """
+        try:
+            calibration_idx = np.sort(np.asarray(train_indices)[:settings.QUANTIZATION_CALIBRATION_SAMPLES])
+            quantized, engine = quantize_model(model, X_data[calibration_idx])
+
+            labels, probs = diagnosis_probabilities(quantized, val_loader)
+            preds = [1.0 if p > 0.5 else 0.0 for p in probs]
+            int8_metrics = compute_medical_metrics(labels, preds, probs)
+
+            latency = {'fp32': {}, 'int8': {}}
+            for batch_size in LATENCY_BATCH_SIZES:
+                latency['fp32'][str(batch_size)] = round(
+                    measure_latency(model, TARGET_INPUT_LENGTH, batch_size), 3)
+                latency['int8'][str(batch_size)] = round(
+                    measure_latency(quantized, TARGET_INPUT_LENGTH, batch_size), 3)
+
+            path = quantized_path_for(model_path)
+            save_quantized(quantized, path, engine)
+        except Exception:
+            logger.exception("Post-training quantization failed; keeping fp32 model only.")
+            return None, None
+
+        report = {
+            'engine': engine,
+            'calibration_samples': int(len(calibration_idx)),
+            'int8_metrics': int8_metrics,
+            'delta': {
+                key: round(int8_metrics[key] - metrics[key], 4)
+                for key in ('accuracy', 'sensitivity', 'specificity', 'f1', 'auc_roc')
+                if key in metrics and key in int8_metrics
+            },
+            'latency_ms': latency,
+        }
+        logger.info("Quantized model saved to %s: %s", path, report)
+        return str(path), report
+
+    @classmethod
+    def _load_quantized_variant(cls, model_record):
+        """
+        读取 int8 版本；不存在、缺少量化报告的灵敏度对比（视为未通过检查）或灵敏度下降超过容许值时返回 None。
+        """
+        report = (model_record.metrics or {}).get('quantization') or {}
+        if not model_record.quantized_path or not os.path.exists(model_record.quantized_path):
+            logger.warning("No quantized artifact for model %s, serving fp32.", model_record.version)
+            return None
+        sensitivity_delta = (report.get('delta') or {}).get('sensitivity')
+        if sensitivity_delta is None:
+            logger.warning("Quantized model %s has no sensitivity comparison in its quantization report, serving fp32.",
+                           model_record.version)
+            return None
+        sensitivity_drop = -sensitivity_delta
+        if sensitivity_drop > settings.INFERENCE_QUANTIZED_MAX_SENSITIVITY_DROP:
+            logger.warning("Quantized model %s drops sensitivity by %.4f (> %.4f), serving fp32.",
+                           model_record.version, sensitivity_drop,
+                           settings.INFERENCE_QUANTIZED_MAX_SENSITIVITY_DROP)
+            return None
+        return load_quantized(model_record.quantized_path)
+
+
+def _decode_probabilities(probs):
+    """把一行 (diagnosis, ER, PR, HER2, Ki67) 概率转换为 (diagnosis, confidence, predictions)"""
+    prob_malignant = float(probs[0])
+    diagnosis = "Malignant" if prob_malignant > 0.5 else "Benign"
+    confidence = prob_malignant if diagnosis == "Malignant" else (1 - prob_malignant)
+    predictions = {
+        'ER':   'Positive' if probs[1] > 0.5 else 'Negative',
+        'PR':   'Positive' if probs[2] > 0.5 else 'Negative',
+        'HER2': 'Positive' if probs[3] > 0.5 else 'Negative',
+        'Ki67': 'High'     if probs[4] > 0.5 else 'Low',
+    }
+    return diagnosis, confidence, predictions
 
-    return metrics
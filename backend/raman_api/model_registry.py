@@ -0,0 +1,132 @@
+"""
+多模型注册表。
+
+内存中保留最近使用的 N 个 ModelVersion（各自的模型、预处理计划、输入长度），
+推理可按版本号选择模型；切换激活版本只替换一个指针，不在请求路径上重新加载。
+"""
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# 已加载模型的不可变快照；推理全程持有同一个快照，不受并发切换影响
+LoadedModel = namedtuple('LoadedModel', [
+    'version',                # ModelVersion.version
+    'model',                  # torch 模块或 sklearn 估计器
+    'model_type',             # 'torch' / 'sklearn'
+    'variant',                # 'fp32' / 'compiled' / 'int8'（sklearn 为 None）
+    'input_length',           # 模型输入长度
+    'preprocessing_config',   # 随 checkpoint 保存的预处理配置
+    'plan',                   # 编译后的 PreprocessingPlan
+    'cache_namespace',        # 推理缓存键前缀
+    'compile_info',           # 推理编译信息（可能为 None）
+    'loaded_at',
+])
+
+
+class ModelRegistry:
+    """
+    按版本号缓存 LoadedModel 的 LRU 注册表。
+    :param loader: loader(version) -> LoadedModel，版本不存在或文件缺失时抛出异常
+    :param capacity: 内存中最多保留的版本数（激活版本不会被淘汰）
+    """
+
+    def __init__(self, loader, capacity=3):
+        self._loader = loader
+        self.capacity = max(1, int(capacity))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self._active = None
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def active(self):
+        """当前激活版本（可能为 None）；读取是原子的"""
+        return self._active
+
+    def get(self, version, reload=False):
+        """返回指定版本，未加载时加载（同一版本并发请求只加载一次）"""
+        if not reload:
+            with self._lock:
+                if version in self._entries:
+                    self._entries.move_to_end(version)
+                    self._hits += 1
+                    return self._entries[version]
+
+        with self._lock:
+            loading_lock = self._loading_locks.setdefault(version, threading.Lock())
+        with loading_lock:
+            if not reload:
+                with self._lock:
+                    if version in self._entries:
+                        self._entries.move_to_end(version)
+                        self._hits += 1
+                        return self._entries[version]
+
+            try:
+                loaded = self._loader(version)
+                with self._lock:
+                    self._misses += 1
+                    self._entries[version] = loaded
+                    self._entries.move_to_end(version)
+                    self._evict()
+            finally:
+                # 加载失败（版本不存在、文件损坏）时同样移除，不为无效版本名累积锁
+                with self._lock:
+                    self._loading_locks.pop(version, None)
+        logger.info("Model registry loaded %s (%s)", version, loaded.variant or loaded.model_type)
+        return loaded
+
+    def activate(self, version, reload=False):
+        """
+        加载（如需要）后把激活指针指向该版本。
+        :return: (新激活快照, 原激活快照)
+        """
+        return self.publish(self.get(version, reload=reload))
+
+    def publish(self, loaded):
+        """
+        把激活指针指向一个已加载（通常已预热）的快照；单次引用赋值，读取方无需加锁。
+        :return: (新激活快照, 原激活快照)
+        """
+        with self._lock:
+            previous, self._active = self._active, loaded
+            # 容量较小时快照可能在预热期间被淘汰，重新登记并淘汰旧版本
+            self._entries[loaded.version] = loaded
+            self._entries.move_to_end(loaded.version)
+            self._evict()
+        return loaded, previous
+
+    def evict(self, version):
+        with self._lock:
+            if self._active is None or self._active.version != version:
+                self._entries.pop(version, None)
+
+    def _evict(self):
+        for version in list(self._entries):
+            if len(self._entries) <= self.capacity:
+                break
+            if self._active is not None and self._active.version == version:
+                continue
+            del self._entries[version]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'active': self._active.version if self._active is not None else None,
+                'loaded': [
+                    {
+                        'version': loaded.version,
+                        'model_type': loaded.model_type,
+                        'variant': loaded.variant,
+                        'loaded_at': loaded.loaded_at.isoformat(),
+                    }
+                    for loaded in reversed(self._entries.values())
+                ],
+                'hits': self._hits,
+                'misses': self._misses,
+            }
@@ -1,6 +1,12 @@
-from django.db import models
+import threading
+
+import numpy as np
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 
+from .operators import grid_key, register_grid_axis
+from .spectral_storage import decode_spectrum, encode_intensities
+
 # Create your models here.
 
 class UserProfile(models.Model):
@@ -31,6 +37,86 @@ class Patient(models.Model):
     def __str__(self):
         return f"Patient {self.id} ({self.gender}, {self.age})"
 
+class WavenumberGridManager(models.Manager):
+    """
+    波数轴解析：按内容哈希查找/创建 WavenumberGrid，并在进程内缓存，
+    同一轴在进程生命周期内只查询一次数据库。
+    只缓存已提交的行：事务回滚的行不会进入缓存；行被删除时由 post_delete 信号移除，
+    其他进程删除的行在保存记录失败时移除（见 SpectrumRecord.save）。
+    """
+    _lock = threading.Lock()
+    _by_hash = {}
+    _axes_by_id = {}
+
+    def resolve(self, x_data):
+        """返回与 x_data 内容一致的 WavenumberGrid（不存在则创建）"""
+        x_array = np.ascontiguousarray(x_data, dtype=np.float64)
+        key = grid_key(x_array)
+        grid = self._by_hash.get(key)
+        if grid is None:
+            grid, _ = self.get_or_create(content_hash=key, defaults={
+                'length': len(x_array),
+                'start': float(x_array[0]) if len(x_array) else None,
+                'stop': float(x_array[-1]) if len(x_array) else None,
+                'data': x_array.tobytes(),
+            })
+            # 不在事务中时立即执行；在事务中时等提交后再缓存
+            transaction.on_commit(lambda: self._remember(key, grid), using=self.db)
+        return grid
+
+    def axis_for(self, grid_id):
+        """按 id 返回共享的只读波数轴数组（进程内缓存，已登记到算子缓存）"""
+        axis = self._axes_by_id.get(grid_id)
+        if axis is None:
+            grid = self.get(pk=grid_id)
+            axis = grid.as_array()
+            with self._lock:
+                axis = self._axes_by_id.setdefault(grid_id, axis)
+        return axis
+
+    @classmethod
+    def _remember(cls, key, grid):
+        with cls._lock:
+            cls._by_hash.setdefault(key, grid)
+
+    @classmethod
+    def evict(cls, grid):
+        """移除一个（已删除或失效的）波数轴的缓存"""
+        with cls._lock:
+            cls._by_hash.pop(grid.content_hash, None)
+            cls._axes_by_id.pop(grid.pk, None)
+
+    @classmethod
+    def clear_cache(cls):
+        """清空进程内缓存（测试、批量清理数据后使用）"""
+        with cls._lock:
+            cls._by_hash.clear()
+            cls._axes_by_id.clear()
+
+
+class WavenumberGrid(models.Model):
+    """
+    共享波数轴。
+    每个不同的 x 轴只存储一份 (float64)，按内容哈希去重，由 SpectrumRecord 外键引用。
+    """
+    content_hash = models.CharField(max_length=40, unique=True, help_text="波数轴内容哈希 (SHA-1)")
+    length = models.PositiveIntegerField(help_text="点数")
+    start = models.FloatField(blank=True, null=True, help_text="起始波数")
+    stop = models.FloatField(blank=True, null=True, help_text="结束波数")
+    data = models.BinaryField(help_text="float64 波数数组")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WavenumberGridManager()
+
+    def __str__(self):
+        return f"Grid {self.id} ({self.length} pts, {self.start}-{self.stop})"
+
+    def as_array(self):
+        """只读波数数组；以 content_hash 作为算子缓存键，无需重新哈希"""
+        axis = np.frombuffer(bytes(self.data), dtype=np.float64)
+        register_grid_axis(axis, self.content_hash)
+        return axis
+
 class SpectrumRecord(models.Model):
     """
     拉曼光谱记录模型。
@@ -45,33 +131,169 @@ class SpectrumRecord(models.Model):
     confidence_score = models.FloatField(blank=True, null=True, help_text="置信度 (0.0 - 1.0)")
     
     created_at = models.DateTimeField(auto_now_add=True, help_text="上传时间")
+    updated_at = models.DateTimeField(auto_now=True, null=True, help_text="最后修改时间")
     is_reviewed = models.BooleanField(default=False, help_text="是否经医生复核")
     
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, help_text="上传医生")
 
     # 新增字段用于存储原始数据和元数据
-    spectral_data = models.JSONField(blank=True, null=True, help_text="光谱数据 {'x': [], 'y': []}")
+    # spectral_data 仅作为写入兼容入口：保存时转存为 spectral_blob 并置空
+    spectral_data = models.JSONField(blank=True, null=True, help_text="光谱数据 {'x': [], 'y': []} (兼容字段，保存时转为二进制)")
+    spectral_blob = models.BinaryField(blank=True, null=True, help_text="二进制光谱数据 (float32 强度 + 波数轴引用)")
+    wavenumber_grid = models.ForeignKey(WavenumberGrid, on_delete=models.PROTECT, blank=True, null=True, related_name='records', help_text="共享波数轴")
     metadata = models.JSONField(blank=True, null=True, help_text="元数据 (ER, HER2, etc)")
     is_training_data = models.BooleanField(default=False, help_text="是否作为训练集")
 
     def __str__(self):
         return f"Record {self.id} - {self.diagnosis_result}"
 
+    def set_spectrum(self, x_data, y_data, grid=None):
+        """
+        以二进制格式写入光谱 (需调用 save 持久化)。
+        :param grid: 已解析的 WavenumberGrid；省略时按 x_data 解析
+        """
+        has_axis = len(x_data) > 0
+        if has_axis and len(x_data) != len(y_data):
+            raise ValueError("x 和 y 数组长度必须一致")
+        if grid is None and has_axis:
+            grid = WavenumberGrid.objects.resolve(x_data)
+        self.wavenumber_grid = grid
+        self.spectral_blob = encode_intensities(y_data, has_axis=has_axis)
+        self.spectral_data = None
+
+    def get_spectrum(self):
+        """
+        读取光谱。
+        :return: (x, y) numpy 数组；无光谱数据时返回 (None, None)
+        """
+        if self.spectral_blob:
+            grid_axis = None
+            if self.wavenumber_grid_id is not None:
+                grid_axis = WavenumberGrid.objects.axis_for(self.wavenumber_grid_id)
+            return decode_spectrum(self.spectral_blob, grid_axis)
+        if 'spectral_data' not in self.get_deferred_fields():
+            data = self.spectral_data
+            if data and 'y' in data:
+                return np.asarray(data.get('x', []), dtype=float), np.asarray(data['y'], dtype=float)
+        return None, None
+
+    def get_spectral_data(self):
+        """兼容访问器：返回序列化器使用的 {'x': [...], 'y': [...]} 结构"""
+        x_array, y_array = self.get_spectrum()
+        if y_array is None:
+            return None
+        return {'x': x_array.tolist(), 'y': y_array.tolist()}
+
+    def save(self, *args, **kwargs):
+        # 旧代码/序列化器仍可能写入 spectral_data，保存前统一转为二进制
+        if 'spectral_data' not in self.get_deferred_fields():
+            data = self.spectral_data
+            if data and 'y' in data:
+                self.set_spectrum(data.get('x', []), data['y'])
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None and 'spectral_data' in update_fields:
+                    kwargs['update_fields'] = set(update_fields) | {'spectral_blob', 'wavenumber_grid'}
+        try:
+            super().save(*args, **kwargs)
+        except IntegrityError:
+            # 缓存的波数轴可能已被其他进程删除：移除缓存、重新解析后重试一次。
+            # 事务中外键在提交时才检查，且出错后事务已不可用，只在自动提交模式下重试
+            grid = self._meta.get_field('wavenumber_grid').get_cached_value(self, None)
+            if (grid is None or transaction.get_connection(kwargs.get('using')).in_atomic_block
+                    or WavenumberGrid.objects.filter(pk=grid.pk).exists()):
+                raise
+            WavenumberGrid.objects.evict(grid)
+            self.wavenumber_grid = WavenumberGrid.objects.resolve(np.frombuffer(bytes(grid.data), dtype=np.float64))
+            super().save(*args, **kwargs)
+
+class SpectrumFeature(models.Model):
+    """
+    预处理特征缓存。
+    存储某条记录在指定预处理配置下、重采样到标准波数轴后的 float32 特征向量。
+    """
+    record = models.ForeignKey(SpectrumRecord, on_delete=models.CASCADE, related_name='features', help_text="关联光谱记录")
+    config_hash = models.CharField(max_length=40, help_text="预处理配置哈希")
+    length = models.PositiveIntegerField(help_text="特征向量长度")
+    data = models.BinaryField(help_text="float32 特征向量")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('record', 'config_hash')
+
+    def __str__(self):
+        return f"Feature {self.record_id} [{self.config_hash[:8]}]"
+
 class ModelVersion(models.Model):
     """
     模型版本管理
     """
     version = models.CharField(max_length=50, unique=True, help_text="版本号 (e.g. v1.0.0)")
     file_path = models.CharField(max_length=500, help_text="模型文件路径 (.pkl/.pth)")
+    quantized_path = models.CharField(max_length=500, blank=True, null=True, help_text="int8 量化模型文件路径")
     accuracy = models.FloatField(blank=True, null=True, help_text="验证集准确率")
     metrics = models.JSONField(blank=True, null=True, help_text="详细指标 (Precision, Recall)")
     is_active = models.BooleanField(default=False, help_text="是否为当前生产模型")
+    is_shadow = models.BooleanField(default=False, help_text="是否作为影子模型在线对比 (不影响返回结果)")
     created_at = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, null=True)
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='children', help_text="微调起点版本")
 
     def __str__(self):
         return f"Model {self.version} ({'Active' if self.is_active else 'Inactive'})"
 
+class TrainingTrial(models.Model):
+    """
+    超参数搜索中的一次试验：配置、按轮次 (rung) 记录的验证损失及最终指标。
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('pruned', 'Pruned'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    search_id = models.CharField(max_length=50, db_index=True, help_text="所属搜索任务")
+    number = models.PositiveIntegerField(help_text="试验序号")
+    hyperparams = models.JSONField(help_text="训练超参数 (lr, batch_size, aux_weight, ...)")
+    preprocessing = models.JSONField(help_text="预处理配置")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    epochs = models.PositiveIntegerField(default=0, help_text="实际训练的 epoch 数")
+    best_val_loss = models.FloatField(blank=True, null=True, help_text="最优验证损失")
+    rung_losses = models.JSONField(default=dict, blank=True, help_text="各轮次 epoch 处的最优验证损失 {epoch: loss}")
+    metrics = models.JSONField(blank=True, null=True, help_text="验证集医疗级指标")
+    model_version = models.ForeignKey(ModelVersion, on_delete=models.SET_NULL, blank=True, null=True, related_name='trials', help_text="由该试验注册的模型版本")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('search_id', 'number')
+
+    def __str__(self):
+        return f"Trial {self.search_id}#{self.number} ({self.status})"
+
+class ShadowPrediction(models.Model):
+    """
+    影子推理记录：同一输入下生产模型与候选模型的输出及耗时对比。
+    """
+    spectrum_hash = models.CharField(max_length=32, help_text="原始光谱内容哈希")
+    active_version = models.CharField(max_length=50, help_text="生产模型版本")
+    shadow_version = models.CharField(max_length=50, db_index=True, help_text="影子模型版本")
+    active_diagnosis = models.CharField(max_length=50)
+    shadow_diagnosis = models.CharField(max_length=50)
+    active_confidence = models.FloatField()
+    shadow_confidence = models.FloatField()
+    active_markers = models.JSONField(blank=True, null=True)
+    shadow_markers = models.JSONField(blank=True, null=True)
+    agreed = models.BooleanField(help_text="诊断结果是否一致")
+    markers_agreed = models.BooleanField(help_text="分子分型预测是否一致")
+    active_latency_ms = models.FloatField(null=True, blank=True,
+                                          help_text="生产模型单条耗时 (毫秒)；命中缓存或走微批队列时为空")
+    shadow_latency_ms = models.FloatField(help_text="影子模型单条耗时 (毫秒)")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Shadow {self.shadow_version} vs {self.active_version}: {'agree' if self.agreed else 'flip'}"
+
 class DiagnosisFeedback(models.Model):
     """
     医生反馈/修正记录 (Human-in-the-loop)
@@ -0,0 +1,219 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+
+class OperatorCache:
+    """
+    线程安全的 LRU 缓存，用于保存按 (波数轴, 参数) 预计算的线性算子。
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, builder):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # 构建算子可能较慢，不在锁内执行；并发构建时保留先写入的结果
+        value = builder()
+        with self._lock:
+            value = self._entries.setdefault(key, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_operator_cache = OperatorCache(maxsize=32)
+
+
+# 已登记的共享波数轴：id(array) -> (array, key)，避免对同一数组重复哈希
+_registered_axes = {}
+
+
+def register_grid_axis(x_array, key=None):
+    """
+    登记一个长期存在的只读波数轴数组（如 WavenumberGrid 缓存中的数组），
+    之后对同一数组对象调用 grid_key 直接返回已知键。
+    """
+    if key is None:
+        key = _hash_axis(x_array)
+    _registered_axes[id(x_array)] = (x_array, key)
+    return key
+
+
+def grid_key(x_data):
+    """波数轴内容哈希，作为算子缓存键"""
+    entry = _registered_axes.get(id(x_data))
+    if entry is not None and entry[0] is x_data:
+        return entry[1]
+    return _hash_axis(x_data)
+
+
+def _hash_axis(x_data):
+    x_array = np.ascontiguousarray(x_data, dtype=np.float64)
+    return hashlib.sha1(x_array.tobytes()).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# Savitzky-Golay 平滑算子
+# -----------------------------------------------------------------------------
+
+SavgolOperator = namedtuple('SavgolOperator', ['kernel', 'left_edge', 'right_edge'])
+
+
+def savgol_operator(window_length, polyorder):
+    """
+    Savitzky-Golay 平滑算子：内部卷积核 + 两端 'interp' 模式的多项式拟合行。
+    left_edge/right_edge 形状为 (window_length // 2, window_length)，
+    分别作用于前/后 window_length 个采样点。与光谱长度无关。
+    """
+    key = ('savgol', window_length, polyorder)
+    return _operator_cache.get_or_build(
+        key, lambda: _build_savgol_operator(window_length, polyorder)
+    )
+
+
+def _build_savgol_operator(window_length, polyorder):
+    # scipy.signal 导入较慢（约 1s），只在首次构建算子时导入
+    from scipy.signal import savgol_coeffs, savgol_filter
+
+    half = window_length // 2
+    kernel = savgol_coeffs(window_length, polyorder, use='dot')
+    # 对单位矩阵做一次 savgol_filter 即可得到两端的拟合系数
+    edge = savgol_filter(np.eye(window_length), window_length, polyorder, axis=0)
+    operator = SavgolOperator(
+        kernel=kernel,
+        left_edge=np.ascontiguousarray(edge[:half]),
+        right_edge=np.ascontiguousarray(edge[window_length - half:]),
+    )
+    for array in operator:
+        array.setflags(write=False)
+    return operator
+
+
+def apply_savgol(Y, window_length, polyorder, out=None):
+    """
+    对 (N, L) 矩阵按行做 SG 平滑，结果与 savgol_filter(..., axis=1) 一致。
+    :param out: 可选的输出缓冲区 (不能与 Y 相同)
+    """
+    from scipy.ndimage import correlate1d
+
+    length = Y.shape[1]
+    if window_length > length:
+        raise ValueError("window_length must be less than or equal to the size of the data")
+    if out is None:
+        out = np.empty_like(Y)
+
+    operator = savgol_operator(window_length, polyorder)
+    half = window_length // 2
+    correlate1d(Y, operator.kernel, axis=1, output=out, mode='constant')
+    if half:
+        np.matmul(Y[:, :window_length], operator.left_edge.T, out=out[:, :half])
+        np.matmul(Y[:, -window_length:], operator.right_edge.T, out=out[:, -half:])
+    return out
+
+
+# -----------------------------------------------------------------------------
+# 多项式基线投影算子
+# -----------------------------------------------------------------------------
+
+def poly_projection_basis(x_data, degree, dtype=np.float64):
+    """
+    返回多项式空间的正交基 Q (L, r)，投影矩阵 P = Q·Qᵀ。
+    基线 = Y @ P，与逐条 np.polyfit/np.polyval 的最小二乘结果一致。
+    """
+    x_array = np.asarray(x_data, dtype=np.float64)
+    key = ('poly', grid_key(x_array), degree, np.dtype(dtype).str)
+    return _operator_cache.get_or_build(
+        key, lambda: _build_poly_projection_basis(x_array, degree, dtype)
+    )
+
+
+def _build_poly_projection_basis(x_array, degree, dtype):
+    # 先把波数线性映射到 [-1, 1]，多项式空间不变但条件数大幅改善
+    x_min, x_max = x_array.min(), x_array.max()
+    span = (x_max - x_min) / 2 or 1.0
+    x_scaled = (x_array - (x_max + x_min) / 2) / span
+
+    V = np.vander(x_scaled, degree + 1)
+    U, s, _ = np.linalg.svd(V, full_matrices=False)
+    rcond = len(x_array) * np.finfo(float).eps
+    Q = np.ascontiguousarray(U[:, s > s[0] * rcond], dtype=dtype)
+    Q.setflags(write=False)
+    return Q
+
+
+def remove_poly_baseline(x_data, Y, degree, out=None, work=None):
+    """
+    多项式基线扣除：Y - Y @ P，无需逐条最小二乘拟合。
+    :param out: 可选输出缓冲区 (可与 Y 相同，即原地扣除)
+    :param work: 可选的 (N, L) 临时缓冲区，用于存放基线
+    """
+    if len(x_data) != Y.shape[1]:
+        raise ValueError("expected x and y to have same length")
+    Q = poly_projection_basis(x_data, degree, Y.dtype)
+    baseline = np.matmul(Y @ Q, Q.T, out=work)
+    return np.subtract(Y, baseline, out=out)
+
+
+# -----------------------------------------------------------------------------
+# 导数算子
+# -----------------------------------------------------------------------------
+
+GradientOperator = namedtuple('GradientOperator', ['lower', 'center', 'upper', 'first', 'last'])
+
+
+def gradient_operator(x_data):
+    """
+    非均匀间距二阶中心差分系数（与 np.gradient(y, x) 相同的公式），按波数轴缓存。
+    """
+    x_array = np.asarray(x_data, dtype=np.float64)
+    key = ('gradient', grid_key(x_array))
+    return _operator_cache.get_or_build(key, lambda: _build_gradient_operator(x_array))
+
+
+def _build_gradient_operator(x_array):
+    if len(x_array) < 2:
+        raise ValueError("Shape of array too small to calculate a numerical gradient, "
+                         "at least 2 elements are required.")
+    dx = np.diff(x_array)
+    hs, hd = dx[:-1], dx[1:]
+    return GradientOperator(
+        lower=-hd / (hs * (hs + hd)),
+        center=(hd - hs) / (hs * hd),
+        upper=hs / (hd * (hs + hd)),
+        first=1.0 / dx[0],
+        last=1.0 / dx[-1],
+    )
+
+
+def apply_gradient(x_data, Y, out=None):
+    """对 (N, L) 矩阵按行求一阶导数，等价于 np.gradient(Y, x, axis=1)"""
+    if len(x_data) != Y.shape[1]:
+        raise ValueError("The spacing argument must have the same length as the data")
+    operator = gradient_operator(x_data)
+    if out is None:
+        out = np.empty_like(Y)
+
+    inner = out[:, 1:-1]
+    np.multiply(Y[:, :-2], operator.lower, out=inner)
+    inner += Y[:, 1:-1] * operator.center
+    inner += Y[:, 2:] * operator.upper
+    np.multiply(Y[:, 1] - Y[:, 0], operator.first, out=out[:, 0])
+    np.multiply(Y[:, -1] - Y[:, -2], operator.last, out=out[:, -1])
+    return out
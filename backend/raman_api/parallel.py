@@ -0,0 +1,70 @@
+"""
+多进程执行工具（训练语料预处理等 CPU 密集任务共用）。
+
+worker 进程初始化时完成 django.setup()，并可限制 torch 线程数避免超额订阅 CPU。
+当前进程只有一个线程时使用 fork，子进程直接继承已导入的模块和预处理算子缓存；
+否则（如 Web 进程中的后台训练线程）使用 forkserver，避免在多线程进程中 fork。
+torch 训练任务总是使用 forkserver：父进程的 OpenMP 线程池在 fork 后的子进程中不可用。
+本模块不在顶层导入 Django 模型，forkserver/spawn 子进程可在 django.setup() 之前反序列化任务。
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count(configured):
+    """
+    :param configured: 配置的进程数；0 或负数表示使用全部 CPU 核
+    """
+    if configured and configured > 0:
+        return configured
+    return os.cpu_count() or 1
+
+
+def _context(allow_fork):
+    methods = multiprocessing.get_all_start_methods()
+    if allow_fork and 'fork' in methods and threading.active_count() == 1:
+        return multiprocessing.get_context('fork')
+    if 'forkserver' in methods:
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _init_worker(torch_threads):
+    import django
+
+    django.setup()
+    if torch_threads:
+        import torch
+
+        torch.set_num_threads(torch_threads)
+
+
+def process_pool(max_workers, torch_threads=None, allow_fork=True):
+    """
+    创建进程池。调用前关闭当前线程的数据库连接，fork 出的子进程不会共用同一个连接。
+    :param torch_threads: 每个 worker 的 torch 计算线程数（None 表示不修改）
+    :param allow_fork: 为 False 时不使用 fork（worker 中要运行 torch 计算时）
+    """
+    from django.db import connections
+
+    connections.close_all()
+    context = _context(allow_fork)
+    logger.info("Starting process pool: %d workers (%s)", max_workers, context.get_start_method())
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(torch_threads,),
+    )
+
+
+def precompute_features_shard(record_ids, config, length):
+    """worker 任务：预处理一组记录并写入特征存储，返回新计算的条数"""
+    from .feature_store import FeatureStore
+
+    return FeatureStore.precompute(record_ids, config, length, workers=1)
@@ -0,0 +1,89 @@
+"""
+推理结果缓存。
+
+以 (原始光谱内容哈希, 模型版本, 预处理配置哈希) 为键缓存 (diagnosis, confidence, predictions)，
+存放在 settings.PREDICTION_CACHE_ALIAS 指定的 Django 缓存中（默认为有容量上限的 LocMemCache）。
+重复上传同一光谱文件或 zip 导入中的重复数据不再重复推理。
+"""
+import hashlib
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+
+def spectrum_digest(x_data, y_data):
+    """原始光谱 (强度 + 波数轴) 的内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(y_data, dtype=np.float64).tobytes())
+    digest.update(b'|')
+    digest.update(np.ascontiguousarray(x_data, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """推理结果缓存及命中统计"""
+
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+
+    @staticmethod
+    def enabled():
+        return settings.PREDICTION_CACHE
+
+    @staticmethod
+    def _cache():
+        return caches[settings.PREDICTION_CACHE_ALIAS]
+
+    @staticmethod
+    def namespace(model_version, config_hash):
+        """模型版本 + 预处理配置哈希 -> 键前缀（哈希后可安全用于 memcached 等后端）"""
+        return hashlib.blake2b(f"{model_version}:{config_hash}".encode('utf-8'), digest_size=8).hexdigest()
+
+    @staticmethod
+    def key(namespace, x_data, y_data):
+        """
+        :param namespace: namespace() 返回的键前缀
+        :return: 缓存键；x 同样参与哈希（波数轴不同时重采样结果不同）
+        """
+        return f"{namespace}:{spectrum_digest(x_data, y_data)}"
+
+    @classmethod
+    def get_many(cls, keys):
+        """读取多条缓存，返回 {key: result}"""
+        return cls._cache().get_many(keys)
+
+    @classmethod
+    def set_many(cls, entries):
+        if entries:
+            cls._cache().set_many(entries)
+
+    @classmethod
+    def record(cls, hits, misses):
+        """累计命中/未命中次数（按光谱条数计）"""
+        with cls._lock:
+            cls._hits += hits
+            cls._misses += misses
+
+    @classmethod
+    def clear(cls):
+        cls._cache().clear()
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            total = cls._hits + cls._misses
+            return {
+                'enabled': cls.enabled(),
+                'hits': cls._hits,
+                'misses': cls._misses,
+                'hit_rate': round(cls._hits / total, 4) if total else 0.0,
+            }
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._lock:
+            cls._hits = 0
+            cls._misses = 0
@@ -1,8 +1,78 @@
+import threading
 import numpy as np
-from scipy.signal import savgol_filter
-from scipy import sparse
-from scipy.sparse.linalg import spsolve
-from sklearn.preprocessing import MinMaxScaler
+from functools import lru_cache, partial
+from types import MappingProxyType
+
+from .operators import apply_gradient, apply_savgol, remove_poly_baseline
+from .resampling import resample
+
+DEFAULT_PIPELINE_CONFIG = {
+    'smooth': True,
+    'baseline': True,
+    'normalize': True,
+    'baseline_method': 'poly',
+    'normalize_method': 'minmax',
+    'derivative': 0,
+}
+
+
+@lru_cache(maxsize=8)
+def _als_penalty_bands(length, lam):
+    """
+    lam·D·Dᵀ 的上三角带状存储 (3, L)，D 为二阶差分矩阵。
+    格式与 scipy.linalg.solveh_banded 的 upper form 一致。
+    """
+    from scipy import sparse
+
+    D = sparse.diags([1, -2, 1], [0, -1, -2], shape=(length, length - 2), dtype=float)
+    penalty = (lam * D.dot(D.transpose())).todia()
+    bands = np.zeros((3, length))
+    bands[2] = penalty.diagonal(0)
+    bands[1, 1:] = penalty.diagonal(1)
+    bands[0, 2:] = penalty.diagonal(2)
+    bands.setflags(write=False)
+    return bands
+
+
+def _solve_als_system(penalty, w, y):
+    """求解 (diag(w) + lam·D·Dᵀ) z = w·y"""
+    from scipy.linalg import LinAlgError, solveh_banded
+
+    ab = penalty.copy()
+    ab[2] += w
+    try:
+        return solveh_banded(ab, w * y, overwrite_ab=True, check_finite=False)
+    except LinAlgError:
+        # 权重退化导致矩阵非正定时回退到通用稀疏求解
+        from scipy import sparse
+        from scipy.sparse.linalg import spsolve
+
+        length = len(y)
+        Z = sparse.diags(
+            [ab[0, 2:], ab[1, 1:], ab[2], ab[1, 1:], ab[0, 2:]],
+            [-2, -1, 0, 1, 2], shape=(length, length), format='csc'
+        )
+        return spsolve(Z, w * y)
+
+
+def _solve_als_batch(penalty, W, Y):
+    """
+    一次求解一组光谱的 (diag(w) + lam·D·Dᵀ) z = w·y。
+    各光谱的系统首尾相接组成块对角带状矩阵：penalty 每块首行的超对角元素为 0，
+    平铺后块之间没有耦合，一次 solveh_banded 求得全部光谱的解。
+    """
+    from scipy.linalg import LinAlgError, solveh_banded
+
+    n_spectra, length = Y.shape
+    ab = np.tile(penalty, n_spectra)
+    ab[2] += W.ravel()
+    try:
+        Z = solveh_banded(ab, (W * Y).ravel(), overwrite_ab=True, overwrite_b=True, check_finite=False)
+    except LinAlgError:
+        # 某条光谱的系统非正定时逐条求解，退化的光谱回退到通用稀疏求解
+        return np.stack([_solve_als_system(penalty, w, y) for w, y in zip(W, Y)])
+    return Z.reshape(n_spectra, length)
+
 
 class RamanPreprocessor:
     """
@@ -19,23 +89,18 @@ class RamanPreprocessor:
         :param polyorder: 多项式阶数
         :return: 平滑后的数组
         """
-        try:
-            # 确保 window_length 是奇数且小于数据长度
-            if window_length % 2 == 0:
-                window_length += 1
-            if window_length >= len(y_data):
-                window_length = len(y_data) - 1 if len(y_data) % 2 == 0 else len(y_data) - 2
-            
-            return savgol_filter(y_data, window_length, polyorder)
-        except Exception as e:
-            print(f"Smoothing error: {e}")
-            return y_data
+        y_array = np.asarray(y_data, dtype=float)
+        return RamanPreprocessor._smooth_savgol_batch(
+            y_array[np.newaxis, :], window_length, polyorder
+        )[0]
 
     @staticmethod
     def normalize_minmax(y_data):
         """
         Min-Max 归一化 (0-1)
         """
+        from sklearn.preprocessing import MinMaxScaler
+
         y_array = np.array(y_data).reshape(-1, 1)
         scaler = MinMaxScaler()
         return scaler.fit_transform(y_array).flatten()
@@ -49,29 +114,53 @@ class RamanPreprocessor:
         :param degree: 多项式阶数
         :return: 校正后的强度 (原始 - 基线)
         """
-        try:
-            coeffs = np.polyfit(x_data, y_data, degree)
-            baseline = np.polyval(coeffs, x_data)
-            return y_data - baseline
-        except Exception as e:
-            print(f"Baseline correction error: {e}")
-            return y_data
+        y_array = np.asarray(y_data, dtype=float)
+        return RamanPreprocessor._baseline_poly_batch(
+            x_data, y_array[np.newaxis, :], degree
+        )[0]
 
     @staticmethod
-    def baseline_als(y_data, lam=100000, p=0.01, niter=10):
+    def baseline_als(y_data, lam=100000, p=0.01, niter=10, tol=0.0):
         """
         Asymmetric Least Squares Smoothing (ALS) for baseline correction.
         Reference: Eilers, P. H. C. (2004). "Baseline Correction with Asymmetric Least Squares Smoothing".
+        :param niter: 最大迭代次数
+        :param tol: 权重变化比例不超过 tol 时提前结束（0 表示权重完全不变）
         """
-        L = len(y_data)
-        D = sparse.diags([1,-2,1],[0,-1,-2], shape=(L,L-2))
-        w = np.ones(L)
-        for i in range(niter):
-            W = sparse.spdiags(w, 0, L, L)
-            Z = W + lam * D.dot(D.transpose())
-            z = spsolve(Z, w*y_data)
-            w = p * (y_data > z) + (1-p) * (y_data < z)
-        return y_data - z
+        y_array = np.asarray(y_data, dtype=float)
+        return RamanPreprocessor.baseline_als_batch(y_array[np.newaxis, :], lam, p, niter, tol)[0]
+
+    @staticmethod
+    def baseline_als_batch(Y, lam=100000, p=0.01, niter=10, tol=0.0):
+        """
+        批量 ALS 基线校正。
+        (W + lam·D·Dᵀ) 为对称五对角正定矩阵，使用带状 Cholesky (solveh_banded) 求解；
+        lam·D·Dᵀ 按 (长度, lam) 缓存。每轮迭代把尚未收敛的光谱拼成一个块对角带状系统一次求解，
+        权重不再变化的光谱提前退出（结果与固定 niter 次迭代一致）。
+        :param Y: 强度矩阵，形状 (N, L)
+        :return: 校正后的 (N, L) 矩阵 (原始 - 基线)
+        """
+        Y = np.array(Y, dtype=float, ndmin=2)
+        n_spectra, length = Y.shape
+        if length < 3:
+            return Y.copy()
+
+        penalty = _als_penalty_bands(length, float(lam))
+        Z = np.empty_like(Y)
+        W = np.ones_like(Y)
+        active = np.arange(n_spectra)
+
+        for _ in range(niter):
+            Y_active = Y[active]
+            Z_active = Z[active] = _solve_als_batch(penalty, W[active], Y_active)
+            W_new = p * (Y_active > Z_active) + (1 - p) * (Y_active < Z_active)
+            changed = (W_new != W[active]).mean(axis=1)
+            W[active] = W_new
+            active = active[changed > tol]
+            if active.size == 0:
+                break
+
+        return Y - Z
 
     @staticmethod
     def normalize_snv(y_data):
@@ -109,18 +198,24 @@ class RamanPreprocessor:
         预处理流水线
         """
         if config is None:
-            config = {'smooth': True, 'baseline': True, 'normalize': True, 'baseline_method': 'poly', 'normalize_method': 'minmax', 'derivative': 0}
+            config = DEFAULT_PIPELINE_CONFIG
         
         y_processed = np.array(y_data)
 
         if config.get('smooth'):
-            y_processed = RamanPreprocessor.smooth_savgol(y_processed)
+            y_processed = RamanPreprocessor.smooth_savgol(
+                y_processed,
+                window_length=config.get('smooth_window', 11),
+                polyorder=config.get('smooth_polyorder', 3),
+            )
         
         if config.get('baseline'):
             if config.get('baseline_method') == 'als':
                  y_processed = RamanPreprocessor.baseline_als(y_processed)
             else:
-                 y_processed = RamanPreprocessor.baseline_correction_poly(x_data, y_processed)
+                 y_processed = RamanPreprocessor.baseline_correction_poly(
+                     x_data, y_processed, degree=config.get('baseline_degree', 5)
+                 )
         
         if config.get('derivative', 0) > 0:
             y_processed = RamanPreprocessor.derivative(x_data, y_processed, order=config.get('derivative'))
@@ -132,3 +227,234 @@ class RamanPreprocessor:
                 y_processed = RamanPreprocessor.normalize_minmax(y_processed)
             
         return y_processed
+
+    @staticmethod
+    def canonical_config(config=None):
+        """
+        补全预处理配置中省略的键，得到与 process_pipeline 实际行为等价的完整配置。
+        用于比较/哈希配置（如特征缓存键）。
+        """
+        if config is None:
+            config = DEFAULT_PIPELINE_CONFIG
+        return {
+            'smooth': bool(config.get('smooth')),
+            'smooth_window': int(config.get('smooth_window', 11)),
+            'smooth_polyorder': int(config.get('smooth_polyorder', 3)),
+            'baseline': bool(config.get('baseline')),
+            'baseline_method': 'als' if config.get('baseline_method') == 'als' else 'poly',
+            'baseline_degree': int(config.get('baseline_degree', 5)),
+            'normalize': bool(config.get('normalize')),
+            'normalize_method': 'snv' if config.get('normalize_method') == 'snv' else 'minmax',
+            'derivative': int(config.get('derivative', 0)),
+        }
+
+    # -------------------------------------------------------------------------
+    # 批量（矩阵）预处理
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def compile(config=None, dtype=np.float32):
+        """
+        把预处理配置编译为不可变的 PreprocessingPlan（按配置与 dtype 缓存）。
+        """
+        canonical = RamanPreprocessor.canonical_config(config)
+        return _compile_plan(tuple(sorted(canonical.items())), np.dtype(dtype).str)
+
+    @staticmethod
+    def process_batch(x_data, Y, config=None):
+        """
+        批量预处理流水线：对 (N, L) 光谱矩阵按 axis=1 整体执行各阶段，
+        结果与逐条调用 process_pipeline 一致。
+        :param x_data: 共享波数轴，长度 L
+        :param Y: 强度矩阵，形状 (N, L)
+        :param config: 预处理配置，同 process_pipeline
+        :return: 预处理后的 (N, L) float64 矩阵
+        """
+        return RamanPreprocessor.compile(config, dtype=np.float64).run(x_data, Y)
+
+    @staticmethod
+    def process_spectra(spectra, config=None, target_x=None):
+        """
+        对任意多条 (x, y) 光谱做批量预处理。
+        按波数轴分组后逐组调用 process_batch，返回与输入顺序一致的结果列表。
+        :param target_x: 若给定，预处理后把每组重采样到该波数轴
+        """
+        groups = {}
+        for idx, (x_data, y_data) in enumerate(spectra):
+            x_array = np.asarray(x_data, dtype=float)
+            key = (len(y_data), x_array.tobytes())
+            groups.setdefault(key, (x_array, []))[1].append(idx)
+
+        results = [None] * len(spectra)
+        for x_array, indices in groups.values():
+            Y = np.array([spectra[i][1] for i in indices], dtype=float)
+            Y_processed = RamanPreprocessor.process_batch(x_array, Y, config)
+            if target_x is not None:
+                Y_processed = resample(x_array, Y_processed, target_x)
+            for row, i in zip(Y_processed, indices):
+                results[i] = row
+        return results
+
+    @staticmethod
+    def _smooth_savgol_batch(Y, window_length=11, polyorder=3, out=None):
+        """Savitzky-Golay 平滑 (批量，按行)；出错时原样返回 Y"""
+        try:
+            length = Y.shape[1]
+            if window_length % 2 == 0:
+                window_length += 1
+            if window_length >= length:
+                window_length = length - 1 if length % 2 == 0 else length - 2
+            return apply_savgol(Y, window_length, polyorder, out=out)
+        except Exception as e:
+            print(f"Smoothing error: {e}")
+            return Y
+
+    @staticmethod
+    def _baseline_poly_batch(x_data, Y, degree=5, out=None, work=None):
+        """多项式拟合基线校正 (批量)：基于缓存的投影算子，Y - Y @ P；出错时原样返回 Y"""
+        try:
+            return remove_poly_baseline(x_data, Y, degree, out=out, work=work)
+        except Exception as e:
+            print(f"Baseline correction error: {e}")
+            return Y
+
+    @staticmethod
+    def _normalize_minmax_batch(Y):
+        """Min-Max 归一化 (批量，原地)，常数行的处理与 MinMaxScaler 一致"""
+        Y -= Y.min(axis=1, keepdims=True)
+        y_range = Y.max(axis=1, keepdims=True)
+        y_range[y_range == 0] = 1.0
+        Y /= y_range
+        return Y
+
+    @staticmethod
+    def _normalize_snv_batch(Y):
+        """SNV 归一化 (批量，原地)，标准差为 0 的行保持不变"""
+        mean = Y.mean(axis=1, keepdims=True)
+        std = Y.std(axis=1, keepdims=True)
+        flat = (std == 0)
+        mean[flat] = 0.0
+        std[flat] = 1.0
+        Y -= mean
+        Y /= std
+        return Y
+
+
+# -----------------------------------------------------------------------------
+# 编译后的预处理计划
+# -----------------------------------------------------------------------------
+
+def _stage_smooth(x_array, current, spare, window_length, polyorder):
+    result = RamanPreprocessor._smooth_savgol_batch(current, window_length, polyorder, out=spare)
+    return (spare, current) if result is spare else (current, spare)
+
+
+def _stage_baseline_poly(x_array, current, spare, degree):
+    RamanPreprocessor._baseline_poly_batch(x_array, current, degree, out=current, work=spare)
+    return current, spare
+
+
+def _stage_baseline_als(x_array, current, spare):
+    current[...] = RamanPreprocessor.baseline_als_batch(current)
+    return current, spare
+
+
+def _stage_derivative(x_array, current, spare):
+    apply_gradient(x_array, current, out=spare)
+    return spare, current
+
+
+def _stage_normalize_minmax(x_array, current, spare):
+    RamanPreprocessor._normalize_minmax_batch(current)
+    return current, spare
+
+
+def _stage_normalize_snv(x_array, current, spare):
+    RamanPreprocessor._normalize_snv_batch(current)
+    return current, spare
+
+
+# 按线程缓存的工作缓冲区最多保留的行数（覆盖推理批次）；更大的批次按次分配
+WORKSPACE_MAX_ROWS = 256
+
+
+class PreprocessingPlan:
+    """
+    编译后的预处理计划（不可变）。
+    构造时解析配置并确定各阶段函数；run() 只按顺序执行阶段，
+    各阶段在按线程复用的一对工作缓冲区之间原地读写，避免逐阶段分配新数组
+    （超过 WORKSPACE_MAX_ROWS 行的批次使用本次调用独占的缓冲区）。
+    """
+
+    __slots__ = ('config', 'dtype', 'stages', '_local')
+
+    def __init__(self, config=None, dtype=np.float32):
+        cfg = RamanPreprocessor.canonical_config(config)
+        stages = []
+        if cfg['smooth']:
+            stages.append(partial(_stage_smooth, window_length=cfg['smooth_window'],
+                                  polyorder=cfg['smooth_polyorder']))
+        if cfg['baseline']:
+            if cfg['baseline_method'] == 'als':
+                stages.append(_stage_baseline_als)
+            else:
+                stages.append(partial(_stage_baseline_poly, degree=cfg['baseline_degree']))
+        if cfg['derivative'] in (1, 2):
+            stages.extend([_stage_derivative] * cfg['derivative'])
+        if cfg['normalize']:
+            if cfg['normalize_method'] == 'snv':
+                stages.append(_stage_normalize_snv)
+            else:
+                stages.append(_stage_normalize_minmax)
+
+        object.__setattr__(self, 'config', MappingProxyType(cfg))
+        object.__setattr__(self, 'dtype', np.dtype(dtype))
+        object.__setattr__(self, 'stages', tuple(stages))
+        object.__setattr__(self, '_local', threading.local())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PreprocessingPlan is immutable")
+
+    def run(self, x_data, Y, out=None):
+        """
+        执行预处理。
+        :param x_data: 共享波数轴，长度 L
+        :param Y: 单条光谱 (L,) 或光谱矩阵 (N, L)
+        :param out: 可选输出数组 (N, L)，dtype 与计划一致
+        :return: 预处理结果（单条输入返回一维数组）
+        """
+        Y = np.asarray(Y)
+        single = Y.ndim == 1
+        Y = Y.reshape(1, -1) if single else Y
+        n_spectra, length = Y.shape
+        if out is None:
+            out = np.empty((n_spectra, length), dtype=self.dtype)
+        if n_spectra == 0:
+            return out
+
+        current, spare = self._workspace(n_spectra, length)
+        np.copyto(current, Y, casting='unsafe')
+        x_array = np.asarray(x_data, dtype=np.float64)
+        for stage in self.stages:
+            current, spare = stage(x_array, current, spare)
+
+        np.copyto(out, current)
+        return out[0] if single else out
+
+    def _workspace(self, n_spectra, length):
+        if n_spectra > WORKSPACE_MAX_ROWS:
+            # 大批量（训练语料、分析）按次分配，不在线程缓存中长期占用整份语料大小的缓冲区
+            return (np.empty((n_spectra, length), dtype=self.dtype),
+                    np.empty((n_spectra, length), dtype=self.dtype))
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None or buffers[0].shape[1] != length or buffers[0].shape[0] < n_spectra:
+            rows = n_spectra if buffers is None else max(n_spectra, buffers[0].shape[0])
+            buffers = (np.empty((rows, length), dtype=self.dtype),
+                       np.empty((rows, length), dtype=self.dtype))
+            self._local.buffers = buffers
+        return buffers[0][:n_spectra], buffers[1][:n_spectra]
+
+
+@lru_cache(maxsize=16)
+def _compile_plan(config_items, dtype_str):
+    return PreprocessingPlan(dict(config_items), dtype=np.dtype(dtype_str))
@@ -0,0 +1,89 @@
+"""
+MultiTaskRamanCNN 训练后 int8 静态量化。
+
+在 FusedRamanCNN（BN 已折叠、任务头已合并）上做 FX 图模式静态量化：
+用训练集的一部分校准激活范围，转换后 trace + freeze 保存为 TorchScript，
+与 .pth 一起登记在 ModelVersion.quantized_path。
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import torch
+from django.conf import settings
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from .inference_compile import FusedRamanCNN
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_SUFFIX = '.int8.pt'
+
+# 延迟测量使用的批大小（单条请求 / 批量导入）
+LATENCY_BATCH_SIZES = (1, 32)
+
+
+def quantization_engine():
+    """选择量化后端：优先使用配置值，不可用时回退到当前平台支持的引擎"""
+    supported = torch.backends.quantized.supported_engines
+    for engine in (settings.QUANTIZATION_ENGINE, 'x86', 'fbgemm', 'qnnpack'):
+        if engine in supported:
+            return engine
+    raise RuntimeError("No quantized engine available on this platform")
+
+
+def quantized_path_for(checkpoint_path):
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(checkpoint_path.stem + QUANTIZED_SUFFIX)
+
+
+def quantize_model(model, calibration_X, batch_size=32):
+    """
+    :param model: eval 模式的 MultiTaskRamanCNN
+    :param calibration_X: (N, L) float32 校准数据
+    :return: (TorchScript int8 模块，输出 (B, 5) logits, 使用的引擎)
+    """
+    engine = quantization_engine()
+    torch.backends.quantized.engine = engine
+
+    calibration = torch.as_tensor(np.ascontiguousarray(calibration_X), dtype=torch.float32).unsqueeze(1)
+    example = calibration[:batch_size]
+    fused = FusedRamanCNN.from_model(model)
+    prepared = prepare_fx(fused, get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for start in range(0, len(calibration), batch_size):
+            prepared(calibration[start:start + batch_size])
+        quantized = convert_fx(prepared)
+        traced = torch.jit.trace(quantized, example)
+    return torch.jit.freeze(traced.eval()), engine
+
+
+def save_quantized(module, path, engine):
+    torch.jit.save(module, str(path), _extra_files={'engine': engine})
+
+
+def load_quantized(path):
+    """读取 int8 模块，并切换到保存时使用的量化引擎"""
+    extra_files = {'engine': ''}
+    module = torch.jit.load(str(path), map_location='cpu', _extra_files=extra_files)
+    engine = extra_files['engine'] or quantization_engine()
+    if isinstance(engine, bytes):
+        engine = engine.decode('utf-8')
+    torch.backends.quantized.engine = engine
+    return module
+
+
+def diagnosis_probabilities(model, loader):
+    """
+    在 DataLoader 上计算诊断概率。
+    :return: (labels, probs) 列表
+    """
+    labels, probs = [], []
+    with torch.no_grad():
+        for X_batch, y_batch, _ in loader:
+            outputs = model(X_batch)
+            logits = outputs[:, 0] if isinstance(outputs, torch.Tensor) else outputs['diagnosis'].squeeze(1)
+            probs.extend(torch.sigmoid(logits).tolist())
+            labels.extend(y_batch.tolist())
+    return labels, probs
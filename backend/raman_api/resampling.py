@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .operators import OperatorCache, grid_key, register_grid_axis
+
+# 模型输入使用的标准波数轴：400–2200 cm⁻¹，1 cm⁻¹ 间隔，共 1801 点
+CANONICAL_WAVENUMBER_START = 400.0
+CANONICAL_WAVENUMBER_STOP = 2200.0
+CANONICAL_LENGTH = 1801
+
+_interpolation_cache = OperatorCache(maxsize=16)
+
+
+@lru_cache(maxsize=8)
+def canonical_grid(length=CANONICAL_LENGTH):
+    """标准波数轴 (覆盖 400–2200 cm⁻¹ 的 length 个等间距点)，返回共享的只读数组"""
+    grid = np.linspace(CANONICAL_WAVENUMBER_START, CANONICAL_WAVENUMBER_STOP, length)
+    grid.setflags(write=False)
+    register_grid_axis(grid)
+    return grid
+
+
+def interpolation_matrix(source_x, target_x):
+    """
+    返回稀疏插值矩阵 M (len(target_x), len(source_x))，M @ y 即把 y 从源波数轴
+    线性插值到目标波数轴（超出范围时线性外推，与 interp1d(fill_value='extrapolate') 一致）。
+    源轴与目标轴完全相同时返回 None。
+    按 (源轴哈希, 目标轴哈希) 做 LRU 缓存。
+    """
+    source_x = np.asarray(source_x, dtype=np.float64)
+    target_x = np.asarray(target_x, dtype=np.float64)
+    if source_x.shape == target_x.shape and np.array_equal(source_x, target_x):
+        return None
+
+    key = (grid_key(source_x), grid_key(target_x))
+    return _interpolation_cache.get_or_build(
+        key, lambda: _build_interpolation_matrix(source_x, target_x)
+    )
+
+
+def _build_interpolation_matrix(source_x, target_x):
+    from scipy import sparse
+
+    n_source, n_target = len(source_x), len(target_x)
+    rows = np.arange(n_target)
+    if n_source == 1:
+        return sparse.csr_matrix(
+            (np.ones(n_target), (rows, np.zeros(n_target, dtype=int))),
+            shape=(n_target, 1),
+        )
+
+    # 源轴可能是降序或无序的，先排序再定位区间
+    order = np.argsort(source_x, kind='stable')
+    xs = source_x[order]
+    lo = np.clip(np.searchsorted(xs, target_x, side='right') - 1, 0, n_source - 2)
+    x0, x1 = xs[lo], xs[lo + 1]
+    dx = x1 - x0
+    t = np.divide(target_x - x0, dx, out=np.zeros(n_target), where=dx > 0)
+
+    M = sparse.csr_matrix(
+        (np.concatenate([1.0 - t, t]),
+         (np.concatenate([rows, rows]), np.concatenate([order[lo], order[lo + 1]]))),
+        shape=(n_target, n_source),
+    )
+    M.sum_duplicates()
+    return M
+
+
+def resample(x_data, Y, target_x=None):
+    """
+    把 (N, L) 光谱矩阵（或单条光谱）从 x_data 波数轴重采样到 target_x（默认标准轴）。
+    x_data 缺失或长度与 Y 不一致时，视为等间距覆盖目标轴范围（兼容旧的按索引插值）。
+    """
+    target_x = canonical_grid() if target_x is None else np.asarray(target_x, dtype=np.float64)
+    Y = np.asarray(Y, dtype=float)
+    single = Y.ndim == 1
+    Y = np.atleast_2d(Y)
+
+    source_x = np.asarray(x_data, dtype=np.float64)
+    if source_x.shape != (Y.shape[1],):
+        source_x = np.linspace(target_x[0], target_x[-1], Y.shape[1])
+
+    M = interpolation_matrix(source_x, target_x)
+    resampled = Y if M is None else np.asarray((M @ Y.T).T)
+    return resampled[0] if single else resampled
@@ -27,6 +27,17 @@ class SpectralDataSerializer(serializers.Serializer):
         return data
 
 
+class SpectralDataField(serializers.JSONField):
+    """
+    光谱数据字段：以 {'x': [...], 'y': [...]} 形式读写。
+    读取时经 SpectrumRecord.get_spectral_data() 从二进制存储解码；
+    写入值保存在 spectral_data 上，由模型 save() 转存为二进制。
+    """
+
+    def get_attribute(self, instance):
+        return instance.get_spectral_data()
+
+
 class PreprocessConfigSerializer(serializers.Serializer):
     """
     预处理参数校验器，用于 /records/{id}/preprocess/ 接口。
@@ -85,7 +96,7 @@ class SpectrumRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SpectrumRecord
-        exclude = ('spectral_data',) # 列表接口不返回巨大的光谱数据字段
+        exclude = ('spectral_data', 'spectral_blob', 'wavenumber_grid') # 列表接口不返回巨大的光谱数据字段
         read_only_fields = ('diagnosis_result', 'confidence_score', 'processed_path', 'created_at', 'uploaded_by', 'metadata')
 
 class SpectrumRecordDetailSerializer(serializers.ModelSerializer):
@@ -94,10 +105,11 @@ class SpectrumRecordDetailSerializer(serializers.ModelSerializer):
     """
     patient_name = serializers.CharField(source='patient.name', read_only=True)
     uploaded_by_name = serializers.CharField(source='uploaded_by.username', read_only=True)
+    spectral_data = SpectralDataField(required=False, allow_null=True)
 
     class Meta:
         model = SpectrumRecord
-        fields = '__all__'
+        exclude = ('spectral_blob', 'wavenumber_grid')
         read_only_fields = ('diagnosis_result', 'confidence_score', 'processed_path', 'created_at', 'uploaded_by', 'metadata')
 
 class ModelVersionSerializer(serializers.ModelSerializer):
@@ -0,0 +1,153 @@
+"""
+影子推理。
+
+生产模型完成推理后，把同一批原始光谱和生产结果投递到有界队列；
+后台线程用候选模型 (ModelVersion.is_shadow) 重新推理并写入 ShadowPrediction。
+队列满时直接丢弃，不阻塞、不拖慢上传请求。
+"""
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+from django.db.models import Avg, Count, Q
+
+from .models import ShadowPrediction
+from .prediction_cache import spectrum_digest
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowWorker:
+    """
+    有界后台任务队列（单线程消费）。
+    :param runner: runner(job) 处理一个任务
+    :param maxsize: 队列容量，满时 submit 丢弃任务
+    """
+
+    def __init__(self, runner, maxsize=64, name='shadow'):
+        self.runner = runner
+        self.name = name
+        self._queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._lock = threading.Lock()
+        self._worker = None
+        self._submitted = 0
+        self._dropped = 0
+        self._processed = 0
+        self._errors = 0
+
+    def submit(self, job):
+        """非阻塞投递；队列已满时丢弃并返回 False"""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+        with self._lock:
+            self._submitted += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'capacity': self._queue.maxsize,
+                'submitted': self._submitted,
+                'dropped': self._dropped,
+                'processed': self._processed,
+                'errors': self._errors,
+            }
+
+    def join(self):
+        """等待已投递的任务处理完毕（用于脚本/调试）"""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._loop, name=f"{self.name}-worker", daemon=True)
+                self._worker.start()
+
+    def _loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                close_old_connections()
+                self.runner(job)
+                with self._lock:
+                    self._processed += 1
+            except Exception:
+                logger.exception("Shadow job failed.")
+                with self._lock:
+                    self._errors += 1
+            finally:
+                self._queue.task_done()
+
+
+def record_shadow_results(active_version, shadow_version, spectra,
+                          active_results, shadow_results, active_latency_ms, shadow_latency_ms):
+    """批量写入影子推理对比记录"""
+    rows = []
+    for (x_data, y_data), active, shadow in zip(spectra, active_results, shadow_results):
+        rows.append(ShadowPrediction(
+            spectrum_hash=spectrum_digest(x_data, y_data),
+            active_version=active_version,
+            shadow_version=shadow_version,
+            active_diagnosis=active[0],
+            shadow_diagnosis=shadow[0],
+            active_confidence=float(active[1]),
+            shadow_confidence=float(shadow[1]),
+            active_markers=active[2] or None,
+            shadow_markers=shadow[2] or None,
+            agreed=active[0] == shadow[0],
+            markers_agreed=(active[2] or {}) == (shadow[2] or {}),
+            active_latency_ms=active_latency_ms,
+            shadow_latency_ms=shadow_latency_ms,
+        ))
+    ShadowPrediction.objects.bulk_create(rows)
+
+
+def shadow_summary(shadow_version):
+    """
+    一致率、诊断翻转分布及相对耗时。
+    耗时只统计生产侧耗时不为空的记录（未命中缓存、未走微批队列），两侧都是 _predict_uncached 的单条耗时。
+    """
+    records = ShadowPrediction.objects.filter(shadow_version=shadow_version)
+    timed = Q(active_latency_ms__isnull=False)
+    totals = records.aggregate(
+        total=Count('id'),
+        latency_samples=Count('id', filter=timed),
+        active_latency=Avg('active_latency_ms', filter=timed),
+        shadow_latency=Avg('shadow_latency_ms', filter=timed),
+    )
+    total = totals['total']
+    agreed = records.filter(agreed=True).count()
+    markers_agreed = records.filter(markers_agreed=True).count()
+    flips = [
+        {'from': row['active_diagnosis'], 'to': row['shadow_diagnosis'], 'count': row['count']}
+        for row in records.filter(agreed=False)
+        .values('active_diagnosis', 'shadow_diagnosis')
+        .annotate(count=Count('id'))
+        .order_by('-count')
+    ]
+
+    active_latency = totals['active_latency']
+    shadow_latency = totals['shadow_latency']
+    return {
+        'shadow_version': shadow_version,
+        'active_versions': sorted(records.values_list('active_version', flat=True).distinct()),
+        'total': total,
+        'agreement_rate': round(agreed / total, 4) if total else None,
+        'marker_agreement_rate': round(markers_agreed / total, 4) if total else None,
+        'flips': flips,
+        'latency_samples': totals['latency_samples'],
+        'active_latency_ms': round(active_latency, 3) if active_latency is not None else None,
+        'shadow_latency_ms': round(shadow_latency, 3) if shadow_latency is not None else None,
+        'relative_latency': (
+            round(shadow_latency / active_latency, 3) if active_latency and shadow_latency is not None else None
+        ),
+    }
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import SpectrumFeature, SpectrumRecord, WavenumberGrid
+
+SPECTRUM_FIELDS = {'spectral_data', 'spectral_blob', 'wavenumber_grid'}
+
+
+def _spectrum_state(instance):
+    """(光谱二进制, 波数轴 id)；光谱字段被延迟加载时返回 None（状态未知）。只保存引用，不复制光谱数据"""
+    if {'spectral_blob', 'wavenumber_grid'} & instance.get_deferred_fields():
+        return None
+    return instance.spectral_blob, instance.wavenumber_grid_id
+
+
+def _same_spectrum(a, b):
+    if a is None or b is None:
+        return False
+    (blob_a, grid_a), (blob_b, grid_b) = a, b
+    if grid_a != grid_b or (blob_a is None) != (blob_b is None):
+        return False
+    return blob_a is blob_b or blob_a is None or bytes(blob_a) == bytes(blob_b)
+
+
+@receiver(post_init, sender=SpectrumRecord)
+def remember_spectrum(sender, instance, **kwargs):
+    """记录加载时的光谱内容，保存时据此判断光谱是否变化"""
+    if instance.pk is not None:
+        instance._loaded_spectrum = _spectrum_state(instance)
+
+
+@receiver(post_save, sender=SpectrumRecord)
+def invalidate_spectrum_features(sender, instance, created, update_fields=None, **kwargs):
+    """光谱数据或波数轴变化时清除该记录的预处理特征缓存（复核、诊断等字段的修改不影响特征）"""
+    if created:
+        instance._loaded_spectrum = _spectrum_state(instance)
+        return
+    if update_fields is not None and not SPECTRUM_FIELDS & set(update_fields):
+        return
+    if 'spectral_blob' in instance.get_deferred_fields():
+        # 延迟加载且未赋值的光谱字段不会被保存
+        return
+    state = _spectrum_state(instance)
+    if not _same_spectrum(getattr(instance, '_loaded_spectrum', None), state):
+        SpectrumFeature.objects.filter(record_id=instance.pk).delete()
+    instance._loaded_spectrum = state
+
+
+@receiver(post_delete, sender=WavenumberGrid)
+def evict_wavenumber_grid(sender, instance, **kwargs):
+    """删除的波数轴立即移出进程内缓存（事务回滚时下次解析重新查询即可）"""
+    WavenumberGrid.objects.evict(instance)
@@ -0,0 +1,98 @@
+"""
+光谱二进制存储格式。
+
+布局（小端）:
+    header  : magic b'RSPC' | version (uint8) | dtype (uint8) | axis_id (uint16) | length (uint32)
+    y       : length 个强度值 (float32/float64)
+    x       : 仅当 axis_id == AXIS_INLINE 时存在，length 个 float64 波数
+
+axis_id 为 AXIS_GRID 时波数轴由记录关联的 WavenumberGrid 提供（新写入的默认方式）；
+AXIS_NONE 表示原始数据没有波数轴；其余非 0 值引用 SHARED_AXES 中的内置共享轴
+（早期写入的数据，仍可解码）。
+"""
+import struct
+
+import numpy as np
+
+from .resampling import canonical_grid
+
+MAGIC = b'RSPC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBHI')
+
+DTYPE_CODES = {1: np.dtype('<f4'), 2: np.dtype('<f8')}
+DTYPE_IDS = {dtype: code for code, dtype in DTYPE_CODES.items()}
+
+AXIS_INLINE = 0
+AXIS_CANONICAL_1801 = 1
+AXIS_GRID = 0xFFFE
+AXIS_NONE = 0xFFFF
+SHARED_AXES = {
+    AXIS_CANONICAL_1801: canonical_grid(1801),  # 400–2200 cm⁻¹，1 cm⁻¹ 间隔
+}
+for _axis in SHARED_AXES.values():
+    _axis.setflags(write=False)
+
+
+def _shared_axis_id(x_array):
+    if x_array.size == 0:
+        return AXIS_NONE
+    for axis_id, axis in SHARED_AXES.items():
+        if x_array.shape == axis.shape and np.array_equal(x_array, axis):
+            return axis_id
+    return AXIS_INLINE
+
+
+def encode_spectrum(x_data, y_data, dtype=np.float32):
+    """把 (x, y) 编码为二进制；x 与共享轴一致时只存引用"""
+    dtype = np.dtype(dtype).newbyteorder('<')
+    y_array = np.asarray(y_data, dtype=dtype)
+    x_array = np.asarray(x_data, dtype=np.float64)
+    if x_array.size and x_array.shape != y_array.shape:
+        raise ValueError("x 和 y 数组长度必须一致")
+
+    axis_id = _shared_axis_id(x_array)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_IDS[dtype], axis_id, len(y_array))
+    parts = [header, y_array.tobytes()]
+    if axis_id == AXIS_INLINE:
+        parts.append(x_array.astype('<f8', copy=False).tobytes())
+    return b''.join(parts)
+
+
+def encode_intensities(y_data, dtype=np.float32, has_axis=True):
+    """
+    只编码强度，波数轴由外部 (WavenumberGrid) 提供。
+    :param has_axis: 原始数据没有波数轴时为 False
+    """
+    dtype = np.dtype(dtype).newbyteorder('<')
+    y_array = np.asarray(y_data, dtype=dtype)
+    axis_id = AXIS_GRID if has_axis else AXIS_NONE
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_IDS[dtype], axis_id, len(y_array))
+    return header + y_array.tobytes()
+
+
+def decode_spectrum(blob, grid_axis=None):
+    """
+    解码二进制光谱。
+    :param grid_axis: axis_id 为 AXIS_GRID 时使用的波数轴（记录关联的 WavenumberGrid）
+    :return: (x, y)，均为只读 numpy 数组（y 直接引用 blob 内存，不复制）
+    """
+    blob = bytes(blob)
+    magic, version, dtype_id, axis_id, length = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported spectral blob format")
+
+    dtype = DTYPE_CODES[dtype_id]
+    y_array = np.frombuffer(blob, dtype=dtype, count=length, offset=HEADER.size)
+    if axis_id == AXIS_INLINE:
+        x_array = np.frombuffer(blob, dtype='<f8', count=length,
+                                offset=HEADER.size + length * dtype.itemsize)
+    elif axis_id == AXIS_NONE:
+        x_array = np.empty(0)
+    elif axis_id == AXIS_GRID:
+        if grid_axis is None:
+            raise ValueError("Spectral blob references a wavenumber grid but none was given")
+        x_array = grid_axis
+    else:
+        x_array = SHARED_AXES[axis_id]
+    return x_array, y_array
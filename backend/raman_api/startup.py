@@ -0,0 +1,59 @@
+"""
+启动耗时记录。
+
+进程内记录各启动阶段的耗时（应用初始化、首次加载模型等）以及已导入的重量级科学计算依赖，
+通过推理统计接口查看；完整的导入耗时分析见 `python scripts/startup_report.py`（在 backend 目录下运行）。
+"""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 导入较慢、只应在实际用到时加载的依赖
+HEAVY_MODULES = ('torch', 'sklearn', 'scipy', 'pandas', 'joblib')
+
+
+class StartupReport:
+    """启动阶段耗时（毫秒），每个阶段只记录第一次"""
+
+    _lock = threading.Lock()
+    _phases = {}
+
+    @classmethod
+    def record(cls, phase, elapsed_ms, **details):
+        with cls._lock:
+            if phase in cls._phases:
+                return
+            cls._phases[phase] = {
+                'ms': round(elapsed_ms, 1),
+                'at': timezone.now().isoformat(),
+                **details,
+            }
+        logger.info("Startup phase %s took %.1f ms", phase, elapsed_ms)
+
+    @classmethod
+    @contextmanager
+    def timed(cls, phase, **details):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(phase, (time.perf_counter() - started) * 1000, **details)
+
+    @staticmethod
+    def heavy_modules_loaded():
+        return [name for name in HEAVY_MODULES if name in sys.modules]
+
+    @classmethod
+    def report(cls):
+        with cls._lock:
+            phases = {phase: dict(info) for phase, info in cls._phases.items()}
+        return {
+            'phases': phases,
+            'heavy_modules_loaded': cls.heavy_modules_loaded(),
+        }
@@ -1,3 +1,92 @@
-from django.test import TestCase
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+import torch
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+
+from .cnn import MultiTaskRamanCNN
+from .inference_compile import (
+    PARITY_TOLERANCE, FusedRamanCNN, cache_path_for, check_parity, compile_model, eager_logits,
+    load_or_compile,
+)
+from .models import Patient, SpectrumRecord, WavenumberGrid
+
+INPUT_LENGTH = 1801
+
+
+class InferenceCompileParityTests(SimpleTestCase):
+    """编译推理网络与 eager 模型输出一致性"""
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = MultiTaskRamanCNN(input_length=INPUT_LENGTH)
+        # 随机化 BatchNorm 统计量，使 BN 折叠真正参与比较
+        for module in self.model.modules():
+            if isinstance(module, torch.nn.BatchNorm1d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+        self.model.eval()
+        self.x = torch.rand(7, 1, INPUT_LENGTH)
+
+    def test_fused_model_matches_eager(self):
+        fused = FusedRamanCNN.from_model(self.model)
+        with torch.no_grad():
+            expected = torch.sigmoid(eager_logits(self.model, self.x))
+            actual = torch.sigmoid(fused(self.x))
+        self.assertEqual(actual.shape, (7, 5))
+        self.assertLessEqual((expected - actual).abs().max().item(), PARITY_TOLERANCE)
+
+    def test_compiled_model_matches_eager(self):
+        compiled = compile_model(self.model, INPUT_LENGTH)
+        self.assertLessEqual(check_parity(self.model, compiled, INPUT_LENGTH), PARITY_TOLERANCE)
+
+    def test_load_or_compile_writes_and_reuses_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Path(directory) / 'v1.pth'
+            torch.save({'state_dict': self.model.state_dict()}, checkpoint)
+
+            compiled, info = load_or_compile(self.model, checkpoint, INPUT_LENGTH)
+            self.assertIsNotNone(compiled)
+            self.assertEqual(info['source'], 'compiled')
+            self.assertTrue(cache_path_for(checkpoint).exists())
+            # 只留下最终缓存文件，没有残留的临时文件
+            self.assertEqual(sorted(p.name for p in Path(directory).iterdir()), ['v1.pth', 'v1.ts.pt'])
+
+            cached, info = load_or_compile(self.model, checkpoint, INPUT_LENGTH)
+            self.assertEqual(info['source'], 'cache')
+            with torch.no_grad():
+                self.assertLessEqual((torch.sigmoid(cached(self.x)) - torch.sigmoid(compiled(self.x))).abs().max().item(),
+                                     PARITY_TOLERANCE)
+
+
+class WavenumberGridCacheTests(TestCase):
+    """波数轴进程内缓存不返回回滚或已删除的行"""
+
+    def setUp(self):
+        WavenumberGrid.objects.clear_cache()
+        self.addCleanup(WavenumberGrid.objects.clear_cache)
+        self.x = np.linspace(400.0, 1800.0, 64)
+
+    def test_rolled_back_grid_is_not_cached(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            WavenumberGrid.objects.resolve(self.x)
+            raise RuntimeError
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grid = WavenumberGrid.objects.resolve(self.x)
+        self.assertTrue(WavenumberGrid.objects.filter(pk=grid.pk).exists())
+        self.assertIs(WavenumberGrid.objects.resolve(self.x), grid)
+
+    def test_deleted_grid_is_evicted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            grid = WavenumberGrid.objects.resolve(self.x)
+        grid_id = grid.pk
+        grid.delete()
+
+        record = SpectrumRecord(patient=Patient.objects.create(name='p', age=50, gender='F'), file_path='s.txt')
+        record.set_spectrum(self.x, np.ones_like(self.x))
+        record.save()
+        self.assertNotEqual(record.wavenumber_grid_id, grid_id)
+        np.testing.assert_array_equal(record.get_spectrum()[0], self.x)
@@ -0,0 +1,257 @@
+"""
+MultiTaskRamanCNN 训练与评估。
+
+train_new_version 的单进程训练与交叉验证（各折在独立进程中训练）共用本模块的训练循环。
+进程间只传递语料快照目录和行索引，worker 以内存映射方式打开同一份语料。
+"""
+import logging
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, Subset, random_split
+
+from .cnn import MultiTaskRamanCNN
+from .utils.dataset import RamanDataset
+
+logger = logging.getLogger(__name__)
+
+# 训练超参数默认值
+DEFAULT_HYPERPARAMS = {
+    'lr': 1e-3,
+    'batch_size': 32,
+    'aux_weight': 0.2,      # 辅助任务 (ER/PR/HER2/Ki67) 损失权重
+    'max_epochs': 100,
+    'patience': 15,         # 早停
+}
+
+# 汇总交叉验证结果时取均值/标准差的指标
+SUMMARY_METRICS = ('accuracy', 'sensitivity', 'specificity', 'ppv', 'npv', 'f1', 'auc_roc')
+
+
+def class_pos_weight(y):
+    """类别不平衡权重 n_benign / n_malignant（P1-6）；缺少任一类别时为 None"""
+    n_malignant = int(np.sum(y))
+    n_benign = len(y) - n_malignant
+    if n_benign > 0 and n_malignant > 0:
+        return n_benign / n_malignant
+    return None
+
+
+def holdout_indices(n_samples, train_fraction=0.8, generator=None):
+    """随机划分训练/验证集行索引"""
+    train_size = int(train_fraction * n_samples)
+    train_ds, val_ds = random_split(range(n_samples), [train_size, n_samples - train_size], generator=generator)
+    return np.asarray(train_ds.indices, dtype=np.int64), np.asarray(val_ds.indices, dtype=np.int64)
+
+
+def stratified_folds(y, n_folds, seed=0):
+    """
+    按诊断标签分层的 k 折划分。
+    :return: [(train_idx, val_idx), ...]；折数按少数类样本数下调，不足 2 折时返回空列表
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    y = np.asarray(y)
+    n_folds = min(n_folds, int(np.bincount(y.astype(np.int64), minlength=2).min()))
+    if n_folds < 2:
+        return []
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    return list(splitter.split(np.zeros(len(y)), y))
+
+
+def make_loaders(dataset, train_idx, val_idx, batch_size=32):
+    train_loader = DataLoader(Subset(dataset, train_idx), batch_size=batch_size, shuffle=True)
+    val_loader = DataLoader(Subset(dataset, val_idx), batch_size=batch_size, shuffle=False)
+    return train_loader, val_loader
+
+
+def _masked_loss(pred, target):
+    mask = (target != -1.0).float()
+    loss = nn.functional.binary_cross_entropy_with_logits(pred, target, reduction='none')
+    return (loss * mask).sum() / (mask.sum() + 1e-6)
+
+
+def diagnosis_loss(outputs, y_batch, pos_weight=None):
+    """诊断任务 BCE（可加权）"""
+    return nn.functional.binary_cross_entropy_with_logits(
+        outputs['diagnosis'], y_batch.unsqueeze(1), pos_weight=pos_weight
+    )
+
+
+def multitask_loss(outputs, y_batch, aux_batch, pos_weight=None, aux_weight=0.2):
+    """诊断 BCE（可加权）+ aux_weight × 四个辅助任务的掩码 BCE（-1 表示缺失）"""
+    l_diag = diagnosis_loss(outputs, y_batch, pos_weight)
+    l_er   = _masked_loss(outputs['ER'],   aux_batch[:, 0:1])
+    l_pr   = _masked_loss(outputs['PR'],   aux_batch[:, 1:2])
+    l_her2 = _masked_loss(outputs['HER2'], aux_batch[:, 2:3])
+    l_ki67 = _masked_loss(outputs['Ki67'], aux_batch[:, 3:4])
+    return l_diag + aux_weight * (l_er + l_pr + l_her2 + l_ki67)
+
+
+def fit(model, train_loader, val_loader, pos_weight=None, hparams=None, on_epoch=None, monitor='total'):
+    """
+    Adam + ReduceLROnPlateau + 早停（P1-4），结束后模型载入验证损失最优的参数。
+    :param pos_weight: 诊断任务正类权重（float 或 None）
+    :param on_epoch: on_epoch(epoch, train_loss, val_loss)，返回 False 时提前结束训练
+    :param monitor: 用于调度、早停和选取最优参数的验证损失：'total' 为多任务损失，
+                    'diagnosis' 为诊断损失（不随 aux_weight 变化，不同 aux_weight 的模型可直接比较）
+    :return: (best_val_loss, 实际训练的 epoch 数)
+    """
+    if monitor not in ('total', 'diagnosis'):
+        raise ValueError(f"Unknown monitor: {monitor}")
+    hparams = {**DEFAULT_HYPERPARAMS, **(hparams or {})}
+    max_epochs, patience = hparams['max_epochs'], hparams['patience']
+    aux_weight = hparams['aux_weight']
+    pos_weight = torch.tensor([pos_weight], dtype=torch.float32) if pos_weight is not None else None
+
+    optimizer = optim.Adam(model.parameters(), lr=hparams['lr'])
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(
+        optimizer, mode='min', patience=10, factor=0.5, min_lr=1e-6
+    )
+
+    best_val_loss = float('inf')
+    no_improve_count = 0
+    best_state = None
+    epochs_run = 0
+
+    for epoch in range(max_epochs):
+        epochs_run = epoch + 1
+        model.train()
+        train_loss = 0.0
+        for X_batch, y_batch, aux_batch in train_loader:
+            optimizer.zero_grad()
+            loss = multitask_loss(model(X_batch), y_batch, aux_batch, pos_weight, aux_weight)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item()
+        train_loss /= len(train_loader)
+
+        # 验证损失（用于调度器和早停）
+        model.eval()
+        val_loss = 0.0
+        with torch.no_grad():
+            for X_batch, y_batch, aux_batch in val_loader:
+                outputs = model(X_batch)
+                if monitor == 'diagnosis':
+                    val_loss += diagnosis_loss(outputs, y_batch, pos_weight).item()
+                else:
+                    val_loss += multitask_loss(outputs, y_batch, aux_batch, pos_weight, aux_weight).item()
+        val_loss /= len(val_loader)
+
+        scheduler.step(val_loss)
+        logger.info("Epoch %d/%d | train_loss=%.4f | val_loss=%.4f",
+                    epoch + 1, max_epochs, train_loss, val_loss)
+
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            no_improve_count = 0
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+        else:
+            no_improve_count += 1
+
+        if on_epoch is not None and on_epoch(epoch, train_loss, val_loss) is False:
+            logger.info("Training stopped by callback at epoch %d.", epoch + 1)
+            break
+        if no_improve_count >= patience:
+            logger.info("Early stopping at epoch %d (no improvement for %d epochs).",
+                        epoch + 1, patience)
+            break
+
+    # 使用验证集上最优 checkpoint
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    return best_val_loss, epochs_run
+
+
+def evaluate(model, loader):
+    """验证集上的医疗级指标（P1-5）"""
+    model.eval()
+    all_probs, all_preds, all_labels = [], [], []
+    with torch.no_grad():
+        for X_batch, y_batch, _ in loader:
+            probs = torch.sigmoid(model(X_batch)['diagnosis']).squeeze(1)
+            all_probs.extend(probs.tolist())
+            all_preds.extend((probs > 0.5).float().tolist())
+            all_labels.extend(y_batch.tolist())
+    return compute_medical_metrics(all_labels, all_preds, all_probs)
+
+
+def compute_medical_metrics(y_true, y_pred, y_prob):
+    """计算临床诊断必需的评估指标（P1-5）"""
+    y_true = np.array(y_true)
+    y_pred = np.array(y_pred)
+    y_prob = np.array(y_prob)
+
+    tp = ((y_pred == 1) & (y_true == 1)).sum()
+    tn = ((y_pred == 0) & (y_true == 0)).sum()
+    fp = ((y_pred == 1) & (y_true == 0)).sum()
+    fn = ((y_pred == 0) & (y_true == 1)).sum()
+
+    accuracy    = (tp + tn) / (tp + tn + fp + fn + 1e-9)
+    sensitivity = tp / (tp + fn + 1e-9)   # 召回率 / 灵敏度（恶性不漏诊率）
+    specificity = tn / (tn + fp + 1e-9)   # 特异度（良性不误诊率）
+    ppv         = tp / (tp + fp + 1e-9)   # 阳性预测值
+    npv         = tn / (tn + fn + 1e-9)   # 阴性预测值
+    f1          = 2 * tp / (2 * tp + fp + fn + 1e-9)
+
+    metrics = {
+        'accuracy':    round(float(accuracy), 4),
+        'sensitivity': round(float(sensitivity), 4),
+        'specificity': round(float(specificity), 4),
+        'ppv':         round(float(ppv), 4),
+        'npv':         round(float(npv), 4),
+        'f1':          round(float(f1), 4),
+        'tp': int(tp), 'tn': int(tn), 'fp': int(fp), 'fn': int(fn),
+    }
+
+    # AUC-ROC（需要 sklearn）
+    try:
+        from sklearn.metrics import roc_auc_score
+        if len(np.unique(y_true)) > 1:
+            metrics['auc_roc'] = round(float(roc_auc_score(y_true, y_prob)), 4)
+    except Exception:
+        pass
+
+    return metrics
+
+
+def train_split(corpus_dir, train_idx, val_idx, input_length, pos_weight=None, hparams=None,
+                seed=None, return_state=False):
+    """
+    在语料快照的一个划分上训练并评估（可作为进程池任务）。
+    :return: {'metrics', 'best_val_loss', 'epochs', 'state_dict'（return_state 时）}
+    """
+    from .corpus import CorpusSnapshot
+
+    if seed is not None:
+        torch.manual_seed(seed)
+    hparams = {**DEFAULT_HYPERPARAMS, **(hparams or {})}
+    _, X, y, aux = CorpusSnapshot.open(corpus_dir)
+    dataset = RamanDataset.from_arrays(X, y, aux)
+    train_loader, val_loader = make_loaders(dataset, train_idx, val_idx, hparams['batch_size'])
+
+    model = MultiTaskRamanCNN(input_length=input_length)
+    best_val_loss, epochs = fit(model, train_loader, val_loader, pos_weight=pos_weight, hparams=hparams)
+    result = {
+        'metrics': evaluate(model, val_loader),
+        'best_val_loss': best_val_loss,
+        'epochs': epochs,
+    }
+    if return_state:
+        result['state_dict'] = model.state_dict()
+    return result
+
+
+def summarize_folds(fold_metrics):
+    """各折指标的均值/标准差，以及合并后的混淆矩阵"""
+    summary = {'folds': len(fold_metrics), 'mean': {}, 'std': {}}
+    for key in SUMMARY_METRICS:
+        values = [m[key] for m in fold_metrics if key in m]
+        if values:
+            summary['mean'][key] = round(float(np.mean(values)), 4)
+            summary['std'][key] = round(float(np.std(values)), 4)
+    summary['confusion'] = {key: int(sum(m[key] for m in fold_metrics)) for key in ('tp', 'tn', 'fp', 'fn')}
+    summary['per_fold'] = fold_metrics
+    return summary
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import RegisterView, UploadView, MeView, DeviceView, ModelManageView, TrainingStatusView, FeedbackView, SpectrumRecordViewSet, BatchImportView
+from .views import RegisterView, UploadView, MeView, DeviceView, ModelManageView, TrainingStatusView, InferenceStatsView, ShadowSummaryView, FeedbackView, SpectrumRecordViewSet, BatchImportView
 from .analysis_views import PCAAnalysisView, ClusteringAnalysisView
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -20,6 +20,8 @@ urlpatterns = [
     path('device/', DeviceView.as_view(), name='device_control'),
     path('models/', ModelManageView.as_view(), name='model_manage'),
     path('models/train_status/', TrainingStatusView.as_view(), name='train_status'),
+    path('models/inference_stats/', InferenceStatsView.as_view(), name='inference_stats'),
+    path('models/shadow_summary/', ShadowSummaryView.as_view(), name='shadow_summary'),
     path('feedback/', FeedbackView.as_view(), name='diagnosis_feedback'),
     path('analysis/pca/', PCAAnalysisView.as_view(), name='analysis_pca'),
     path('analysis/cluster/', ClusteringAnalysisView.as_view(), name='analysis_cluster'),
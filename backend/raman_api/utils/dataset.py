@@ -90,6 +90,19 @@ class MetadataParser:
                 
         return -1.0
 
+    @staticmethod
+    def parse_targets(meta):
+        """
+        Parse auxiliary targets from a metadata dict.
+        Returns: [ER, PR, HER2, Ki67], each 1.0 / 0.0 / -1.0 (Missing)
+        """
+        return [
+            MetadataParser.parse_er_pr(meta.get('ER')),
+            MetadataParser.parse_er_pr(meta.get('PR')),
+            MetadataParser.parse_her2(meta.get('HER2')),
+            MetadataParser.parse_ki67(meta.get('Ki67')),
+        ]
+
 class RamanDataset(Dataset):
     def __init__(self, X_spectra, y_diagnosis, metadata_list=None):
         """
@@ -104,17 +117,27 @@ class RamanDataset(Dataset):
         self.targets_aux = []
         if metadata_list:
             for meta in metadata_list:
-                er = MetadataParser.parse_er_pr(meta.get('ER'))
-                pr = MetadataParser.parse_er_pr(meta.get('PR'))
-                her2 = MetadataParser.parse_her2(meta.get('HER2'))
-                ki67 = MetadataParser.parse_ki67(meta.get('Ki67'))
-                self.targets_aux.append([er, pr, her2, ki67])
+                self.targets_aux.append(MetadataParser.parse_targets(meta))
         else:
             # If no metadata, fill with -1
             self.targets_aux = [[-1.0]*4 for _ in range(len(X_spectra))]
             
         self.targets_aux = torch.tensor(self.targets_aux, dtype=torch.float32)
 
+    @classmethod
+    def from_arrays(cls, X, y, aux):
+        """
+        Wrap pre-built float32 arrays (e.g. memory-mapped corpus snapshots) without copying.
+        :param X: (N, L) spectra
+        :param y: (N,) diagnosis labels
+        :param aux: (N, 4) auxiliary targets (ER, PR, HER2, Ki67)
+        """
+        dataset = cls.__new__(cls)
+        dataset.X = torch.from_numpy(X).unsqueeze(1)
+        dataset.y = torch.from_numpy(y)
+        dataset.targets_aux = torch.from_numpy(aux)
+        return dataset
+
     def __len__(self):
         return len(self.X)
 
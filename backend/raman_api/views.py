@@ -7,17 +7,15 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
 from .serializers import UserSerializer, SpectrumRecordSerializer, SpectrumRecordDetailSerializer, ModelVersionSerializer, DiagnosisFeedbackSerializer, PreprocessConfigSerializer
-from .models import SpectrumRecord, Patient, ModelVersion, DiagnosisFeedback
-from .ml_engine import MLEngine
+from .models import SpectrumRecord, Patient, ModelVersion, DiagnosisFeedback, WavenumberGrid
 from .preprocessing import RamanPreprocessor
 from .device_driver import MockSpectrometer
-import pandas as pd
 import random
 
 logger = logging.getLogger(__name__)
 
-# Initialize ML Engine
-MLEngine.load_active_model()
+# 模型在首次推理时加载（或由 MODEL_PRELOAD 在启动时预加载）；
+# MLEngine（torch）与 pandas 只在用到的请求中导入，不拖慢 URL 加载与管理命令
 
 class RegisterView(generics.CreateAPIView):
     """
@@ -101,8 +99,6 @@ class SpectrumRecordViewSet(viewsets.ModelViewSet):
         对单条记录进行预处理并返回处理后的数据
         """
         record = self.get_object()
-        if not record.spectral_data or 'y' not in record.spectral_data:
-            return Response({'error': 'No spectral data found'}, status=status.HTTP_400_BAD_REQUEST)
 
         # 校验预处理配置参数（P2-15）
         config_serializer = PreprocessConfigSerializer(data=request.data.get('config', {}))
@@ -110,17 +106,19 @@ class SpectrumRecordViewSet(viewsets.ModelViewSet):
             return Response({'error': config_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
         config = config_serializer.validated_data
 
-        wavenumbers = record.spectral_data.get('x', [])
-        raw_y = record.spectral_data['y']
-        
+        wavenumbers, raw_y = record.get_spectrum()
+        if raw_y is None:
+            return Response({'error': 'No spectral data found'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
+            # 用户临时配置只在本次请求中计算，不写入特征存储；结果位于记录自身的波数轴
             processed_y = RamanPreprocessor.process_pipeline(wavenumbers, raw_y, config)
             # Ensure JSON serializable (numpy array to list)
             if hasattr(processed_y, 'tolist'):
                 processed_y = processed_y.tolist()
 
             return Response({
-                'x': wavenumbers,
+                'x': wavenumbers.tolist(),
                 'y': processed_y
             })
         except Exception:
@@ -136,6 +134,9 @@ class UploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
     def post(self, request, *args, **kwargs):
+        import pandas as pd
+        from .ml_engine import MLEngine
+
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
@@ -264,18 +265,17 @@ class UploadView(APIView):
                 else:
                     patient = Patient.objects.create(name="Anonymous", age=50, gender='F')
 
-            # Save Record
-            spectral_data = {'x': spectral_x, 'y': spectral_y}
-            
-            record = SpectrumRecord.objects.create(
+            # Save Record (波数轴经进程内缓存解析为共享 WavenumberGrid)
+            record = SpectrumRecord(
                 patient=patient,
                 file_path=file_obj.name,
                 diagnosis_result=diagnosis,
                 confidence_score=confidence,
                 uploaded_by=request.user,
-                spectral_data=spectral_data,
                 metadata=metadata if 'metadata' in locals() else {}
             )
+            record.set_spectrum(spectral_x, spectral_y)
+            record.save()
 
             serializer = SpectrumRecordDetailSerializer(record)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -307,6 +307,8 @@ class BatchImportView(APIView):
 
         import zipfile
         import io
+        import pandas as pd
+        from .ml_engine import MLEngine
 
         success_count = 0
         errors = []
@@ -314,6 +316,8 @@ class BatchImportView(APIView):
         try:
             if file_obj.name.endswith('.zip'):
                 try:
+                    # 先解析全部文件，再一次性批量推理
+                    parsed = []
                     with zipfile.ZipFile(file_obj) as z:
                         for filename in z.namelist():
                             if filename.endswith('.txt') or filename.endswith('.csv'):
@@ -327,26 +331,47 @@ class BatchImportView(APIView):
                                         df = df.apply(pd.to_numeric, errors='coerce').dropna()
                                         x = df.iloc[:, 0].tolist()
                                         y = df.iloc[:, 1].tolist()
-                                        
-                                        patient, _ = Patient.objects.get_or_create(name=sample_id, defaults={'age': 0, 'gender': 'F'})
-                                        diagnosis, confidence, predictions = MLEngine.predict(x, y)
-                                        
-                                        # Metadata with predictions
-                                        meta = {'predicted_markers': predictions} if predictions else {}
-
-                                        SpectrumRecord.objects.create(
-                                            patient=patient,
-                                            file_path=filename,
-                                            diagnosis_result=diagnosis,
-                                            confidence_score=confidence,
-                                            uploaded_by=request.user,
-                                            spectral_data={'x': x, 'y': y},
-                                            metadata=meta,
-                                            is_training_data=True
-                                        )
-                                        success_count += 1
+                                        parsed.append((filename, sample_id, x, y))
                                     except Exception as e:
                                         errors.append(f"{filename}: {str(e)}")
+
+                    try:
+                        results = MLEngine.predict_batch([(x, y) for _, _, x, y in parsed])
+                    except Exception:
+                        # 整批失败时逐条推理，定位出错的文件
+                        logger.exception("Batch inference failed, falling back to per-file inference.")
+                        results = []
+                        for filename, _, x, y in parsed:
+                            try:
+                                results.append(MLEngine.predict(x, y))
+                            except Exception as e:
+                                results.append(e)
+
+                    for (filename, sample_id, x, y), result in zip(parsed, results):
+                        try:
+                            if isinstance(result, Exception):
+                                raise result
+                            diagnosis, confidence, predictions = result
+
+                            patient, _ = Patient.objects.get_or_create(name=sample_id, defaults={'age': 0, 'gender': 'F'})
+
+                            # Metadata with predictions
+                            meta = {'predicted_markers': predictions} if predictions else {}
+
+                            record = SpectrumRecord(
+                                patient=patient,
+                                file_path=filename,
+                                diagnosis_result=diagnosis,
+                                confidence_score=confidence,
+                                uploaded_by=request.user,
+                                metadata=meta,
+                                is_training_data=True
+                            )
+                            record.set_spectrum(x, y)
+                            record.save()
+                            success_count += 1
+                        except Exception as e:
+                            errors.append(f"{filename}: {str(e)}")
                 except Exception as e:
                     return Response({"error": f"Zip processing failed: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -382,6 +407,8 @@ class BatchImportView(APIView):
                         print(f"Start processing {len(df)} rows...")
                         
                         records_to_create = []
+                        # 所有行共享同一波数轴，只解析一次
+                        grid = WavenumberGrid.objects.resolve(wavenumbers)
                         
                         for idx, row in df.iterrows():
                             try:
@@ -453,16 +480,18 @@ class BatchImportView(APIView):
                                     defaults={'age': patient_age, 'gender': 'F'} # Gender unknown
                                 )
                                 
-                                records_to_create.append(SpectrumRecord(
+                                record = SpectrumRecord(
                                     patient=patient,
                                     file_path=f"{file_obj.name}_row{idx}",
                                     diagnosis_result=diagnosis,
                                     confidence_score=confidence,
                                     uploaded_by=request.user,
-                                    spectral_data={'x': wavenumbers, 'y': y},
                                     metadata=metadata,
                                     is_training_data=True
-                                ))
+                                )
+                                # bulk_create 不经过 save()，需显式写入二进制光谱
+                                record.set_spectrum(wavenumbers, y, grid=grid)
+                                records_to_create.append(record)
                                 
                                 success_count += 1
                                 if idx % 100 == 0:
@@ -519,16 +548,21 @@ class ModelManageView(generics.ListCreateAPIView):
     """
     模型版本管理接口
     POST { "action": "train" } 异步触发训练，立即返回，不阻塞请求
+    POST { "action": "fine_tune" } 异步从激活版本增量微调（新增记录 + 医生修正 + 历史回放）
+    POST { "action": "shadow", "version": "..." } 设置影子（候选）模型
     """
     queryset = ModelVersion.objects.all().order_by('-created_at')
     serializer_class = ModelVersionSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request, *args, **kwargs):
+        from .ml_engine import MLEngine
+
         action = request.data.get('action')
-        if action == 'train':
+        if action in ('train', 'fine_tune'):
             result = MLEngine.start_training_async(
-                description=request.data.get('description', 'Manual trigger')
+                description=request.data.get('description', 'Manual trigger'),
+                fine_tune=action == 'fine_tune',
             )
             http_status = (
                 status.HTTP_202_ACCEPTED
@@ -537,6 +571,15 @@ class ModelManageView(generics.ListCreateAPIView):
             )
             return Response(result, status=http_status)
 
+        if action == 'shadow':
+            # { "action": "shadow", "version": "v2" } 设置影子模型；version 为空时关闭
+            version = request.data.get('version') or None
+            try:
+                MLEngine.set_shadow_version(version)
+            except ModelVersion.DoesNotExist:
+                return Response({"error": f"Model version {version} not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"status": "success", "shadow_version": version})
+
         return super().post(request, *args, **kwargs)
 
 
@@ -545,8 +588,30 @@ class TrainingStatusView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get(self, request):
+        from .ml_engine import MLEngine
+
         return Response(MLEngine.get_training_status())
 
+
+class ShadowSummaryView(APIView):
+    """影子模型对比汇总：GET ?version=...（默认当前影子模型）"""
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request):
+        from .ml_engine import MLEngine
+
+        return Response(MLEngine.get_shadow_summary(request.query_params.get('version')))
+
+
+class InferenceStatsView(APIView):
+    """查询推理统计（微批队列深度、批大小分布）"""
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request):
+        from .ml_engine import MLEngine
+
+        return Response(MLEngine.get_inference_stats())
+
 class FeedbackView(generics.CreateAPIView):
     """
     诊断反馈接口
@@ -171,3 +171,64 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5174",  # Vite 备用端口
     "http://127.0.0.1:5174",
 ]
+
+# 训练语料/分析数据预处理的并行进程数；0 表示使用全部 CPU 核，1 表示串行（测试环境）
+PREPROCESSING_WORKERS = env.int('PREPROCESSING_WORKERS', default=0)
+
+# 训练：TRAINING_CV_FOLDS >= 2 时做分层 k 折交叉验证，各折与最终模型在独立进程中并行训练；
+# TRAINING_WORKERS 为进程数上限（0 表示 CPU 核数）
+TRAINING_CV_FOLDS = env.int('TRAINING_CV_FOLDS', default=0)
+TRAINING_WORKERS = env.int('TRAINING_WORKERS', default=0)
+
+# 增量微调：从激活版本 checkpoint 出发，只训练新增/医生修正的样本加上按比例抽取的历史样本（回放），
+# 以较小学习率训练少量 epoch
+TRAINING_FINETUNE_EPOCHS = env.int('TRAINING_FINETUNE_EPOCHS', default=10)
+TRAINING_FINETUNE_LR = env.float('TRAINING_FINETUNE_LR', default=1e-4)
+TRAINING_REPLAY_RATIO = env.float('TRAINING_REPLAY_RATIO', default=1.0)
+
+# 推理配置
+# 启动时在后台线程预加载激活模型；关闭时（默认）在首次推理时加载
+MODEL_PRELOAD = env.bool('MODEL_PRELOAD', default=False)
+# 每个推理进程的 torch 计算线程数；0 表示不修改（gunicorn.conf.py 中默认按 CPU 核数 / worker 数分配）
+INFERENCE_TORCH_THREADS = env.int('INFERENCE_TORCH_THREADS', default=0)
+# 各进程检查数据库中激活版本的最小间隔（秒）；其他进程切换版本后在后台加载、预热再切换，0 表示不检查
+MODEL_VERSION_CHECK_INTERVAL = env.float('MODEL_VERSION_CHECK_INTERVAL', default=5.0)
+# 新模型发布前的预热批大小（单条上传 / 微批 / 批量导入），空列表表示不预热
+MODEL_WARMUP_BATCH_SIZES = env.list('MODEL_WARMUP_BATCH_SIZES', cast=int, default=[1, 8, 32, 64])
+# 内存中保留的已加载模型版本数（LRU，激活版本常驻）
+MODEL_REGISTRY_SIZE = env.int('MODEL_REGISTRY_SIZE', default=3)
+# 批量推理时每次前向计算的光谱数
+INFERENCE_BATCH_SIZE = env.int('INFERENCE_BATCH_SIZE', default=64)
+# 并发单条推理合并为微批：收到首条请求后最多等待 INFERENCE_MAX_WAIT_MS 毫秒或凑满 INFERENCE_MAX_BATCH_SIZE 条
+INFERENCE_MICROBATCH = env.bool('INFERENCE_MICROBATCH', default=True)
+INFERENCE_MAX_BATCH_SIZE = env.int('INFERENCE_MAX_BATCH_SIZE', default=32)
+INFERENCE_MAX_WAIT_MS = env.float('INFERENCE_MAX_WAIT_MS', default=5.0)
+# 加载模型时编译为 TorchScript 推理模块（BN 折叠、任务头合并、freeze），缓存于 .pth 旁
+INFERENCE_COMPILE = env.bool('INFERENCE_COMPILE', default=False)
+# int8 量化版本：训练完成后生成（TRAINING_QUANTIZE），INFERENCE_QUANTIZED 开启时优先加载；
+# 验证集灵敏度相对 fp32 下降超过容许值时仍使用 fp32 模型
+TRAINING_QUANTIZE = env.bool('TRAINING_QUANTIZE', default=True)
+QUANTIZATION_ENGINE = env('QUANTIZATION_ENGINE', default='x86')
+QUANTIZATION_CALIBRATION_SAMPLES = env.int('QUANTIZATION_CALIBRATION_SAMPLES', default=256)
+INFERENCE_QUANTIZED = env.bool('INFERENCE_QUANTIZED', default=False)
+INFERENCE_QUANTIZED_MAX_SENSITIVITY_DROP = env.float('INFERENCE_QUANTIZED_MAX_SENSITIVITY_DROP', default=0.01)
+# 影子推理：ModelVersion.is_shadow 的候选模型在后台对同一输入推理并记录对比结果；
+# 队列满时丢弃，不影响请求耗时
+SHADOW_INFERENCE = env.bool('SHADOW_INFERENCE', default=True)
+SHADOW_QUEUE_SIZE = env.int('SHADOW_QUEUE_SIZE', default=64)
+
+# 推理结果缓存：按 (光谱内容哈希, 模型版本, 预处理配置) 缓存，切换模型版本时清空
+PREDICTION_CACHE = env.bool('PREDICTION_CACHE', default=True)
+PREDICTION_CACHE_ALIAS = 'predictions'
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    PREDICTION_CACHE_ALIAS: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "raman-predictions",
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": env.int('PREDICTION_CACHE_MAX_ENTRIES', default=4096)},
+    },
+}
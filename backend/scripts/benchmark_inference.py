@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+import django
+
+# Setup Django environment
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "raman_backend.settings")
+django.setup()
+
+import torch
+
+from raman_api.cnn import MultiTaskRamanCNN
+from raman_api.inference_compile import (
+    PARITY_TOLERANCE, check_parity, compile_model, measure_latency,
+)
+from raman_api.models import ModelVersion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare eager vs compiled (TorchScript) inference for a model version")
+    parser.add_argument('--version', help="ModelVersion.version (default: active model)")
+    parser.add_argument('--batch-sizes', default='1,8,32', help="Comma separated batch sizes")
+    parser.add_argument('--repeats', type=int, default=100)
+    args = parser.parse_args()
+
+    record = (ModelVersion.objects.get(version=args.version) if args.version
+              else ModelVersion.objects.filter(is_active=True).last())
+    if not record or not record.file_path.endswith('.pth'):
+        print("No CNN model version found.")
+        return
+
+    checkpoint = torch.load(record.file_path, map_location='cpu')
+    state_dict = checkpoint.get('state_dict', checkpoint)
+    input_length = checkpoint.get('config', {}).get('input_length', 1801)
+    model = MultiTaskRamanCNN(input_length=input_length)
+    model.load_state_dict(state_dict)
+    model.eval()
+
+    compiled = compile_model(model, input_length)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    max_diff = check_parity(model, compiled, input_length, batch_sizes=batch_sizes)
+    print(f"Model {record.version}: parity max |Δp| = {max_diff:.2e} "
+          f"({'OK' if max_diff <= PARITY_TOLERANCE else 'FAILED'}, tolerance {PARITY_TOLERANCE:.0e})")
+    print(f"torch threads: {torch.get_num_threads()}")
+    print(f"{'batch':>6} {'eager ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        eager = measure_latency(model, input_length, batch_size, repeats=args.repeats)
+        fast = measure_latency(compiled, input_length, batch_size, repeats=args.repeats)
+        print(f"{batch_size:>6} {eager:>10.3f} {fast:>12.3f} {eager / fast:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ sys.path.append(str(Path(__file__).resolve().parent.parent))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "raman_backend.settings")
 django.setup()
 
-from raman_api.models import Patient, SpectrumRecord
+from raman_api.models import Patient, SpectrumRecord, WavenumberGrid
 from django.contrib.auth.models import User
 
 def import_data(file_path):
@@ -31,6 +31,9 @@ def import_data(file_path):
     # Ensure a default user exists for upload
     admin_user, _ = User.objects.get_or_create(username='admin', defaults={'email': 'admin@example.com'})
 
+    # All rows share the same wavenumber axis; resolve it once
+    grid = WavenumberGrid.objects.resolve(spectral_cols)
+
     count = 0
     for index, row in df.iterrows():
         # Extract Patient Info
@@ -76,24 +79,21 @@ def import_data(file_path):
         metadata = {k: (v if pd.notna(v) else None) for k, v in metadata.items()}
 
         # Extract Spectral Data
-        # Format: {'x': [400, 401...], 'y': [123.4, 567.8...]}
+        # Stored as float32 intensities + shared WavenumberGrid reference
         intensities = row[spectral_cols].fillna(0).tolist()
-        spectral_data = {
-            'x': spectral_cols,
-            'y': intensities
-        }
 
         # Create Record
-        record = SpectrumRecord.objects.create(
+        record = SpectrumRecord(
             patient=patient,
             file_path=file_path, # Point to source file
             diagnosis_result=diagnosis,
             confidence_score=1.0, # Ground truth
             uploaded_by=admin_user,
-            spectral_data=spectral_data,
             metadata=metadata,
             is_training_data=True
         )
+        record.set_spectrum(spectral_cols, intensities, grid=grid)
+        record.save()
         count += 1
         if count % 100 == 0:
             print(f"Imported {count} records...")
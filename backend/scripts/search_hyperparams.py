@@ -0,0 +1,39 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+import django
+
+# Setup Django environment
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "raman_backend.settings")
+django.setup()
+
+from raman_api.ml_engine import MLEngine
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the Multi-Task CNN (successive-halving pruning)")
+    parser.add_argument('--trials', type=int, default=None, help="Number of trials (default: 16 in random mode, every combination in grid mode)")
+    parser.add_argument('--mode', choices=('random', 'grid'), default='random')
+    parser.add_argument('--space', type=json.loads, default=None,
+                        help='Hyperparameter candidates as JSON, e.g. \'{"lr": [0.001, 0.003], "batch_size": [32]}\'')
+    parser.add_argument('--preprocessing-space', type=json.loads, default=None,
+                        help='Preprocessing candidates as JSON, e.g. \'{"baseline_degree": [3, 5]}\'')
+    parser.add_argument('--min-epochs', type=int, default=None, help="Epochs at the first successive-halving rung")
+    parser.add_argument('--eta', type=int, default=None, help="Keep the best 1/eta of trials at each rung")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--version', default=None, help="Version name for the best model")
+    parser.add_argument('--activate', action='store_true', help="Make the best model the active version")
+    args = parser.parse_args()
+
+    options = {key: value for key, value in (('min_epochs', args.min_epochs), ('eta', args.eta)) if value is not None}
+    result = MLEngine.search_hyperparameters(
+        n_trials=args.trials, mode=args.mode, space=args.space, preprocessing_space=args.preprocessing_space,
+        seed=args.seed, version_name=args.version, activate=args.activate,
+        description="Hyperparameter search via script", **options,
+    )
+    print("Search Result:", json.dumps(result, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 在全新子进程中执行，测量 django.setup()、URL 加载以及（可选）首次加载模型的耗时
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from django.conf import settings
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+t2 = time.perf_counter()
+result = {'django_setup_ms': (t1 - t0) * 1000, 'urlconf_import_ms': (t2 - t1) * 1000}
+from raman_api.startup import StartupReport
+result['heavy_modules_after_urls'] = StartupReport.heavy_modules_loaded()
+if LOAD_MODEL:
+    t3 = time.perf_counter()
+    from raman_api.ml_engine import MLEngine
+    t4 = time.perf_counter()
+    MLEngine.ensure_model_loaded()
+    result['ml_engine_import_ms'] = (t4 - t3) * 1000
+    result['model_load_ms'] = (time.perf_counter() - t4) * 1000
+    result['model_version'] = getattr(MLEngine.get_model(), 'version', None)
+print(json.dumps(result))
+"""
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 [(模块名, 嵌套层级, 自身 us, 累计 us)]"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        level = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((name.strip(), level, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend startup time (django.setup, URL import, first model load)")
+    parser.add_argument('--load-model', action='store_true', help="Also time importing MLEngine and loading the active model")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest top-level imports to list")
+    parser.add_argument('--json', action='store_true', help="Print a machine-readable report")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "raman_backend.settings")
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get('PYTHONPATH')]))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"LOAD_MODEL = {args.load_model}\n{PROBE}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-4000:], file=sys.stderr)
+        sys.exit(proc.returncode)
+
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(proc.stderr)
+    top_level = sorted((e for e in imports if e[1] == 0), key=lambda e: e[3], reverse=True)
+    report['slowest_imports'] = [
+        {'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+        for name, _, _, cumulative in top_level[:args.top]
+    ]
+    for key, value in list(report.items()):
+        if key.endswith('_ms'):
+            report[key] = round(value, 1)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"django.setup():        {report['django_setup_ms']:>9.1f} ms")
+    print(f"URLconf import:        {report['urlconf_import_ms']:>9.1f} ms")
+    if args.load_model:
+        print(f"MLEngine import:       {report['ml_engine_import_ms']:>9.1f} ms")
+        print(f"Active model load:     {report['model_load_ms']:>9.1f} ms ({report['model_version']})")
+    heavy = report['heavy_modules_after_urls']
+    print(f"Heavy modules after URL import: {', '.join(heavy) if heavy else 'none'}")
+    print(f"\n{'cumulative ms':>14}  top-level import")
+    for entry in report['slowest_imports']:
+        print(f"{entry['cumulative_ms']:>14.1f}  {entry['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import sys
+import argparse
 from pathlib import Path
 import django
 
@@ -11,8 +12,17 @@ django.setup()
 from raman_api.ml_engine import MLEngine
 
 def main():
-    print("Triggering new training pipeline (Multi-Task CNN)...")
-    result = MLEngine.train_new_version(description="Manually triggered training via script")
+    parser = argparse.ArgumentParser(description="Train a new Multi-Task CNN version")
+    parser.add_argument('--fine-tune', action='store_true',
+                        help="Fine-tune the active version on new/corrected records plus a replay sample")
+    args = parser.parse_args()
+
+    if args.fine_tune:
+        print("Fine-tuning the active model (Multi-Task CNN)...")
+        result = MLEngine.fine_tune_version(description="Manually triggered fine-tune via script")
+    else:
+        print("Triggering new training pipeline (Multi-Task CNN)...")
+        result = MLEngine.train_new_version(description="Manually triggered training via script")
     print("Training Result:", result)
 
 if __name__ == "__main__":